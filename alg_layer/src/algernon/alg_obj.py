@@ -8,7 +8,11 @@ class AlgObject(object):
         try:
             return cls.parse_json(json_dict)
         except KeyError:
-            return cls.parse_json({x.replace('_', '', 1): y for x, y in json_dict.items()})
+            return cls.parse_json(cls.strip_json(json_dict))
+
+    @staticmethod
+    def strip_json(json_dict):
+        return {x.replace('_', '', 1): y for x, y in json_dict.items()}
 
     @property
     def blessing(self):
@@ -1,4 +1,7 @@
+from src.algernon import ClientPool
 from src.algernon import Opossum, SneakyKipper
 from src.algernon import lambda_logged
 from src.algernon import Bullhorn
+from src.algernon import SigV4Signer
 from src.algernon import StoredData
+from src.algernon import DynamoBatcher
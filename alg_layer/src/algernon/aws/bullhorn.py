@@ -1,10 +1,18 @@
-import boto3
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.algernon import ClientPool
 
 
 class Bullhorn:
+    _max_batch_entries = 10
+    _max_batch_bytes = 256 * 1024
+
     def __init__(self, client=None):
         if not client:
-            client = boto3.client('sns')
+            client = ClientPool.get_client('sns')
         self._client = client
 
     def publish(self, message_subject, topic_arn, message_body):
@@ -14,3 +22,151 @@ class Bullhorn:
             Message=message_body
         )
         return response['MessageId']
+
+    def publish_batch(self, message_subject, topic_arn, message_bodies, max_attempts=5):
+        """publishes up to ten messages with a single PublishBatch call
+
+        entries which fail on the service side are retried on their own, entries rejected as the sender's fault
+        are not, as sending them again will not change the outcome,
+        once any entry has been published, the entries which could not be are returned rather than raised,
+        so the caller does not send the published ones again
+
+        Args:
+            message_subject: the subject applied to every message
+            topic_arn: the topic to publish to
+            message_bodies: the body of each message, no more than ten, and no more than 256KB all together
+            max_attempts: how many times to try entries which fail on the service side
+
+        Returns:
+            a tuple of the MessageId for each message, in the order the bodies were provided,
+            None where the message was not published, and the Failed entries for the messages which were not,
+            with the Id of each entry being the position of its body
+
+        Raises:
+            ValueError: more than ten message bodies were provided
+            RuntimeError: no entry could be published
+
+        """
+        if len(message_bodies) > self._max_batch_entries:
+            raise ValueError(f'can not publish {len(message_bodies)} messages in one batch, '
+                             f'the limit is {self._max_batch_entries}')
+        pending = {str(i): x for i, x in enumerate(message_bodies)}
+        message_ids = {}
+        sender_faults = []
+        retried = []
+        for attempt in range(max_attempts):
+            response = self._client.publish_batch(
+                TopicArn=topic_arn,
+                PublishBatchRequestEntries=[
+                    {'Id': x, 'Subject': message_subject, 'Message': y} for x, y in pending.items()]
+            )
+            for successful in response.get('Successful', []):
+                message_ids[successful['Id']] = successful['MessageId']
+            failed = response.get('Failed', [])
+            sender_faults.extend(x for x in failed if x.get('SenderFault'))
+            retried = [x for x in failed if not x.get('SenderFault')]
+            pending = {x['Id']: pending[x['Id']] for x in retried}
+            if not pending:
+                break
+            logging.debug(f'{len(pending)} entries failed to publish to {topic_arn}, retrying: {retried}')
+            if attempt < max_attempts - 1:
+                time.sleep(0.05 * (2 ** attempt))
+        failed = sender_faults + retried
+        if failed and not message_ids:
+            raise RuntimeError(f'could not publish messages to {topic_arn}: {failed}')
+        return [message_ids.get(str(i)) for i in range(len(message_bodies))], failed
+
+    def buffer(self, message_subject, topic_arn, flush_size=100, max_workers=10):
+        return BullhornBuffer(self, message_subject, topic_arn, flush_size, max_workers)
+
+    @classmethod
+    def generate_batches(cls, message_bodies):
+        """splits message bodies into groups which each fit within a single PublishBatch call"""
+        batch = []
+        batch_bytes = 0
+        for message_body in message_bodies:
+            message_bytes = len(message_body.encode('utf-8'))
+            if batch and (len(batch) >= cls._max_batch_entries or batch_bytes + message_bytes > cls._max_batch_bytes):
+                yield batch
+                batch = []
+                batch_bytes = 0
+            batch.append(message_body)
+            batch_bytes += message_bytes
+        if batch:
+            yield batch
+
+
+class BullhornBuffer:
+    """Collects messages for a single topic, publishing them in concurrent PublishBatch calls
+
+        messages are sent once flush_size of them are pending, unless flush_size is None, when flush is called,
+        or when the buffer is used as a context manager and the block exits cleanly,
+        messages which could not be published are held in failed_messages, rather than sent again
+
+    """
+    def __init__(self, bullhorn, message_subject, topic_arn, flush_size=100, max_workers=10):
+        self._bullhorn = bullhorn
+        self._message_subject = message_subject
+        self._topic_arn = topic_arn
+        self._flush_size = flush_size
+        self._max_workers = max_workers
+        self._pending = []
+        self._message_ids = []
+        self._failed_messages = []
+        self._lock = threading.Lock()
+
+    @property
+    def message_ids(self):
+        return self._message_ids
+
+    @property
+    def failed_messages(self):
+        return self._failed_messages
+
+    def publish(self, message_body):
+        with self._lock:
+            self._pending.append(message_body)
+            is_full = self._flush_size is not None and len(self._pending) >= self._flush_size
+        if is_full:
+            self.flush()
+
+    def flush(self):
+        """publishes every pending message, every batch is accounted for before returning,
+        the messages of a batch which raised are added to failed_messages along with its failed entries
+
+        Returns:
+            the MessageId of each message published by this flush
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+        batches = list(Bullhorn.generate_batches(pending))
+        if not batches:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self._max_workers, len(batches))) as executor:
+            batch_results = list(executor.map(self._publish_batch, batches))
+        message_ids = []
+        failed_messages = []
+        for batch, (batch_ids, failed) in zip(batches, batch_results):
+            message_ids.extend(x for x in batch_ids if x is not None)
+            failed_messages.extend(batch[int(x['Id'])] for x in failed)
+            if failed:
+                logging.error(f'could not publish {len(failed)} messages to {self._topic_arn}: {failed}')
+        with self._lock:
+            self._message_ids.extend(message_ids)
+            self._failed_messages.extend(failed_messages)
+        return message_ids
+
+    def _publish_batch(self, batch):
+        try:
+            return self._bullhorn.publish_batch(self._message_subject, self._topic_arn, batch)
+        except Exception as e:
+            failed = [{'Id': str(i), 'Code': type(e).__name__, 'Message': str(e), 'SenderFault': False}
+                      for i in range(len(batch))]
+            return [None] * len(batch), failed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if not exc_type:
+            self.flush()
@@ -0,0 +1,89 @@
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+_clients = {}
+_clients_lock = threading.Lock()
+_sessions = {}
+_sessions_lock = threading.Lock()
+_thread_resources = threading.local()
+
+
+class ClientPool:
+    """The boto3 clients and resources shared by everything running in this process
+
+        clients are thread safe, so one client per service (and region) is built on first use and shared by every
+        thread, resources are not, so each thread is given its own, built from a session of its own,
+        both are configured with a connection pool sized for the concurrency the tasks run at,
+        and TCP keep alive where botocore offers it, so a warm worker reuses its connections,
+        rather than re-reading the credential chain and rebuilding endpoint resolvers on every call
+
+    """
+    @classmethod
+    def get_client(cls, service_name: str, region_name: str = None):
+        client_key = (service_name, region_name)
+        client = _clients.get(client_key)
+        if client is not None:
+            return client
+        with _clients_lock:
+            client = _clients.get(client_key)
+            if client is None:
+                client = cls._get_session().client(service_name, region_name=region_name, config=cls.get_config())
+                _clients[client_key] = client
+        return client
+
+    @classmethod
+    def get_resource(cls, service_name: str, region_name: str = None):
+        resources = getattr(_thread_resources, 'resources', None)
+        if resources is None:
+            resources = {}
+            _thread_resources.resources = resources
+        resource_key = (service_name, region_name)
+        resource = resources.get(resource_key)
+        if resource is None:
+            session = getattr(_thread_resources, 'session', None)
+            if session is None:
+                session = boto3.session.Session()
+                _thread_resources.session = session
+            resource = session.resource(service_name, region_name=region_name, config=cls.get_config())
+            resources[resource_key] = resource
+        return resource
+
+    @staticmethod
+    def get_config() -> Config:
+        """the botocore Config every pooled client and resource is built with
+
+        the connection pool is sized by AWS_MAX_POOL_CONNECTIONS, defaulting to 50, enough for the task threads and
+        the thread pools within them to share one client, retries use the standard mode, up to AWS_MAX_ATTEMPTS,
+        TCP keep alive is only asked for when the installed botocore knows of it, the releases which do
+        no longer install on the python3.6 runtime the functions run on
+        """
+        config_args = {
+            'max_pool_connections': int(os.getenv('AWS_MAX_POOL_CONNECTIONS', 50)),
+            'retries': {'max_attempts': int(os.getenv('AWS_MAX_ATTEMPTS', 5)), 'mode': 'standard'}
+        }
+        if 'tcp_keepalive' in Config.OPTION_DEFAULTS:
+            config_args['tcp_keepalive'] = True
+        return Config(**config_args)
+
+    @classmethod
+    def reset(cls):
+        """drops every pooled client, and the resources of the calling thread, i.e. after rotating credentials"""
+        with _clients_lock, _sessions_lock:
+            _clients.clear()
+            _sessions.clear()
+        _thread_resources.__dict__.clear()
+
+    @staticmethod
+    def _get_session():
+        session = _sessions.get('shared')
+        if session is not None:
+            return session
+        with _sessions_lock:
+            session = _sessions.get('shared')
+            if session is None:
+                session = boto3.session.Session()
+                _sessions['shared'] = session
+        return session
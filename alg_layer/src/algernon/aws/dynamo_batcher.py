@@ -0,0 +1,118 @@
+import logging
+import time
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from src.algernon import ClientPool
+
+
+class DynamoBatcher:
+    _max_write_size = 25
+    _max_get_size = 100
+
+    def __init__(self, client=None, max_attempts=8, backoff_base=0.05):
+        if not client:
+            client = ClientPool.get_client('dynamodb')
+        self._client = client
+        self._max_attempts = max_attempts
+        self._backoff_base = backoff_base
+        self._serializer = TypeSerializer()
+        self._deserializer = TypeDeserializer()
+
+    @property
+    def client(self):
+        return self._client
+
+    def serialize(self, item: dict) -> dict:
+        return {x: self._serializer.serialize(y) for x, y in item.items()}
+
+    def deserialize(self, item: dict) -> dict:
+        return {x: self._deserializer.deserialize(y) for x, y in item.items()}
+
+    def batch_write(self, table_name: str, items: [dict]):
+        """Puts every item into the table, using as few BatchWriteItem calls as possible
+
+        Args:
+            table_name: the name of the table to write to
+            items: plain python dicts, they are serialized to the DynamoDB wire format here
+
+        Returns: None
+
+        Raises:
+            RuntimeError: some items remained unprocessed after every retry was spent
+
+        """
+        requests = [{'PutRequest': {'Item': self.serialize(x)}} for x in items]
+        for chunk in self._chunk(requests, self._max_write_size):
+            request_items = {table_name: chunk}
+            for attempt in range(self._max_attempts):
+                response = self._client.batch_write_item(RequestItems=request_items)
+                request_items = response.get('UnprocessedItems')
+                if not request_items:
+                    break
+                self._back_off(attempt, 'batch_write_item', table_name)
+            if request_items:
+                raise RuntimeError(f'could not write all items to {table_name}, '
+                                   f'unprocessed after {self._max_attempts} attempts: {request_items}')
+
+    def batch_get(self, table_name: str, keys: [dict], projection_expression: str = None) -> [dict]:
+        """Gets the items for every key from the table, using as few BatchGetItem calls as possible
+
+        Args:
+            table_name: the name of the table to read from
+            keys: plain python dicts holding the primary key for each item
+            projection_expression: if set, only these attributes are returned
+
+        Returns:
+            the deserialized items which were found, items which do not exist are simply absent
+
+        Raises:
+            RuntimeError: some keys remained unprocessed after every retry was spent
+
+        """
+        found = []
+        unique_keys = list({tuple(sorted(x.items())): x for x in keys}.values())
+        for chunk in self._chunk(unique_keys, self._max_get_size):
+            table_request = {'Keys': [self.serialize(x) for x in chunk]}
+            if projection_expression:
+                table_request['ProjectionExpression'] = projection_expression
+            request_items = {table_name: table_request}
+            for attempt in range(self._max_attempts):
+                response = self._client.batch_get_item(RequestItems=request_items)
+                found.extend(self.deserialize(x) for x in response['Responses'].get(table_name, []))
+                request_items = response.get('UnprocessedKeys')
+                if not request_items:
+                    break
+                self._back_off(attempt, 'batch_get_item', table_name)
+            if request_items:
+                raise RuntimeError(f'could not read all keys from {table_name}, '
+                                   f'unprocessed after {self._max_attempts} attempts: {request_items}')
+        return found
+
+    def query(self, table_name: str, key_condition_expression: str, expression_values: dict, index_name=None):
+        query_args = {
+            'TableName': table_name,
+            'KeyConditionExpression': key_condition_expression,
+            'ExpressionAttributeValues': self.serialize(expression_values)
+        }
+        if index_name:
+            query_args['IndexName'] = index_name
+        while True:
+            response = self._client.query(**query_args)
+            for item in response['Items']:
+                yield self.deserialize(item)
+            last_key = response.get('LastEvaluatedKey')
+            if not last_key:
+                return
+            query_args['ExclusiveStartKey'] = last_key
+
+    def _back_off(self, attempt, operation_name, table_name):
+        delay = self._backoff_base * (2 ** attempt)
+        logging.debug(f'{operation_name} against {table_name} returned unprocessed entries, '
+                      f'retrying in {delay} seconds')
+        time.sleep(delay)
+
+    @staticmethod
+    def _chunk(entries, chunk_size):
+        for i in range(0, len(entries), chunk_size):
+            yield entries[i:i + chunk_size]
@@ -0,0 +1,112 @@
+import datetime
+import hashlib
+import hmac
+import os
+import time
+
+_signing_keys = {}
+_max_signing_keys = 32
+
+
+class SigV4Signer:
+    """Generates AWS Signature Version 4 headers for requests signed over host and x-amz-date
+
+        the signing key only changes with the date, region, service and secret key, so it is derived once
+        and shared between every signer in the process, rather than rebuilt through four HMACs per request
+
+    """
+    _algorithm = 'AWS4-HMAC-SHA256'
+    _signed_headers = 'host;x-amz-date'
+
+    def __init__(self, service: str, region: str = None, credentials_provider=None):
+        """
+
+        Args:
+            service: the signing name of the service, i.e. neptune-db or appsync
+            region: the region of the service, defaults to AWS_REGION
+            credentials_provider: a callable returning (access_key, secret_key, session_token),
+                called once up front, and again whenever refresh_credentials is called
+        """
+        if not region:
+            region = os.getenv('AWS_REGION', 'us-east-1')
+        if not credentials_provider:
+            credentials_provider = self.get_environment_credentials
+        self._service = service
+        self._region = region
+        self._credentials_provider = credentials_provider
+        self._credentials = None
+        self._scope_suffix = f'/{region}/{service}/aws4_request'
+        self._stamps = (None, None, None)
+
+    @staticmethod
+    def get_environment_credentials():
+        return os.environ['AWS_ACCESS_KEY_ID'], os.environ['AWS_SECRET_ACCESS_KEY'], os.getenv('AWS_SESSION_TOKEN')
+
+    @property
+    def credentials(self):
+        if self._credentials is None:
+            self.refresh_credentials()
+        return self._credentials
+
+    def refresh_credentials(self):
+        """reloads the credentials from the provider, call this when a request is rejected for stale credentials"""
+        self._credentials = tuple(self._credentials_provider())
+
+    def sign(self, method: str, host: str, uri: str, payload=b'', query_string: str = '') -> dict:
+        """generates the headers which sign a single request
+
+        Args:
+            method: the HTTP method of the request
+            host: the value of the host header, including the port if it is not the default for the scheme
+            uri: the canonical path of the request
+            payload: the exact body which will be sent, as str or bytes
+            query_string: the canonical query string, if any
+
+        Returns:
+            the x-amz-date, Authorization and, when using temporary credentials, X-Amz-Security-Token headers
+
+        """
+        access_key, secret_key, session_token = self.credentials
+        amz_date, date_stamp = self._get_stamps()
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        payload_hash = hashlib.sha256(payload).hexdigest()
+        canonical_request = f'{method}\n{uri}\n{query_string}\nhost:{host}\nx-amz-date:{amz_date}\n\n' \
+                            f'{self._signed_headers}\n{payload_hash}'
+        credential_scope = date_stamp + self._scope_suffix
+        hashed_request = hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()
+        string_to_sign = f'{self._algorithm}\n{amz_date}\n{credential_scope}\n{hashed_request}'
+        signing_key = self._get_signing_key(secret_key, date_stamp)
+        signature = hmac.new(signing_key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+        authorization_header = f'{self._algorithm} Credential={access_key}/{credential_scope}, ' \
+                               f'SignedHeaders={self._signed_headers}, Signature={signature}'
+        headers = {'x-amz-date': amz_date, 'Authorization': authorization_header}
+        if session_token:
+            headers['X-Amz-Security-Token'] = session_token
+        return headers
+
+    def _get_stamps(self):
+        current_second = int(time.time())
+        stamped_second, amz_date, date_stamp = self._stamps
+        if stamped_second != current_second:
+            t = datetime.datetime.utcfromtimestamp(current_second)
+            amz_date, date_stamp = t.strftime('%Y%m%dT%H%M%SZ'), t.strftime('%Y%m%d')
+            self._stamps = (current_second, amz_date, date_stamp)
+        return amz_date, date_stamp
+
+    def _get_signing_key(self, secret_key, date_stamp):
+        cache_key = (secret_key, date_stamp, self._region, self._service)
+        signing_key = _signing_keys.get(cache_key)
+        if signing_key is None:
+            k_date = self._sign(f'AWS4{secret_key}'.encode('utf-8'), date_stamp)
+            k_region = self._sign(k_date, self._region)
+            k_service = self._sign(k_region, self._service)
+            signing_key = self._sign(k_service, 'aws4_request')
+            if len(_signing_keys) >= _max_signing_keys:
+                _signing_keys.clear()
+            _signing_keys[cache_key] = signing_key
+        return signing_key
+
+    @staticmethod
+    def _sign(key, message):
+        return hmac.new(key, message.encode('utf-8'), hashlib.sha256).digest()
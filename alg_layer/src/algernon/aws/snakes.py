@@ -4,9 +4,9 @@ import os
 from copy import deepcopy
 from datetime import datetime
 
-import boto3
 from botocore.exceptions import ClientError
 from src.algernon import AlgObject
+from src.algernon import ClientPool
 from src.algernon import AlgJson, AlgEncoder
 
 
@@ -37,7 +37,7 @@ class StoredData(AlgObject):
     def check(self):
         if self._is_stored is True:
             return True
-        resource = boto3.resource('s3')
+        resource = ClientPool.get_resource('s3')
         object_resource = resource.Object(self._bucket_name, self.data_key)
         try:
             object_resource.load()
@@ -69,7 +69,7 @@ class StoredData(AlgObject):
         folder_name = folder_data_name[0]
         data_name = folder_data_name[1]
         timestamp = key_parts[1].replace('.json', '')
-        resource = boto3.resource('s3')
+        resource = ClientPool.get_resource('s3')
         stored_object = resource.Object(pointer_parts[0], pointer_parts[1]).get()
         string_body = stored_object['Body'].read()
         body = AlgJson.loads(string_body)
@@ -107,7 +107,7 @@ class StoredData(AlgObject):
         self._overwrite_store()
 
     def _overwrite_store(self):
-        resource = boto3.resource('s3')
+        resource = ClientPool.get_resource('s3')
         body = {'data_string': self._data_string, 'full_unpack': self._full_unpack}
         try:
             body_string = AlgJson.dumps(body)
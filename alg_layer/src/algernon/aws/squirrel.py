@@ -1,8 +1,9 @@
 import json
 
-import boto3
 from botocore.exceptions import ClientError
 
+from src.algernon import ClientPool
+
 
 class Opossum:
     @classmethod
@@ -37,7 +38,7 @@ class Opossum:
 
     @classmethod
     def get_secrets(cls, secret_name):
-        client = boto3.client('secretsmanager')
+        client = ClientPool.get_client('secretsmanager')
         try:
             get_secret_value_response = client.get_secret_value(
                 SecretId=secret_name
@@ -64,7 +65,7 @@ class SneakyKipper:
     }
 
     def __init__(self, task_name):
-        self._client = boto3.client('kms')
+        self._client = ClientPool.get_client('kms')
         self._key_alis = self.task_key_aliases[task_name]
 
     def encrypt(self, unencrypted_text, encryption_context):
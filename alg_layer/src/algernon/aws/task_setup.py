@@ -1,15 +1,55 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import rapidjson
 from src.algernon import AlgDecoder
+from src.algernon import AlgEnvelope
 
 
 def queued(production_fn):
+    """wraps a task function so it can be driven by an SQS event
+
+    each record is processed in isolation, a record which raises is reported back in batchItemFailures,
+    so that only the failed messages are redelivered, rather than the whole batch
+
+    setting QUEUED_CONCURRENCY above 1 processes the records of a batch on that many threads,
+    results and failures are still reported in the order the records arrived
+
+    messages are decoded as AlgJson, unless they start with the AlgEnvelope header
+
+
+    """
     def wrapper(*args):
-        results = []
         event = args[0]
         context = args[1]
-        for entry in event['Records']:
-            entry_body = rapidjson.loads(entry['body'])
-            original_payload = rapidjson.loads(entry_body['Message'], object_hook=AlgDecoder.object_hook)
-            results.append(production_fn(original_payload, context))
-        return results
+        records = event['Records']
+        max_concurrency = int(os.getenv('QUEUED_CONCURRENCY', 1))
+        if max_concurrency > 1 and len(records) > 1:
+            with ThreadPoolExecutor(max_workers=min(max_concurrency, len(records))) as executor:
+                outcomes = list(executor.map(lambda x: _process_record(production_fn, x, context), records))
+        else:
+            outcomes = [_process_record(production_fn, x, context) for x in records]
+        results = [x[0] for x in outcomes]
+        batch_item_failures = [x[1] for x in outcomes if x[1] is not None]
+        return {'batchItemFailures': batch_item_failures, 'results': results}
     return wrapper
+
+
+def _process_record(production_fn, entry, context):
+    """runs the task for a single record, reporting its messageId as a batch item failure if it raises
+
+    a record without a messageId can not be reported on its own, so it fails the whole invocation instead
+    """
+    message_id = entry['messageId']
+    try:
+        entry_body = rapidjson.loads(entry['body'])
+        message = entry_body['Message']
+        if AlgEnvelope.is_enveloped(message):
+            original_payload = AlgEnvelope.loads(message)
+        else:
+            original_payload = rapidjson.loads(message, object_hook=AlgDecoder.object_hook)
+        return production_fn(original_payload, context), None
+    except Exception as e:
+        logging.exception(f'failed to process queued message: {message_id}, it will be retried: {e}')
+        return None, {'itemIdentifier': message_id}
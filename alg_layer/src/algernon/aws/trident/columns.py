@@ -0,0 +1,221 @@
+import datetime
+import json
+
+import rapidjson
+
+from src.algernon import TridentVertex, TridentEdge, TridentProperty, TridentPath
+
+
+class _RawRow(dict):
+    """a row decoded straight from a vertex or edge, already holding plain values"""
+    __slots__ = ()
+
+
+class _RawPath:
+    __slots__ = ('labels', 'objects')
+
+    def __init__(self, labels, objects):
+        self.labels = labels
+        self.objects = objects
+
+
+def _decode_raw_map(obj_value):
+    return dict(zip(obj_value[0::2], obj_value[1::2]))
+
+
+def _decode_raw_vertex(obj_value):
+    row = _RawRow(internal_id=obj_value['id'], label=obj_value['label'])
+    for property_name, vertex_properties in obj_value.get('properties', {}).items():
+        row[property_name] = vertex_properties[0] if len(vertex_properties) == 1 else vertex_properties
+    return row
+
+
+def _decode_raw_edge(obj_value):
+    row = _RawRow(internal_id=obj_value['id'], label=obj_value['label'],
+                  from_id=obj_value['outV'], to_id=obj_value['inV'])
+    row.update(obj_value.get('properties', {}))
+    return row
+
+
+_raw_decoders = {
+    'g:T': lambda x: _raw_t_values.get(x, x),
+    'g:Int32': int,
+    'g:Int64': int,
+    'g:Double': float,
+    'g:Float': float,
+    'g:List': lambda x: x,
+    'g:Set': lambda x: x,
+    'g:Date': lambda x: datetime.datetime.fromtimestamp(x / 1000),
+    'g:Map': _decode_raw_map,
+    'g:Vertex': _decode_raw_vertex,
+    'g:Edge': _decode_raw_edge,
+    'g:VertexProperty': lambda x: x['value'],
+    'g:Property': lambda x: x['value'],
+    'g:Path': lambda x: _RawPath(x['labels'], x['objects'])
+}
+
+_raw_t_values = {
+    'id': 'internal_id',
+    'label': 'label'
+}
+
+
+class TridentColumnarDecoder(json.JSONDecoder):
+    """Decodes GraphSON v3 into plain rows, rather than Trident objects
+
+        vertexes and edges become dicts of internal_id, label, and their properties (from_id and to_id for edges),
+        vertex properties are reduced to their values, paths to their labels and objects,
+        so a large result can be laid out as columns without building an AlgObject for every element
+
+    """
+    def __init__(self, *args, **kwargs):
+        json.JSONDecoder.__init__(self, object_hook=self.object_hook, *args, **kwargs)
+
+    @classmethod
+    def loads(cls, response_content):
+        return rapidjson.loads(response_content, object_hook=cls.object_hook)
+
+    @staticmethod
+    def object_hook(obj):
+        obj_type = obj.get('@type')
+        if obj_type is None:
+            return obj
+        decoder = _raw_decoders.get(obj_type)
+        if decoder is None:
+            return obj
+        return decoder(obj['@value'])
+
+
+class TridentColumns:
+    """The results of a traversal laid out as columns, one list of values per column, all of equal length
+
+        each vertex, edge or map in the results is a row, with a column for internal_id, label, and every property,
+        each path is a single row, its columns prefixed by the label of each step, or its position when unlabelled,
+        any other value lands in the value column, rows missing a column hold None there
+
+    """
+    def __init__(self, columns: dict = None, row_count: int = 0):
+        if not columns:
+            columns = {}
+        self._columns = columns
+        self._row_count = row_count
+
+    @classmethod
+    def from_response(cls, response_content):
+        """builds the columns from the complete body of a gremlin response, str or bytes"""
+        columns = cls()
+        columns.extend(TridentColumnarDecoder.loads(response_content)['result']['data'])
+        return columns
+
+    @property
+    def columns(self) -> dict:
+        return self._columns
+
+    @property
+    def column_names(self) -> [str]:
+        return list(self._columns)
+
+    @property
+    def row_count(self) -> int:
+        return self._row_count
+
+    def __len__(self):
+        return self._row_count
+
+    def __getitem__(self, column_name):
+        return self._columns[column_name]
+
+    def extend(self, entries):
+        for entry in entries:
+            self.append(entry)
+        return self
+
+    def append(self, entry):
+        """adds a single result as a row, entries may be raw rows, or Trident objects from the TridentDecoder"""
+        self._add_row(self._generate_row(entry))
+
+    def to_numpy(self) -> dict:
+        """the columns as numpy arrays, numeric columns with missing values are filled with nan
+
+        numpy is only imported when this is called, it is not a dependency of the layer
+        """
+        import numpy
+
+        arrays = {}
+        for column_name, column_values in self._columns.items():
+            present = [x for x in column_values if x is not None]
+            is_numeric = present and all(
+                isinstance(x, (int, float)) and not isinstance(x, bool) for x in present)
+            if is_numeric and len(present) < len(column_values):
+                arrays[column_name] = numpy.array(
+                    [numpy.nan if x is None else x for x in column_values], dtype=float)
+                continue
+            if is_numeric or (present and len(present) == len(column_values)
+                              and all(isinstance(x, (str, bool)) for x in present)):
+                arrays[column_name] = numpy.array(column_values)
+                continue
+            array = numpy.empty(len(column_values), dtype=object)
+            array[:] = column_values
+            arrays[column_name] = array
+        return arrays
+
+    def to_dataframe(self):
+        """the columns as a pandas DataFrame, pandas is only imported when this is called"""
+        import pandas
+
+        return pandas.DataFrame(self._columns, columns=list(self._columns))
+
+    def _add_row(self, row: dict):
+        row_count = self._row_count
+        columns = self._columns
+        for column_name, column_value in row.items():
+            column = columns.get(column_name)
+            if column is None:
+                column = [None] * row_count
+                columns[column_name] = column
+            column.append(column_value)
+        self._row_count = row_count + 1
+        if len(row) < len(columns):
+            for column in columns.values():
+                if len(column) == row_count:
+                    column.append(None)
+
+    @classmethod
+    def _generate_row(cls, entry) -> dict:
+        if type(entry) is _RawRow:
+            return entry
+        if isinstance(entry, dict):
+            return {str(x): cls._unwrap(y) for x, y in entry.items()}
+        if isinstance(entry, _RawPath):
+            return cls._generate_path_row(entry.labels, entry.objects)
+        if isinstance(entry, TridentVertex):
+            row = {'internal_id': entry.vertex_id, 'label': entry.vertex_label}
+            row.update({x: cls._unwrap(y) for x, y in entry.vertex_properties.items()})
+            return row
+        if isinstance(entry, TridentEdge):
+            return {'internal_id': entry.internal_id, 'label': entry.label,
+                    'from_id': entry.out_id, 'to_id': entry.in_id}
+        if isinstance(entry, TridentPath):
+            return cls._generate_path_row(entry.labels, entry.path_objects)
+        return {'value': cls._unwrap(entry)}
+
+    @classmethod
+    def _generate_path_row(cls, step_labels, step_objects) -> dict:
+        row = {}
+        for position, step_object in enumerate(step_objects):
+            labels = step_labels[position] if position < len(step_labels) else []
+            prefix = labels[0] if labels else str(position)
+            for column_name, column_value in cls._generate_row(step_object).items():
+                row[f'{prefix}.{column_name}'] = column_value
+        return row
+
+    @staticmethod
+    def _unwrap(value):
+        """reduces a property, or a list holding a single value, i.e. from valueMap(), to its value"""
+        if isinstance(value, list):
+            if len(value) != 1:
+                return [x.value if isinstance(x, TridentProperty) else x for x in value]
+            value = value[0]
+        if isinstance(value, TridentProperty):
+            return value.value
+        return value
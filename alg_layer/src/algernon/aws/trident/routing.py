@@ -0,0 +1,91 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+_mutating_steps = re.compile(r'\b(addV|addE|property|drop|mergeV|mergeE)\s*\(')
+_id_binding_names = ('internal_id', 'vertex_id', 'edge_id', 'from_id', 'to_id')
+
+
+class TridentWriteLedger:
+    """Remembers which internal_ids were written recently, so reads of them can be pinned to the writer
+
+        Neptune replicas trail the writer, a read sent to the reader endpoint moments after a write
+        may not see it, so for window_seconds after an internal_id is written, reads touching it go to the writer,
+        the ledger holds at most max_entries ids, dropping the oldest first
+
+    """
+    def __init__(self, window_seconds: float = None, max_entries: int = 100000):
+        if window_seconds is None:
+            window_seconds = float(os.getenv('GRAPH_DB_READ_AFTER_WRITE_WINDOW', 10))
+        self._window_seconds = window_seconds
+        self._max_entries = max_entries
+        self._written = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def window_seconds(self):
+        return self._window_seconds
+
+    def record_writes(self, internal_ids):
+        if not internal_ids or self._window_seconds <= 0:
+            return
+        written_at = time.monotonic()
+        with self._lock:
+            for internal_id in internal_ids:
+                self._written.pop(internal_id, None)
+                self._written[internal_id] = written_at
+            while len(self._written) > self._max_entries:
+                self._written.popitem(last=False)
+
+    def is_recently_written(self, internal_ids) -> bool:
+        if not internal_ids:
+            return False
+        cutoff = time.monotonic() - self._window_seconds
+        with self._lock:
+            self._expire(cutoff)
+            return any(x in self._written for x in internal_ids)
+
+    def _expire(self, cutoff):
+        while self._written:
+            if next(iter(self._written.values())) >= cutoff:
+                return
+            self._written.popitem(last=False)
+
+
+class TridentRouter:
+    """Decides whether a command goes to the reader or the writer endpoint
+
+        commands containing a mutating step are writes, everything else is a read,
+        reads go to the reader unless they touch an internal_id the ledger saw written within its window
+
+    """
+    def __init__(self, ledger: TridentWriteLedger = None):
+        if not ledger:
+            ledger = _write_ledger
+        self._ledger = ledger
+
+    @property
+    def ledger(self):
+        return self._ledger
+
+    @staticmethod
+    def is_write(query_text: str) -> bool:
+        return _mutating_steps.search(query_text) is not None
+
+    @staticmethod
+    def find_internal_ids(bindings: dict = None, internal_ids=None) -> set:
+        """collects the ids a command touches, from those given directly, and from bindings named for ids"""
+        found = set(internal_ids) if internal_ids else set()
+        if bindings:
+            found.update(str(y) for x, y in bindings.items() if x.endswith(_id_binding_names) and y is not None)
+        return found
+
+    def is_routed_to_writer(self, is_write: bool, touched_ids) -> bool:
+        if is_write:
+            return True
+        return self._ledger.is_recently_written(touched_ids)
+
+
+_write_ledger = TridentWriteLedger()
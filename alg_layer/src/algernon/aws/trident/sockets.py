@@ -0,0 +1,319 @@
+import logging
+import os
+import queue
+import re
+import threading
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import rapidjson
+import websocket
+
+from src.algernon import SigV4Signer
+from src.algernon import TridentNotary, TridentDecoder
+
+_connections = {}
+_connections_lock = threading.Lock()
+_request_id_pattern = re.compile(r'"requestId"\s*:\s*"([^"]+)"')
+_end_of_stream = object()
+
+
+class _PendingRequest:
+    """a request in flight on a session, with the socket it was last sent through
+
+        when frames is set, the data of each frame is handed over as it arrives, rather than gathered for the future
+    """
+    __slots__ = ('future', 'partial_results', 'decoder', 'frames', 'socket')
+
+    def __init__(self, future: Future, decoder, frames: queue.Queue = None):
+        self.future = future
+        self.partial_results = []
+        self.decoder = decoder
+        self.frames = frames
+        self.socket = None
+
+    def add_partial(self, data):
+        if self.frames is not None:
+            self.frames.put(data or [])
+            return
+        self.partial_results.extend(data or [])
+
+    def finish(self, data):
+        if self.frames is not None:
+            self.frames.put(data or [])
+            self.frames.put(_end_of_stream)
+            self.future.set_result(None)
+            return
+        if not self.partial_results:
+            self.future.set_result([] if data is None else data)
+            return
+        self.future.set_result(self.partial_results + (data or []))
+
+    def fail(self, exception):
+        if not self.future.done():
+            self.future.set_exception(exception)
+        if self.frames is not None:
+            self.frames.put(_end_of_stream)
+
+
+class TridentSocketConnection:
+    """A single signed WebSocket session with a Gremlin server, shared by every request sent through it
+
+        requests are written as they are submitted, a reader thread matches each response frame to its request
+        by requestId, gathering the frames of 206 partial responses until the final frame arrives,
+        so any number of requests can be in flight on the session at once,
+        when the socket fails, only the requests sent through that socket are failed
+
+    """
+    _mime_type = b'application/vnd.gremlin-v3.0+json'
+    _success_codes = (200, 204)
+    _partial_code = 206
+
+    def __init__(self, socket_url: str, host: str, signer: SigV4Signer = None, socket_factory=None):
+        """
+
+        Args:
+            socket_url: the ws:// or wss:// url of the gremlin endpoint
+            host: the host header the handshake is signed for, including the port
+            signer: signs the handshake, if not set the handshake is sent unsigned, i.e. for a local server
+            socket_factory: creates the underlying socket, defaults to websocket.create_connection
+        """
+        if not socket_factory:
+            socket_factory = websocket.create_connection
+        self._socket_url = socket_url
+        self._host = host
+        self._signer = signer
+        self._socket_factory = socket_factory
+        self._socket = None
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._request_header = bytes([len(self._mime_type)]) + self._mime_type
+
+    @property
+    def is_connected(self):
+        return self._socket is not None
+
+    def connect(self):
+        handshake_headers = {}
+        if self._signer:
+            handshake_headers = self._signer.sign('GET', self._host, '/gremlin', b'')
+        self._socket = self._socket_factory(
+            self._socket_url, header=[f'{x}: {y}' for x, y in handshake_headers.items()])
+        reader = threading.Thread(target=self._read, args=(self._socket,), daemon=True)
+        reader.start()
+
+    def submit(self, command: str, bindings: dict = None, decoder=None, frames: queue.Queue = None) -> Future:
+        """sends a command without waiting for its response
+
+        Args:
+            command: the gremlin to run
+            bindings: the values bound into the command
+            decoder: decodes the frames of the response, defaults to the TridentDecoder
+            frames: if set, the data of each frame is put here as it arrives, followed by an end of stream marker,
+                and the Future resolves to None once the last frame has arrived
+
+        Returns:
+            a Future which resolves to the decoded result data, once every frame of the response has arrived
+
+        """
+        request_id = str(uuid.uuid4())
+        request_args = {'gremlin': command, 'language': 'gremlin-groovy'}
+        if bindings:
+            request_args['bindings'] = bindings
+        request = {'requestId': request_id, 'op': 'eval', 'processor': '', 'args': request_args}
+        request_frame = self._request_header + rapidjson.dumps(request).encode('utf-8')
+        future = Future()
+        pending = _PendingRequest(future, decoder or TridentDecoder, frames)
+        with self._pending_lock:
+            self._pending[request_id] = pending
+        try:
+            self._send(pending, request_frame)
+        except Exception:
+            self.abandon(future)
+            raise
+        return future
+
+    def _send(self, pending: _PendingRequest, request_frame):
+        with self._send_lock:
+            if not self.is_connected:
+                self.connect()
+            socket = self._socket
+            with self._pending_lock:
+                pending.socket = socket
+            try:
+                socket.send_binary(request_frame)
+            except (websocket.WebSocketException, OSError) as e:
+                logging.warning(f'gremlin socket to {self._socket_url} was closed, reconnecting: {e}')
+                with self._pending_lock:
+                    pending.socket = None
+                self._close(socket)
+                self.connect()
+                with self._pending_lock:
+                    pending.socket = self._socket
+                self._socket.send_binary(request_frame)
+
+    def abandon(self, future: Future):
+        with self._pending_lock:
+            for request_id, pending in list(self._pending.items()):
+                if pending.future is future:
+                    del self._pending[request_id]
+
+    def _read(self, socket):
+        while True:
+            try:
+                frame = socket.recv()
+            except Exception as e:
+                self._fail_pending(socket, e)
+                return
+            if not frame:
+                self._fail_pending(socket, RuntimeError(f'gremlin socket to {self._socket_url} was closed'))
+                return
+            try:
+                self._dispatch(self._decode(frame))
+            except Exception as e:
+                logging.exception(f'could not process a frame from {self._socket_url}: {e}')
+
+    def _decode(self, frame):
+        """decodes a frame with the decoder of the request it answers, found by the requestId at its head"""
+        text = frame if isinstance(frame, str) else frame.decode('utf-8')
+        decoder = TridentDecoder
+        match = _request_id_pattern.search(text)
+        if match is not None:
+            with self._pending_lock:
+                pending = self._pending.get(match.group(1))
+            if pending is not None:
+                decoder = pending.decoder
+        return rapidjson.loads(text, object_hook=decoder.object_hook)
+
+    def _dispatch(self, response):
+        request_id = response.get('requestId')
+        status = response['status']
+        data = response.get('result', {}).get('data')
+        with self._pending_lock:
+            pending = self._pending.get(request_id)
+            if pending is None:
+                return
+            if status['code'] == self._partial_code:
+                pending.add_partial(data)
+                return
+            del self._pending[request_id]
+        if status['code'] not in self._success_codes:
+            pending.fail(RuntimeError(f'error passing command to remote database: {status}'))
+            return
+        pending.finish(data)
+
+    def _fail_pending(self, socket, exception):
+        self._close(socket)
+        with self._pending_lock:
+            failed_ids = [x for x, y in self._pending.items() if y.socket is socket]
+            failed = [self._pending.pop(x) for x in failed_ids]
+        for pending in failed:
+            pending.fail(exception)
+
+    def _close(self, socket):
+        """drops the socket from the session, closing it, and shutting it down when it can not be closed cleanly"""
+        if self._socket is socket:
+            self._socket = None
+        try:
+            socket.close()
+        except Exception as e:
+            logging.debug(f'could not cleanly close gremlin socket to {self._socket_url}: {e}')
+            shutdown = getattr(socket, 'shutdown', None)
+            if shutdown is not None:
+                try:
+                    shutdown()
+                except Exception as e:
+                    logging.debug(f'could not shut down gremlin socket to {self._socket_url}: {e}')
+
+
+class TridentSocketNotary:
+    """Sends commands to Neptune over a persistent WebSocket session, in place of a signed POST per command
+
+        sessions are held at the module level, so a warm Lambda container reuses the session it opened
+        on an earlier invocation, the port and use of TLS can be overridden to point at a local gremlin server
+
+    """
+    _region = TridentNotary._region
+    _service = TridentNotary._service
+
+    def __init__(self, neptune_endpoint, port: int = 8182, use_tls: bool = True, signer=None, timeout: float = 300,
+                 socket_factory=None):
+        if neptune_endpoint is None:
+            raise RuntimeError('must specify neptune endpoint when calling the trident_socket_notary')
+        if signer is None and use_tls:
+            signer = SigV4Signer(self._service, self._region, TridentNotary._get_credentials)
+        scheme = 'wss' if use_tls else 'ws'
+        self._host = f'{neptune_endpoint}:{port}'
+        self._socket_url = f'{scheme}://{self._host}/gremlin'
+        self._signer = signer
+        self._timeout = timeout
+        self._socket_factory = socket_factory
+
+    @classmethod
+    def get_for_writer(cls, **kwargs):
+        endpoint = kwargs.get('graph_db_endpoint', os.getenv('GRAPH_DB_ENDPOINT', None))
+        return cls(endpoint, **cls._get_connection_kwargs(**kwargs))
+
+    @classmethod
+    def get_for_reader(cls, **kwargs):
+        endpoint = kwargs.get('graph_db_reader_endpoint', os.getenv('GRAPH_DB_READER_ENDPOINT', None))
+        return cls(endpoint, **cls._get_connection_kwargs(**kwargs))
+
+    @property
+    def connection(self) -> TridentSocketConnection:
+        with _connections_lock:
+            connection = _connections.get(self._socket_url)
+            if connection is None:
+                connection = TridentSocketConnection(
+                    self._socket_url, self._host, self._signer, self._socket_factory)
+                _connections[self._socket_url] = connection
+        return connection
+
+    def send(self, command, bindings=None):
+        connection = self.connection
+        future = connection.submit(command, bindings)
+        try:
+            return future.result(timeout=self._timeout)
+        except FutureTimeoutError:
+            connection.abandon(future)
+            raise RuntimeError(f'timed out waiting {self._timeout} seconds on the remote database, command: {command}')
+
+    def send_async(self, command, bindings=None) -> Future:
+        return self.connection.submit(command, bindings)
+
+    def stream(self, command, bindings=None, decoder=None):
+        """yields the results of a command as each frame of the response arrives
+
+        Args:
+            command: the gremlin to run
+            bindings: the values bound into the command
+            decoder: decodes each frame, i.e. the TridentColumnarDecoder, defaults to the TridentDecoder
+
+        Raises:
+            RuntimeError: the remote database rejected the command, or no frame arrived within the timeout
+
+        """
+        connection = self.connection
+        frames = queue.Queue()
+        future = connection.submit(command, bindings, decoder, frames)
+        try:
+            while True:
+                try:
+                    data = frames.get(timeout=self._timeout)
+                except queue.Empty:
+                    raise RuntimeError(
+                        f'timed out waiting {self._timeout} seconds on the remote database, command: {command}')
+                if data is _end_of_stream:
+                    break
+                yield from data
+            future.result()
+        finally:
+            if not future.done():
+                connection.abandon(future)
+
+    @staticmethod
+    def _get_connection_kwargs(**kwargs):
+        port = kwargs.get('graph_db_port', os.getenv('GRAPH_DB_PORT', 8182))
+        use_tls = kwargs.get('graph_db_use_tls', os.getenv('GRAPH_DB_USE_TLS', 'true').lower() == 'true')
+        return {'port': int(port), 'use_tls': use_tls}
@@ -0,0 +1,115 @@
+_templates = {}
+
+
+class TridentTemplate:
+    """A gremlin script which takes every value it works with as a binding
+
+        the script text only changes with the shape of the traversal, never with the values sent through it,
+        so the server compiles it once and serves every later call from its script cache,
+        binding names are written into the script as {binding_name}, and may be prefixed when rendered,
+        so many templates can share the bindings of a single batched request
+
+    """
+    def __init__(self, template_name: str, script: str, binding_names: [str]):
+        self._template_name = template_name
+        self._script = script
+        self._binding_names = binding_names
+        self._rendered = {}
+
+    @property
+    def template_name(self):
+        return self._template_name
+
+    @property
+    def binding_names(self):
+        return self._binding_names
+
+    def render(self, namespace: str = '', **binding_values):
+        """produces the script and bindings for a single call of the template
+
+        Args:
+            namespace: prefixed to every binding name, so the bindings do not collide with others in the same request
+            **binding_values: a value for every binding the template declares
+
+        Returns:
+            the script, and the bindings to send with it
+
+        Raises:
+            ValueError: a value was not provided for every binding
+
+        """
+        missing = [x for x in self._binding_names if x not in binding_values]
+        if missing:
+            raise ValueError(f'can not render template {self._template_name}, missing bindings: {missing}')
+        script = self._rendered.get(namespace)
+        if script is None:
+            script = self._script.format(**{x: namespace + x for x in self._binding_names})
+            self._rendered[namespace] = script
+        return script, {namespace + x: binding_values[x] for x in self._binding_names}
+
+
+class TridentTemplates:
+    """The library of named templates, each shape of each template is built once per process"""
+    @classmethod
+    def get_by_id(cls) -> TridentTemplate:
+        return cls._get_template(('get_by_id',), lambda: TridentTemplate(
+            'get_by_id', 'g.V({internal_id})', ['internal_id']))
+
+    @classmethod
+    def upsert_vertex(cls, property_count: int) -> TridentTemplate:
+        """an idempotent upsert of a vertex by id, setting property_count single cardinality properties
+
+        bindings are vertex_id, vertex_label, then property_name_n and property_value_n for each property
+        """
+        def build():
+            property_steps = ''.join(
+                f'.property(single, {{property_name_{i}}}, {{property_value_{i}}})' for i in range(property_count))
+            script = 'g.V({vertex_id}).fold()' \
+                     '.coalesce(unfold(), addV({vertex_label}).property(id, {vertex_id}))' \
+                     f'{property_steps}.id().toList()'
+            return TridentTemplate(
+                f'upsert_vertex_{property_count}', script,
+                ['vertex_id', 'vertex_label'] + cls._generate_property_bindings(property_count))
+        return cls._get_template(('upsert_vertex', property_count), build)
+
+    @classmethod
+    def upsert_edge(cls, property_count: int) -> TridentTemplate:
+        """an idempotent upsert of an edge by id, between two existing vertexes, setting property_count properties
+
+        bindings are edge_id, edge_label, from_id, to_id, then property_name_n and property_value_n for each property
+        """
+        def build():
+            property_steps = ''.join(
+                f'.property({{property_name_{i}}}, {{property_value_{i}}})' for i in range(property_count))
+            script = 'g.E({edge_id}).fold()' \
+                     '.coalesce(unfold(), addE({edge_label}).from(__.V({from_id})).to(__.V({to_id}))' \
+                     '.property(id, {edge_id}))' \
+                     f'{property_steps}.id().toList()'
+            return TridentTemplate(
+                f'upsert_edge_{property_count}', script,
+                ['edge_id', 'edge_label', 'from_id', 'to_id'] + cls._generate_property_bindings(property_count))
+        return cls._get_template(('upsert_edge', property_count), build)
+
+    @staticmethod
+    def generate_property_values(object_properties: dict) -> dict:
+        """flattens a dict of properties into the property_name_n and property_value_n bindings of an upsert"""
+        property_values = {}
+        for i, (property_name, property_value) in enumerate(object_properties.items()):
+            property_values[f'property_name_{i}'] = property_name
+            property_values[f'property_value_{i}'] = property_value
+        return property_values
+
+    @staticmethod
+    def _generate_property_bindings(property_count):
+        binding_names = []
+        for i in range(property_count):
+            binding_names.extend([f'property_name_{i}', f'property_value_{i}'])
+        return binding_names
+
+    @staticmethod
+    def _get_template(template_key, build_fn) -> TridentTemplate:
+        template = _templates.get(template_key)
+        if template is None:
+            template = build_fn()
+            _templates[template_key] = template
+        return template
@@ -1,37 +1,256 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 from src.algernon import TridentNotary
+from src.algernon import TridentSocketNotary
+from src.algernon import TridentTemplate, TridentTemplates
+from src.algernon import TridentRouter
+from src.algernon import TridentColumns, TridentColumnarDecoder
+
+_notary_classes = {
+    'http': TridentNotary,
+    'socket': TridentSocketNotary
+}
+
+
+class TridentChunk:
+    """A group of batched commands sent to the graph as a single script, along with the outcome of sending it"""
+    def __init__(self, commands: [str], bindings: dict):
+        self._commands = commands
+        self._bindings = bindings
+        self._results = None
+        self._exception = None
+
+    @property
+    def commands(self):
+        return self._commands
+
+    @property
+    def command(self):
+        return ';'.join(self._commands)
+
+    @property
+    def bindings(self):
+        return self._bindings
+
+    @property
+    def results(self):
+        return self._results
+
+    @property
+    def exception(self):
+        return self._exception
+
+    @property
+    def is_successful(self):
+        return self._exception is None
+
+    def send(self, notary):
+        try:
+            self._results = notary.send(self.command, self._bindings)
+            self._exception = None
+        except Exception as e:
+            logging.warning(f'batch chunk of {len(self._commands)} commands failed: {e}')
+            self._results = None
+            self._exception = e
+        return self
+
+
+class TridentBatchException(Exception):
+    def __init__(self, chunks: [TridentChunk]):
+        failed_chunks = [x for x in chunks if not x.is_successful]
+        message = f'{len(failed_chunks)} of {len(chunks)} batch chunks failed, ' \
+                  f'first failure: {failed_chunks[0].exception}'
+        super().__init__(message)
+        self.chunks = chunks
+        self.failed_chunks = failed_chunks
 
 
 class TridentDriver:
     def __init__(self, **kwargs):
-        self._read_notary = kwargs.get('read_notary', TridentNotary.get_for_reader(**kwargs))
-        self._write_notary = kwargs.get('write_notary', TridentNotary.get_for_writer(**kwargs))
+        """
+
+        Args:
+            **kwargs:
+                read_notary, write_notary: the notaries to send commands through, built from the transport if not set
+                transport: http to POST each command, socket to share a persistent WebSocket session,
+                    defaults to GRAPH_DB_TRANSPORT, or http
+                batch_size: the most commands sent in a single chunk of a batch, defaults to GRAPH_DB_BATCH_SIZE, or 50
+                batch_bytes: the most script and binding characters sent in a single chunk,
+                    defaults to GRAPH_DB_BATCH_BYTES, or 65536
+                batch_workers: how many chunks of a batch are sent at once, defaults to GRAPH_DB_BATCH_WORKERS, or 4
+                router: decides between the reader and the writer, defaults to a TridentRouter on the shared ledger
+        """
+        notary_class = _notary_classes[kwargs.get('transport', os.getenv('GRAPH_DB_TRANSPORT', 'http'))]
+        read_notary = kwargs.get('read_notary')
+        if read_notary is None:
+            read_notary = notary_class.get_for_reader(**kwargs)
+        write_notary = kwargs.get('write_notary')
+        if write_notary is None:
+            write_notary = notary_class.get_for_writer(**kwargs)
+        self._read_notary = read_notary
+        self._write_notary = write_notary
+        self._batch_size = int(kwargs.get('batch_size', os.getenv('GRAPH_DB_BATCH_SIZE', 50)))
+        self._batch_bytes = int(kwargs.get('batch_bytes', os.getenv('GRAPH_DB_BATCH_BYTES', 65536)))
+        self._batch_workers = int(kwargs.get('batch_workers', os.getenv('GRAPH_DB_BATCH_WORKERS', 4)))
+        self._router = kwargs.get('router') or TridentRouter()
         self._batch_mode = False
+        self._batch_chunks = []
+
+    @property
+    def batch_chunks(self) -> [TridentChunk]:
+        """the chunks sent for the most recent batch, and how each of them fared"""
+        return self._batch_chunks
+
+    @property
+    def failed_chunks(self) -> [TridentChunk]:
+        return [x for x in self._batch_chunks if not x.is_successful]
 
     def get(self, internal_id):
-        command = "g.V('%s')" % internal_id
-        return self.execute(command, True)
+        return self.execute_template(TridentTemplates.get_by_id(), True, internal_id=internal_id)
+
+    def execute(self, query_text, read_only=False, bindings=None, internal_ids=None):
+        """sends a command to the graph, or holds it for the batch while in batch mode
+
+        reads go to the reader endpoint, unless they touch an internal_id written within the read after write window,
+        in which case they are pinned to the writer, so they can not miss a write the replica has not caught up to
+
+        Args:
+            query_text: the gremlin command
+            read_only: True for a read, False for a write, 'auto' to work it out from the steps of the command,
+                defaults to False, so a command is only sent to the reader when its caller says it can be
+            bindings: the values for any variables the command refers to
+            internal_ids: the ids the command touches, in addition to any found in bindings named for ids
 
-    def execute(self, query_text, read_only=False):
+        Raises:
+            ValueError: in batch mode, a binding name is already used by another command in the batch
+
+        """
         if self._batch_mode is True:
-            self._batch_commands.append(query_text)
+            if bindings:
+                colliding = [x for x in bindings if x in self._batch_binding_names]
+                if colliding:
+                    raise ValueError(f'bindings {colliding} are already used by another command in this batch')
+                self._batch_binding_names.update(bindings)
+            self._batch_commands.append((query_text, bindings))
             return
-        notary = self._write_notary
-        if read_only:
-            notary = self._read_notary
-        results = notary.send(query_text)
+        is_write = self._router.is_write(query_text) if read_only == 'auto' else not read_only
+        touched_ids = self._router.find_internal_ids(bindings, internal_ids)
+        notary = self._read_notary
+        if self._router.is_routed_to_writer(is_write, touched_ids):
+            notary = self._write_notary
+        results = notary.send(query_text, bindings)
+        if is_write:
+            self._router.ledger.record_writes(touched_ids)
         return results
 
+    def execute_template(self, template: TridentTemplate, read_only='auto', **binding_values):
+        """renders a template and executes it, in batch mode each template gets its own binding namespace
+
+        the templates are written by the layer, so whether one writes is worked out from its steps,
+        unless read_only is set
+        """
+        namespace = ''
+        if self._batch_mode is True:
+            namespace = f'b{len(self._batch_commands)}_'
+        command, bindings = template.render(namespace, **binding_values)
+        return self.execute(command, read_only, bindings)
+
+    def stream(self, query_text, read_only=True, bindings=None, internal_ids=None):
+        """executes a traversal, yielding its results one at a time as they arrive
+
+        intended for traversals too large to hold in memory at once, streams can not be used in batch mode
+
+        """
+        if self._batch_mode is True:
+            raise RuntimeError('can not stream the results of a command while the driver is in batch mode')
+        return self._route_stream(query_text, read_only, bindings, internal_ids)
+
+    def export(self, query_text, bindings=None, internal_ids=None) -> TridentColumns:
+        """runs a read only traversal, laying its results out as columns as they stream in
+
+        over http the results are decoded straight into rows, without building a Trident object for each element
+
+        """
+        if self._batch_mode is True:
+            raise RuntimeError('can not export the results of a command while the driver is in batch mode')
+        columns = TridentColumns()
+        columns.extend(self._route_stream(query_text, True, bindings, internal_ids, TridentColumnarDecoder()))
+        return columns
+
+    def _route_stream(self, query_text, read_only, bindings, internal_ids, decoder=None):
+        touched_ids = self._router.find_internal_ids(bindings, internal_ids)
+        notary = self._read_notary
+        if self._router.is_routed_to_writer(not read_only, touched_ids):
+            notary = self._write_notary
+        if decoder is None:
+            return notary.stream(query_text, bindings)
+        return notary.stream(query_text, bindings, decoder=decoder)
+
+    def retry_failed_chunks(self) -> [TridentChunk]:
+        """sends the failed chunks of the most recent batch again, leaving the successful ones alone
+
+        Returns:
+            every chunk of the batch, all of them now successful
+
+        Raises:
+            TridentBatchException: some chunks failed again
+
+        """
+        self._send_chunks(self.failed_chunks)
+        if self.failed_chunks:
+            raise TridentBatchException(self._batch_chunks)
+        return self._batch_chunks
+
     def __enter__(self):
         self._batch_commands = []
+        self._batch_binding_names = set()
         self._batch_mode = True
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if not exc_type and not exc_val:
             self._batch_mode = False
-            if self._batch_commands:
-                commands = ';'.join(self._batch_commands)
-                self.execute(commands)
+            self._batch_chunks = self._generate_chunks(self._batch_commands)
             self._batch_commands = []
+            self._batch_binding_names = set()
+            self._send_chunks(self._batch_chunks)
+            if self.failed_chunks:
+                raise TridentBatchException(self._batch_chunks)
             return True
         raise (exc_type(exc_val))
+
+    def _generate_chunks(self, batch_commands) -> [TridentChunk]:
+        """splits the batched commands into chunks, bound by both the number of commands and their size"""
+        chunks = []
+        commands = []
+        bindings = {}
+        chunk_bytes = 0
+        for command, command_bindings in batch_commands:
+            command_bytes = len(command)
+            if command_bindings:
+                command_bytes += sum(len(x) + len(str(y)) for x, y in command_bindings.items())
+            if commands and (len(commands) >= self._batch_size or chunk_bytes + command_bytes > self._batch_bytes):
+                chunks.append(TridentChunk(commands, bindings))
+                commands, bindings, chunk_bytes = [], {}, 0
+            commands.append(command)
+            if command_bindings:
+                bindings.update(command_bindings)
+            chunk_bytes += command_bytes
+        if commands:
+            chunks.append(TridentChunk(commands, bindings))
+        return chunks
+
+    def _send_chunks(self, chunks: [TridentChunk]):
+        if not chunks:
+            return
+        if len(chunks) == 1 or self._batch_workers <= 1:
+            for chunk in chunks:
+                chunk.send(self._write_notary)
+        else:
+            with ThreadPoolExecutor(max_workers=min(self._batch_workers, len(chunks))) as executor:
+                list(executor.map(lambda x: x.send(self._write_notary), chunks))
+        for chunk in chunks:
+            if chunk.is_successful and self._router.is_write(chunk.command):
+                self._router.ledger.record_writes(self._router.find_internal_ids(chunk.bindings))
@@ -0,0 +1,207 @@
+import codecs
+import json
+import re
+
+_whitespace = ' \t\n\r'
+_container_pattern = re.compile(r'["{}\[\]]')
+_string_pattern = re.compile(r'["\\]')
+_scalar_end_pattern = re.compile(r'[\s,:}\]]')
+_continuing_statuses = (206,)
+_successful_statuses = (200, 204, 206)
+
+
+class TridentStreamReader:
+    """Decodes the result.data entries of a Gremlin response one at a time, as the response arrives
+
+        the response may hold several frames back to back, as Neptune sends a 206 status for every frame
+        of a partial response until the last, each entry is handed to the decoder as soon as it is complete,
+        and the text it was parsed from is dropped, so memory is bound by the largest entry rather than the response
+
+    """
+    def __init__(self, byte_chunks, decoder: json.JSONDecoder, compact_size: int = 65536):
+        """
+
+        Args:
+            byte_chunks: an iterable of bytes, i.e. response.iter_content()
+            decoder: a JSONDecoder, its object_hook is applied to every entry
+            compact_size: how much consumed text to hold before it is discarded
+        """
+        self._byte_chunks = iter(byte_chunks)
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._decoder = decoder
+        self._compact_size = compact_size
+        self._buffer = ''
+        self._position = 0
+        self._exhausted = False
+
+    def __iter__(self):
+        while self._peek() is not None:
+            status = yield from self._read_frame()
+            status_code = status.get('code') if status else 200
+            if status_code not in _successful_statuses:
+                raise RuntimeError(f'error reading streamed response from remote database: {status}')
+            if status_code not in _continuing_statuses:
+                return
+
+    def _read_frame(self):
+        status = None
+        self._expect('{')
+        for frame_key in self._read_keys():
+            if frame_key == 'status':
+                status = self._read_value()
+                continue
+            if frame_key != 'result':
+                self._read_value()
+                continue
+            self._expect('{')
+            for result_key in self._read_keys():
+                if result_key == 'data':
+                    yield from self._read_data()
+                    continue
+                self._read_value()
+        return status
+
+    def _read_data(self):
+        next_char = self._peek()
+        if next_char == '[':
+            yield from self._read_entries()
+            return
+        if next_char != '{':
+            data = self._read_value()
+            if data is not None:
+                yield data
+            return
+        self._expect('{')
+        data_type = None
+        data_value = None
+        has_value = False
+        for data_key in self._read_keys():
+            if data_key == '@type':
+                data_type = self._read_value()
+                continue
+            if data_key != '@value':
+                self._read_value()
+                continue
+            if data_type in ('g:List', 'g:Set') and self._peek() == '[':
+                yield from self._read_entries()
+                continue
+            data_value = self._read_value()
+            has_value = True
+        if not has_value:
+            return
+        if data_type in ('g:List', 'g:Set') and isinstance(data_value, list):
+            yield from data_value
+            return
+        yield self._decoder.object_hook({'@type': data_type, '@value': data_value})
+
+    def _read_entries(self):
+        self._expect('[')
+        while True:
+            next_char = self._peek()
+            if next_char == ']':
+                self._position += 1
+                return
+            if next_char == ',':
+                self._position += 1
+                continue
+            yield self._read_value()
+
+    def _read_keys(self):
+        """yields each key of the object being read, leaving the reader positioned on its value"""
+        while True:
+            next_char = self._peek()
+            if next_char == '}':
+                self._position += 1
+                return
+            if next_char == ',':
+                self._position += 1
+                continue
+            object_key = self._read_value()
+            self._expect(':')
+            yield object_key
+
+    def _read_value(self):
+        self._peek()
+        value_end = self._scan_value()
+        value, end = self._decoder.raw_decode(self._buffer, self._position)
+        if end != value_end:
+            raise RuntimeError(f'malformed streamed response, a value ended at {end}, expected {value_end}')
+        self._position = end
+        self._compact()
+        return value
+
+    def _scan_value(self):
+        """pulls chunks until the value at the reader's position is complete, returning where it ends
+
+            the scan picks up where it left off after each chunk, so the text of a large entry is passed over once,
+            and decoded once, rather than decoded again from its start every time a chunk arrives
+
+        """
+        scan_position = self._position
+        first_char = self._buffer[scan_position] if scan_position < len(self._buffer) else None
+        if first_char is None:
+            return scan_position
+        if first_char not in '{["':
+            while True:
+                match = _scalar_end_pattern.search(self._buffer, scan_position)
+                if match is not None:
+                    return match.start()
+                scan_position = len(self._buffer)
+                if not self._pull():
+                    return scan_position
+        depth = 0
+        in_string = False
+        while True:
+            pattern = _string_pattern if in_string else _container_pattern
+            match = pattern.search(self._buffer, scan_position)
+            if match is None:
+                scan_position = max(scan_position, len(self._buffer))
+                if not self._pull():
+                    return scan_position
+                continue
+            found_char = match.group()
+            scan_position = match.end()
+            if found_char == '\\':
+                scan_position += 1
+            elif found_char == '"':
+                in_string = not in_string
+            elif found_char in '{[':
+                depth += 1
+            else:
+                depth -= 1
+            if depth == 0 and not in_string:
+                return scan_position
+
+    def _expect(self, expected_char):
+        next_char = self._peek()
+        if next_char != expected_char:
+            raise RuntimeError(f'malformed streamed response, expected {expected_char}, found {next_char}')
+        self._position += 1
+
+    def _peek(self):
+        """skips whitespace, then returns the next character without consuming it, or None at the end of the stream"""
+        while True:
+            buffer_length = len(self._buffer)
+            while self._position < buffer_length and self._buffer[self._position] in _whitespace:
+                self._position += 1
+            if self._position < buffer_length:
+                return self._buffer[self._position]
+            if not self._pull():
+                return None
+
+    def _pull(self):
+        if self._exhausted:
+            return False
+        for byte_chunk in self._byte_chunks:
+            text = self._text_decoder.decode(byte_chunk)
+            if text:
+                self._buffer += text
+                return True
+        self._buffer += self._text_decoder.decode(b'', final=True)
+        self._exhausted = True
+        return False
+
+    def _compact(self):
+        if self._position >= self._compact_size:
+            self._buffer = self._buffer[self._position:]
+            self._position = 0
@@ -0,0 +1,191 @@
+import base64
+import struct
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import msgpack
+import pytz
+from jsonref import JsonRef
+
+from src.algernon import AlgObject
+from src.algernon import AlgTypeRegistry
+
+_alg_object_tag = 1
+_tuple_tag = 2
+_set_tag = 3
+_frozenset_tag = 4
+_datetime_tag = 5
+_decimal_tag = 6
+_big_int_tag = 7
+_raw_map_tag = 8
+
+_max_int = 2 ** 64 - 1
+_min_int = -(2 ** 63)
+
+
+class _EnvelopeTag:
+    def __init__(self, tag_code):
+        self.tag_code = tag_code
+
+
+_tag_markers = {x: msgpack.ExtType(x, b'') for x in range(_alg_object_tag, _raw_map_tag + 1)}
+_decoded_markers = {x: _EnvelopeTag(x) for x in _tag_markers}
+
+
+class AlgEnvelope:
+    """A compact binary alternative to AlgJson, for sending AlgObject graphs between tasks
+
+        the body is MessagePack, every (_alg_module, _alg_class) pair is written once to a type table,
+        and every dict key once to a string table, the body then refers to both by position,
+        the packed bytes are base64 encoded behind a short text header, so the envelope can travel through SNS and SQS
+
+    """
+    header = 'algpk1:'
+
+    @classmethod
+    def is_enveloped(cls, message) -> bool:
+        return isinstance(message, str) and message.startswith(cls.header)
+
+    @classmethod
+    def dumps(cls, obj) -> str:
+        return cls.header + base64.b64encode(cls.pack(obj)).decode('ascii')
+
+    @classmethod
+    def loads(cls, envelope_string: str):
+        if not cls.is_enveloped(envelope_string):
+            raise ValueError(f'can not load {envelope_string[:32]}, it does not start with {cls.header}')
+        return cls.unpack(base64.b64decode(envelope_string[len(cls.header):]))
+
+    @classmethod
+    def pack(cls, obj) -> bytes:
+        encoder = _EnvelopeEncoder()
+        body = msgpack.packb(encoder.encode(obj), use_bin_type=True)
+        tables = msgpack.packb([encoder.type_table, encoder.string_table], use_bin_type=True)
+        return struct.pack('>I', len(tables)) + tables + body
+
+    @classmethod
+    def unpack(cls, packed: bytes):
+        tables_length = struct.unpack('>I', packed[:4])[0]
+        type_table, string_table = msgpack.unpackb(packed[4:4 + tables_length], raw=False)
+        decoder = _EnvelopeDecoder(type_table, string_table)
+        return msgpack.unpackb(
+            packed[4 + tables_length:], raw=False, strict_map_key=False, ext_hook=decoder.ext_hook,
+            list_hook=decoder.list_hook, object_pairs_hook=decoder.object_pairs_hook)
+
+
+class _EnvelopeEncoder:
+    def __init__(self):
+        self._type_ids = {}
+        self._string_ids = {}
+
+    @property
+    def type_table(self):
+        return [list(x) for x in self._type_ids]
+
+    @property
+    def string_table(self):
+        return list(self._string_ids)
+
+    def encode(self, obj):
+        if obj is None or isinstance(obj, (str, bool, float, bytes)):
+            return obj
+        if isinstance(obj, int):
+            if _min_int <= obj <= _max_int:
+                return obj
+            return [_tag_markers[_big_int_tag], str(obj)]
+        if isinstance(obj, dict):
+            return self._encode_dict(obj)
+        if isinstance(obj, list):
+            return [self.encode(x) for x in obj]
+        if isinstance(obj, AlgObject):
+            type_id = self._intern(self._type_ids, (str(obj.__module__), type(obj).__name__))
+            return [_tag_markers[_alg_object_tag], type_id, self.encode(obj.to_json)]
+        if isinstance(obj, tuple):
+            return [_tag_markers[_tuple_tag]] + [self.encode(x) for x in obj]
+        if isinstance(obj, frozenset):
+            return [_tag_markers[_frozenset_tag]] + [self.encode(x) for x in obj]
+        if isinstance(obj, set):
+            return [_tag_markers[_set_tag]] + [self.encode(x) for x in obj]
+        if isinstance(obj, datetime):
+            return [_tag_markers[_datetime_tag], obj.timestamp(), self._encode_tz_info(obj)]
+        if isinstance(obj, Decimal):
+            return [_tag_markers[_decimal_tag], str(obj)]
+        if isinstance(obj, JsonRef):
+            return self.encode(obj.__subject__)
+        raise TypeError(f'object of type {type(obj).__name__} can not be packed into an AlgEnvelope')
+
+    def _encode_dict(self, obj: dict):
+        if all(isinstance(x, str) for x in obj):
+            return {self._intern(self._string_ids, x): self.encode(y) for x, y in obj.items()}
+        return [_tag_markers[_raw_map_tag], [[self.encode(x), self.encode(y)] for x, y in obj.items()]]
+
+    @staticmethod
+    def _encode_tz_info(obj: datetime):
+        """the pytz zone name when there is one, otherwise the fixed UTC offset of the datetime in seconds"""
+        if obj.tzinfo is None:
+            return None
+        zone_name = getattr(obj.tzinfo, 'zone', None)
+        if zone_name:
+            return zone_name
+        utc_offset = obj.utcoffset()
+        if utc_offset is None:
+            return None
+        return int(utc_offset.total_seconds())
+
+    @staticmethod
+    def _intern(table, entry):
+        try:
+            return table[entry]
+        except KeyError:
+            entry_id = len(table)
+            table[entry] = entry_id
+            return entry_id
+
+
+class _EnvelopeDecoder:
+    def __init__(self, type_table, string_table):
+        self._type_table = [tuple(x) for x in type_table]
+        self._string_table = string_table
+        self._tag_decoders = {
+            _alg_object_tag: self._decode_alg_object,
+            _tuple_tag: tuple,
+            _set_tag: set,
+            _frozenset_tag: frozenset,
+            _datetime_tag: self._decode_datetime,
+            _decimal_tag: lambda x: Decimal(x[0]),
+            _big_int_tag: lambda x: int(x[0]),
+            _raw_map_tag: lambda x: {y[0]: y[1] for y in x[0]}
+        }
+
+    @staticmethod
+    def ext_hook(tag_code, data):
+        try:
+            return _decoded_markers[tag_code]
+        except KeyError:
+            return msgpack.ExtType(tag_code, data)
+
+    def list_hook(self, obj):
+        if obj and type(obj[0]) is _EnvelopeTag:
+            return self._tag_decoders[obj[0].tag_code](obj[1:])
+        return obj
+
+    def object_pairs_hook(self, pairs):
+        string_table = self._string_table
+        return {string_table[x]: y for x, y in pairs}
+
+    def _decode_alg_object(self, tagged):
+        type_id, obj_value = tagged
+        alg_module, alg_class = self._type_table[type_id]
+        constructor = AlgTypeRegistry.get_constructor(alg_module, alg_class)
+        if constructor is None:
+            raise RuntimeError(f'alg_class: {alg_class}, in alg_module: {alg_module} could not be located')
+        return constructor(obj_value)
+
+    @staticmethod
+    def _decode_datetime(tagged):
+        timestamp, tz_info = tagged
+        if tz_info is None:
+            return datetime.fromtimestamp(timestamp)
+        if isinstance(tz_info, str):
+            return datetime.fromtimestamp(timestamp, pytz.timezone(tz_info))
+        return datetime.fromtimestamp(timestamp, timezone(timedelta(seconds=tz_info)))
@@ -51,6 +51,90 @@ class AlgEncoder(json.JSONEncoder):
         return super(AlgEncoder, cls()).default(obj)
 
 
+def _decode_datetime(obj_value):
+    tz_info = obj_value['tz']
+    timestamp = obj_value['timestamp']
+    if tz_info is None:
+        return datetime.fromtimestamp(timestamp)
+    return datetime.fromtimestamp(timestamp, pytz.timezone(tz_info))
+
+
+_builtin_decoders = {
+    'frozenset': frozenset,
+    'set': set,
+    'tuple': tuple,
+    'datetime': _decode_datetime,
+    'decimal': Decimal
+}
+
+_gql_builtin_decoders = {
+    'frozenset': frozenset,
+    'tuple': tuple,
+    'datetime': str,
+    'decimal': Decimal
+}
+
+
+class AlgTypeRegistry:
+    """Maps the (_alg_module, _alg_class) of an encoded AlgObject to a callable which rebuilds it
+
+    each module is imported, and each constructor compiled, once per process instead of once per decoded object
+
+    """
+    _constructors = {}
+
+    @classmethod
+    def get_constructor(cls, alg_module, alg_class):
+        """returns the constructor for an encoded AlgObject, or None if the class can not be found"""
+        registry_key = (alg_module, alg_class)
+        try:
+            return cls._constructors[registry_key]
+        except KeyError:
+            pass
+        host_module = importlib.import_module(alg_module)
+        obj_class = getattr(host_module, alg_class, None)
+        constructor = None
+        if obj_class is not None:
+            constructor = cls.compile_constructor(obj_class)
+        cls._constructors[registry_key] = constructor
+        return constructor
+
+    @classmethod
+    def register(cls, obj_class, alg_module=None):
+        if not alg_module:
+            alg_module = obj_class.__module__
+        cls._constructors[(alg_module, obj_class.__name__)] = cls.compile_constructor(obj_class)
+
+    @staticmethod
+    def compile_constructor(obj_class):
+        """builds a constructor which behaves as obj_class.from_json, without paying for a KeyError on every call
+
+        AlgObject.from_json tries parse_json on the encoded dict, then again with the leading underscores removed,
+        the compiled constructor remembers which form a class accepts, and tries that one first from then on
+
+        """
+        if getattr(obj_class.from_json, '__func__', None) is not AlgObject.from_json.__func__:
+            return obj_class.from_json
+        parse_json = obj_class.parse_json
+        strip_json = obj_class.strip_json
+        strip_first = []
+
+        def construct(json_dict):
+            if strip_first:
+                try:
+                    return parse_json(strip_json(json_dict))
+                except KeyError:
+                    return parse_json(json_dict)
+            try:
+                return parse_json(json_dict)
+            except KeyError:
+                stripped = parse_json(strip_json(json_dict))
+                strip_first.append(True)
+                return stripped
+
+        return construct
+
+
 class AlgDecoder(json.JSONDecoder):
     def __init__(self, *args, **kwargs):
         json.JSONDecoder.__init__(self, object_hook=self.object_hook, *args, **kwargs)
@@ -60,29 +144,16 @@ class AlgDecoder(json.JSONDecoder):
         if '_alg_class' not in obj:
             return obj
         alg_class = obj['_alg_class']
-        obj_value = obj['value']
-        if alg_class == 'frozenset':
-            return frozenset(x for x in obj_value)
-        if alg_class == 'set':
-            return set(x for x in obj_value)
-        if alg_class == 'tuple':
-            return tuple(x for x in obj_value)
-        if alg_class == 'datetime':
-            tz_info = obj_value['tz']
-            timestamp = obj_value['timestamp']
-            if tz_info is None:
-                return datetime.fromtimestamp(timestamp)
-            return datetime.fromtimestamp(timestamp, pytz.timezone(tz_info))
-        if alg_class == 'decimal':
-            return Decimal(obj_value)
-        if '_alg_module' not in obj:
+        builtin_decoder = _builtin_decoders.get(alg_class)
+        if builtin_decoder is not None:
+            return builtin_decoder(obj['value'])
+        alg_module = obj.get('_alg_module')
+        if alg_module is None:
             return obj
-        alg_module = obj['_alg_module']
-        host_module = importlib.import_module(alg_module)
-        obj_class = getattr(host_module, alg_class, None)
-        if obj_class is None:
+        constructor = AlgTypeRegistry.get_constructor(alg_module, alg_class)
+        if constructor is None:
             raise RuntimeError(f'alg_class: {alg_class}, in alg_module: {alg_module} could not be located')
-        return obj_class.from_json(obj_value)
+        return constructor(obj['value'])
 
 
 class GqlDecoder(json.JSONDecoder):
@@ -94,23 +165,16 @@ class GqlDecoder(json.JSONDecoder):
         if '_alg_class' not in obj:
             return obj
         alg_class = obj['_alg_class']
-        obj_value = obj['value']
-        if alg_class == 'frozenset':
-            return frozenset(x for x in obj_value)
-        if alg_class == 'tuple':
-            return tuple(x for x in obj_value)
-        if alg_class == 'datetime':
-            return str(obj_value)
-        if alg_class == 'decimal':
-            return Decimal(obj_value)
-        if '_alg_module' not in obj:
+        builtin_decoder = _gql_builtin_decoders.get(alg_class)
+        if builtin_decoder is not None:
+            return builtin_decoder(obj['value'])
+        alg_module = obj.get('_alg_module')
+        if alg_module is None:
             return obj
-        alg_module = obj['_alg_module']
-        host_module = importlib.import_module(alg_module)
-        obj_class = getattr(host_module, alg_class, None)
-        if obj_class is None:
+        constructor = AlgTypeRegistry.get_constructor(alg_module, alg_class)
+        if constructor is None:
             return obj
-        alg_obj = obj_class.from_json(obj_value)
+        alg_obj = constructor(obj['value'])
         return alg_obj.to_gql
 
 
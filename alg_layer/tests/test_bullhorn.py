@@ -0,0 +1,68 @@
+import pytest
+
+from src.algernon import Bullhorn
+
+
+class _SnsStandIn:
+    """answers PublishBatch calls, failing the retried bodies on the first attempt, the rejected ones on every attempt,
+        and raising for any batch holding a raising body
+    """
+    def __init__(self, retried_bodies=(), rejected_bodies=(), raising_bodies=()):
+        self.retried_bodies = set(retried_bodies)
+        self.rejected_bodies = set(rejected_bodies)
+        self.raising_bodies = set(raising_bodies)
+        self.published = []
+        self.call_count = 0
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries):
+        self.call_count += 1
+        if any(x['Message'] in self.raising_bodies for x in PublishBatchRequestEntries):
+            raise RuntimeError('the service could not be reached')
+        response = {'Successful': [], 'Failed': []}
+        for entry in PublishBatchRequestEntries:
+            message_body = entry['Message']
+            if message_body in self.rejected_bodies:
+                response['Failed'].append({'Id': entry['Id'], 'Code': 'InvalidParameter', 'SenderFault': True})
+                continue
+            if message_body in self.retried_bodies:
+                self.retried_bodies.remove(message_body)
+                response['Failed'].append({'Id': entry['Id'], 'Code': 'InternalError', 'SenderFault': False})
+                continue
+            self.published.append(message_body)
+            response['Successful'].append({'Id': entry['Id'], 'MessageId': f'message_{message_body}'})
+        return response
+
+
+class TestBullhorn:
+    def test_publish_batch_returns_failed_entries_after_partial_success(self):
+        sns_stand_in = _SnsStandIn(retried_bodies=['1'], rejected_bodies=['2'])
+        message_ids, failed = Bullhorn(sns_stand_in).publish_batch('new_event', 'some_arn', ['0', '1', '2'])
+        assert message_ids == ['message_0', 'message_1', None]
+        assert [x['Id'] for x in failed] == ['2']
+        assert sns_stand_in.published == ['0', '1']
+
+    def test_publish_batch_limits(self):
+        sns_stand_in = _SnsStandIn(rejected_bodies=['0'])
+        with pytest.raises(ValueError):
+            Bullhorn(sns_stand_in).publish_batch('new_event', 'some_arn', [str(x) for x in range(11)])
+        assert sns_stand_in.call_count == 0
+        with pytest.raises(RuntimeError):
+            Bullhorn(sns_stand_in).publish_batch('new_event', 'some_arn', ['0'])
+
+    def test_buffer_holds_failed_messages(self):
+        sns_stand_in = _SnsStandIn(rejected_bodies=['3'])
+        with Bullhorn(sns_stand_in).buffer('new_event', 'some_arn') as buffer:
+            for message_number in range(25):
+                buffer.publish(str(message_number))
+        assert len(buffer.message_ids) == 24
+        assert buffer.failed_messages == ['3']
+        assert sorted(sns_stand_in.published, key=int) == [str(x) for x in range(25) if x != 3]
+
+    def test_buffer_accounts_for_every_batch_when_one_raises(self):
+        sns_stand_in = _SnsStandIn(rejected_bodies=['3'], raising_bodies=['15'])
+        buffer = Bullhorn(sns_stand_in).buffer('new_event', 'some_arn', max_workers=1)
+        for message_number in range(25):
+            buffer.publish(str(message_number))
+        message_ids = buffer.flush()
+        assert len(message_ids) == 14
+        assert sorted(buffer.failed_messages, key=int) == ['3'] + [str(x) for x in range(10, 20)]
@@ -0,0 +1,53 @@
+import threading
+
+import pytest
+
+from src.algernon import ClientPool
+
+
+@pytest.fixture
+def client_pool(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('AWS_MAX_POOL_CONNECTIONS', '32')
+    ClientPool.reset()
+    yield ClientPool
+    ClientPool.reset()
+
+
+def _collect_from_threads(fn, thread_count=4):
+    collected = []
+    threads = [threading.Thread(target=lambda: collected.append(fn())) for _ in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return collected
+
+
+class TestClientPool:
+    def test_clients_are_shared_across_threads(self, client_pool):
+        clients = _collect_from_threads(lambda: client_pool.get_client('dynamodb'))
+        assert all(x is clients[0] for x in clients)
+        assert client_pool.get_client('dynamodb') is clients[0]
+        assert client_pool.get_client('sns') is not clients[0]
+        assert clients[0].meta.config.max_pool_connections == 32
+
+    def test_resources_are_held_per_thread(self, client_pool):
+        resource = client_pool.get_resource('s3')
+        assert client_pool.get_resource('s3') is resource
+        resources = _collect_from_threads(lambda: client_pool.get_resource('s3'))
+        assert len({id(x) for x in resources + [resource]}) == 5
+
+    def test_reset_rebuilds_clients(self, client_pool):
+        client = client_pool.get_client('kms')
+        client_pool.reset()
+        assert client_pool.get_client('kms') is not client
+
+    def test_config_without_keepalive_support(self, client_pool, monkeypatch):
+        from botocore.config import Config
+
+        assert client_pool.get_config().tcp_keepalive is True
+        monkeypatch.delitem(Config.OPTION_DEFAULTS, 'tcp_keepalive')
+        config = client_pool.get_config()
+        assert config.max_pool_connections == 32
+        assert 'tcp_keepalive' not in config._user_provided_options
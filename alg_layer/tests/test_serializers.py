@@ -0,0 +1,75 @@
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+from src.algernon import AlgObject
+from src.algernon import AlgEnvelope
+from src.algernon import AlgDecoder, AlgTypeRegistry
+
+
+class RegisteredThing(AlgObject):
+    def __init__(self, thing_name, thing_values):
+        self._thing_name = thing_name
+        self._thing_values = thing_values
+
+    @classmethod
+    def parse_json(cls, json_dict):
+        return cls(json_dict['thing_name'], json_dict['thing_values'])
+
+
+def _generate_encoded_thing(thing_name):
+    return json.dumps({
+        '_alg_class': 'RegisteredThing',
+        '_alg_module': __name__,
+        'value': {
+            '_thing_name': thing_name,
+            '_thing_values': {'_alg_class': 'tuple', 'value': [1, 2]}
+        }
+    })
+
+
+class TestAlgTypeRegistry:
+    def test_decode_underscored_object(self):
+        for thing_name in ('first', 'second'):
+            decoded = json.loads(_generate_encoded_thing(thing_name), cls=AlgDecoder)
+            assert isinstance(decoded, RegisteredThing)
+            assert decoded._thing_name == thing_name
+            assert decoded._thing_values == (1, 2)
+
+    def test_modules_imported_once(self):
+        AlgTypeRegistry._constructors.pop((__name__, 'RegisteredThing'), None)
+        with patch('importlib.import_module', wraps=__import__('importlib').import_module) as import_module:
+            for thing_name in ('first', 'second', 'third'):
+                json.loads(_generate_encoded_thing(thing_name), cls=AlgDecoder)
+        assert import_module.call_count == 1
+
+
+class TestAlgEnvelope:
+    def test_round_trip(self):
+        message = {
+            'task_name': 'generate_source_vertex',
+            'things': [RegisteredThing(f'thing_{i}', (i, Decimal('1.5'), frozenset(['a']))) for i in range(10)],
+            'raw_keys': {1: 'one', (2, 3): 'two_three'}
+        }
+        enveloped = AlgEnvelope.dumps(message)
+        assert AlgEnvelope.is_enveloped(enveloped)
+        unpacked = AlgEnvelope.loads(enveloped)
+        assert unpacked['task_name'] == 'generate_source_vertex'
+        assert unpacked['raw_keys'] == {1: 'one', (2, 3): 'two_three'}
+        assert [x._thing_name for x in unpacked['things']] == [f'thing_{i}' for i in range(10)]
+        assert unpacked['things'][4]._thing_values == (4, Decimal('1.5'), frozenset(['a']))
+
+    def test_aware_datetimes(self):
+        import pytz
+        from datetime import datetime, timedelta, timezone
+
+        from dateutil import tz
+
+        moments = [
+            pytz.timezone('US/Eastern').localize(datetime(2019, 3, 1, 12, 30)),
+            datetime(2019, 3, 1, 12, 30, tzinfo=timezone(timedelta(hours=-5))),
+            datetime(2019, 3, 1, 12, 30, tzinfo=tz.gettz('US/Pacific'))
+        ]
+        unpacked = AlgEnvelope.loads(AlgEnvelope.dumps(moments))
+        assert unpacked == moments
+        assert [x.utcoffset() for x in unpacked] == [x.utcoffset() for x in moments]
@@ -0,0 +1,77 @@
+import calendar
+import time
+
+import pytest
+
+from src.algernon import SigV4Signer, GqlNotary, GqlConnection
+
+_example_credentials = ('AKIDEXAMPLE', 'wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY', None)
+_example_time = calendar.timegm((2015, 8, 30, 12, 36, 0))
+_one_day = 24 * 60 * 60
+
+
+@pytest.fixture
+def signing_keys(monkeypatch):
+    """the signing keys cached by the process, emptied for the test, with the clock fixed to the example request"""
+    monkeypatch.setattr(time, 'time', lambda: _example_time)
+    signing_keys = SigV4Signer._get_signing_key.__globals__['_signing_keys']
+    signing_keys.clear()
+    yield signing_keys
+    signing_keys.clear()
+
+
+def _build_signer(credentials=_example_credentials, service='service', region='us-east-1'):
+    return SigV4Signer(service, region, lambda: credentials)
+
+
+class _GqlSessionStandIn:
+    """answers the first post with a 403, and every one after with a 200"""
+    def __init__(self):
+        self.authorizations = []
+
+    def post(self, url, headers, json):
+        self.authorizations.append(headers['Authorization'])
+        status_code = 403 if len(self.authorizations) == 1 else 200
+        return type('Response', (), {'status_code': status_code, 'text': '{}', 'content': b'{}'})
+
+
+class TestSigV4Signer:
+    def test_get_vanilla(self, signing_keys):
+        """the get-vanilla request of the AWS Signature Version 4 test suite"""
+        headers = _build_signer().sign('GET', 'example.amazonaws.com', '/')
+        assert headers['x-amz-date'] == '20150830T123600Z'
+        assert headers['Authorization'] == (
+            'AWS4-HMAC-SHA256 Credential=AKIDEXAMPLE/20150830/us-east-1/service/aws4_request, '
+            'SignedHeaders=host;x-amz-date, '
+            'Signature=5fa00fa31553b73ebf1942676e86291e8372ff2a2260956d9b8aae1d763fbf31')
+        assert 'X-Amz-Security-Token' not in headers
+
+    def test_signing_keys_are_cached_per_day(self, signing_keys, monkeypatch):
+        _build_signer().sign('GET', 'example.amazonaws.com', '/')
+        signing_key = next(iter(signing_keys.values()))
+        _build_signer().sign('POST', 'example.amazonaws.com', '/', b'{}')
+        assert list(signing_keys.values()) == [signing_key]
+        _build_signer(region='us-west-2').sign('GET', 'example.amazonaws.com', '/')
+        _build_signer(service='appsync').sign('GET', 'example.amazonaws.com', '/')
+        assert len(signing_keys) == 3
+        monkeypatch.setattr(time, 'time', lambda: _example_time + _one_day)
+        headers = _build_signer().sign('GET', 'example.amazonaws.com', '/')
+        assert '/20150831/us-east-1/service/' in headers['Authorization']
+        assert len(signing_keys) == 4
+
+    def test_signing_keys_are_capped(self, signing_keys, monkeypatch):
+        for day in range(40):
+            monkeypatch.setattr(time, 'time', lambda: _example_time + day * _one_day)
+            _build_signer().sign('GET', 'example.amazonaws.com', '/')
+            assert 0 < len(signing_keys) <= 32
+
+
+class TestGqlNotary:
+    def test_forbidden_refreshes_credentials(self, signing_keys):
+        issued_credentials = iter([('STALEKEY', 'stale_secret', 'stale_token'), _example_credentials])
+        notary = GqlNotary('example.amazonaws.com', SigV4Signer('appsync', 'us-east-1', lambda: next(issued_credentials)))
+        session = _GqlSessionStandIn()
+        GqlConnection('example.amazonaws.com', session, notary).query('query { vertex }', {})
+        assert len(session.authorizations) == 2
+        assert session.authorizations[0].startswith('AWS4-HMAC-SHA256 Credential=STALEKEY/')
+        assert session.authorizations[1].startswith('AWS4-HMAC-SHA256 Credential=AKIDEXAMPLE/')
@@ -0,0 +1,57 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from src.algernon import queued
+
+
+def _generate_queued_event(*messages):
+    records = []
+    for i, message in enumerate(messages):
+        body_object = {'Message': json.dumps(message)}
+        records.append({'messageId': f'message_{i}', 'body': json.dumps(body_object)})
+    return {'Records': records}
+
+
+class TestQueued:
+    def test_partial_batch_failure(self):
+        @queued
+        def production_fn(event, context):
+            if event['explode']:
+                raise RuntimeError('boom')
+            return event['value']
+
+        event = _generate_queued_event(
+            {'explode': False, 'value': 1}, {'explode': True, 'value': 2}, {'explode': False, 'value': 3})
+        results = production_fn(event, MagicMock(name='context'))
+        assert results['batchItemFailures'] == [{'itemIdentifier': 'message_1'}]
+        assert results['results'] == [1, None, 3]
+
+    def test_concurrent_batch_keeps_order(self, monkeypatch):
+        import time
+
+        @queued
+        def production_fn(event, context):
+            time.sleep(event['delay'])
+            if event['explode']:
+                raise RuntimeError('boom')
+            return event['value']
+
+        monkeypatch.setenv('QUEUED_CONCURRENCY', '4')
+        event = _generate_queued_event(
+            {'explode': False, 'value': 1, 'delay': 0.05}, {'explode': True, 'value': 2, 'delay': 0.02},
+            {'explode': False, 'value': 3, 'delay': 0.01}, {'explode': False, 'value': 4, 'delay': 0})
+        results = production_fn(event, MagicMock(name='context'))
+        assert results['batchItemFailures'] == [{'itemIdentifier': 'message_1'}]
+        assert results['results'] == [1, None, 3, 4]
+
+    def test_record_without_message_id_fails_the_invocation(self):
+        @queued
+        def production_fn(event, context):
+            raise RuntimeError('boom')
+
+        event = _generate_queued_event({'value': 1})
+        del event['Records'][0]['messageId']
+        with pytest.raises(KeyError):
+            production_fn(event, MagicMock(name='context'))
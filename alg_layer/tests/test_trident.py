@@ -0,0 +1,301 @@
+import json
+import queue
+
+import pytest
+
+from src.algernon import TridentDecoder, TridentVertex, TridentEdge, TridentProperty
+from src.algernon import TridentStreamReader
+from src.algernon import TridentSocketNotary
+from src.algernon import TridentDriver, TridentTemplates, TridentBatchException
+from src.algernon import TridentRouter, TridentWriteLedger
+from src.algernon import TridentColumns, TridentColumnarDecoder
+
+
+def _generate_vertex(vertex_id):
+    return {
+        '@type': 'g:Vertex',
+        '@value': {
+            'id': vertex_id,
+            'label': 'TestVertex',
+            'properties': {
+                'id_value': [{
+                    '@type': 'g:VertexProperty',
+                    '@value': {'id': f'{vertex_id}_id_value', 'label': 'id_value',
+                               'value': {'@type': 'g:Int64', '@value': 1001}}
+                }],
+                'score': [{
+                    '@type': 'g:VertexProperty',
+                    '@value': {'id': f'{vertex_id}_score', 'label': 'score',
+                               'value': {'@type': 'g:Double', '@value': 0.5}}
+                }]
+            }
+        }
+    }
+
+
+def _generate_response(*data_entries, status_code=200):
+    return json.dumps({
+        'requestId': 'some_request_id',
+        'status': {'message': '', 'code': status_code, 'attributes': {'@type': 'g:Map', '@value': []}},
+        'result': {'data': {'@type': 'g:List', '@value': list(data_entries)}, 'meta': {'@type': 'g:Map', '@value': []}}
+    })
+
+
+class TestTridentDecoder:
+    def test_single_pass_decode(self):
+        edge = {
+            '@type': 'g:Edge',
+            '@value': {'id': 'edge_1', 'label': '_connected_to', 'inV': 'vertex_2', 'inVLabel': 'TestVertex',
+                       'outV': 'vertex_1', 'outVLabel': 'TestVertex'}
+        }
+        counts = {'@type': 'g:Map', '@value': ['TestVertex', {'@type': 'g:Int64', '@value': 2}]}
+        response = _generate_response(_generate_vertex('vertex_1'), edge, counts)
+        decoded = TridentDecoder.loads(response.encode('utf-8'))
+        vertex, decoded_edge, decoded_counts = decoded['result']['data']
+        assert isinstance(vertex, TridentVertex)
+        id_value = vertex.vertex_properties['id_value'][0]
+        assert isinstance(id_value, TridentProperty)
+        assert id_value.value == 1001
+        assert vertex.vertex_properties['score'][0].value == 0.5
+        assert isinstance(decoded_edge, TridentEdge)
+        assert decoded_counts == {'TestVertex': 2}
+
+
+class TestTridentStreamReader:
+    def test_multi_frame_stream(self):
+        frames = [
+            _generate_response(*[_generate_vertex(f'vertex_{i}') for i in range(3)], status_code=206),
+            _generate_response(*[_generate_vertex(f'vertex_{i}') for i in range(3, 5)], status_code=206),
+            _generate_response(status_code=200)
+        ]
+        response_bytes = '\n'.join(frames).encode('utf-8')
+        byte_chunks = [response_bytes[i:i + 7] for i in range(0, len(response_bytes), 7)]
+        streamed = list(TridentStreamReader(byte_chunks, TridentDecoder(), compact_size=128))
+        assert [x.vertex_id for x in streamed] == [f'vertex_{i}' for i in range(5)]
+        assert all(x.vertex_properties['id_value'][0].value == 1001 for x in streamed)
+
+    def test_large_entries_are_decoded_once(self):
+        class CountingDecoder(TridentDecoder):
+            decode_count = 0
+
+            def raw_decode(self, s, idx=0):
+                CountingDecoder.decode_count += 1
+                return super().raw_decode(s, idx)
+
+        vertex = _generate_vertex('vertex_0')
+        vertex['@value']['label'] = 'Test\\"Vertex ' * 500
+        response_bytes = _generate_response(vertex).encode('utf-8')
+        byte_chunks = [response_bytes[i:i + 16] for i in range(0, len(response_bytes), 16)]
+        streamed = list(TridentStreamReader(byte_chunks, CountingDecoder(), compact_size=128))
+        assert streamed[0].vertex_label == vertex['@value']['label']
+        assert CountingDecoder.decode_count < len(byte_chunks) / 10
+
+    def test_value_before_type(self):
+        response = json.dumps({
+            'status': {'code': 200},
+            'result': {'data': {'@value': [_generate_vertex('vertex_0'), 1001], '@type': 'g:List'}}
+        })
+        streamed = list(TridentStreamReader([response.encode('utf-8')], TridentDecoder()))
+        assert streamed[0].vertex_id == 'vertex_0'
+        assert streamed[1] == 1001
+
+
+class TestTridentColumns:
+    def test_mixed_results_share_columns(self):
+        edge = {
+            '@type': 'g:Edge',
+            '@value': {'id': 'edge_1', 'label': '_connected_to', 'inV': 'vertex_2', 'inVLabel': 'TestVertex',
+                       'outV': 'vertex_1', 'outVLabel': 'TestVertex'}
+        }
+        value_map = {'@type': 'g:Map', '@value': [
+            {'@type': 'g:T', '@value': 'id'}, 'vertex_3', 'score', {'@type': 'g:List', '@value': [
+                {'@type': 'g:Double', '@value': 0.75}]}]}
+        path = {'@type': 'g:Path', '@value': {
+            'labels': {'@type': 'g:List', '@value': [
+                {'@type': 'g:Set', '@value': ['source']}, {'@type': 'g:Set', '@value': []}]},
+            'objects': {'@type': 'g:List', '@value': [_generate_vertex('vertex_4'), _generate_vertex('vertex_5')]}
+        }}
+        response = _generate_response(_generate_vertex('vertex_1'), edge, value_map, path)
+        columns = TridentColumns.from_response(response)
+        assert columns.row_count == 4
+        assert columns['internal_id'] == ['vertex_1', 'edge_1', 'vertex_3', None]
+        assert columns['id_value'] == [1001, None, None, None]
+        assert columns['score'] == [0.5, None, 0.75, None]
+        assert columns['from_id'] == [None, 'vertex_1', None, None]
+        assert columns['source.internal_id'] == [None, None, None, 'vertex_4']
+        assert columns['1.score'] == [None, None, None, 0.5]
+        assert all(len(x) == 4 for x in columns.columns.values())
+
+
+class RecordingNotary:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, command, bindings=None):
+        self.sent.append((command, bindings))
+        return []
+
+
+class TestTridentTemplates:
+    def test_batched_templates_namespace_bindings(self):
+        notary = RecordingNotary()
+        driver = TridentDriver(read_notary=notary, write_notary=notary)
+        upsert = TridentTemplates.upsert_vertex(1)
+        with driver:
+            for vertex_id in ('vertex_1', 'vertex_2'):
+                driver.execute_template(
+                    upsert, vertex_id=vertex_id, vertex_label='TestVertex',
+                    **TridentTemplates.generate_property_values({'id_value': 1001}))
+        assert TridentTemplates.upsert_vertex(1) is upsert
+        command, bindings = notary.sent[0]
+        first, second = command.split(';')
+        assert first.replace('b0_', '') == second.replace('b1_', '')
+        assert "vertex_1" not in command
+        assert bindings['b0_vertex_id'] == 'vertex_1'
+        assert bindings['b1_vertex_id'] == 'vertex_2'
+        assert bindings['b1_property_value_0'] == 1001
+
+
+class FlakyNotary(RecordingNotary):
+    """fails the first time it is sent any command mentioning b3_"""
+    def __init__(self):
+        super().__init__()
+        self._failed = False
+
+    def send(self, command, bindings=None):
+        if 'b3_' in command and not self._failed:
+            self._failed = True
+            raise RuntimeError('ConcurrentModificationException')
+        return super().send(command, bindings)
+
+
+class TestTridentBatches:
+    def test_chunked_batch_retries_failed_chunks(self):
+        notary = FlakyNotary()
+        driver = TridentDriver(read_notary=notary, write_notary=notary, batch_size=2, batch_workers=3)
+        with pytest.raises(TridentBatchException) as batch_exception:
+            with driver:
+                for i in range(5):
+                    driver.execute_template(TridentTemplates.get_by_id(), internal_id=f'vertex_{i}')
+        assert len(driver.batch_chunks) == 3
+        assert len(batch_exception.value.failed_chunks) == 1
+        assert [x.commands for x in driver.failed_chunks] == [['g.V(b2_internal_id)', 'g.V(b3_internal_id)']]
+        driver.retry_failed_chunks()
+        assert not driver.failed_chunks
+        sent_ids = sorted(y for x in notary.sent for y in x[1].values())
+        assert sent_ids == [f'vertex_{i}' for i in range(5)]
+
+
+class FakeGremlinSocket:
+    """answers each request in two frames, holding its answers until a second request arrives, then answering both in
+    reverse order, so responses interleave the way they can on a shared session"""
+    def __init__(self, *args, **kwargs):
+        self._frames = queue.Queue()
+        self._held = []
+
+    def send_binary(self, request_frame):
+        mime_length = request_frame[0]
+        request = json.loads(request_frame[mime_length + 1:].decode('utf-8'))
+        self._held.append(request)
+        if len(self._held) < 2:
+            return
+        for held_request in reversed(self._held):
+            request_id = held_request['requestId']
+            vertex_id = held_request['args']['bindings']['vertex_id']
+            for status_code in (206, 200):
+                response = json.loads(_generate_response(_generate_vertex(vertex_id), status_code=status_code))
+                response['requestId'] = request_id
+                self._frames.put(json.dumps(response))
+        self._held = []
+
+    def recv(self):
+        return self._frames.get()
+
+    def close(self):
+        self._frames.put('')
+
+
+class TestTridentSocketNotary:
+    def test_multiplexed_requests(self):
+        notary = TridentSocketNotary('localhost', port=45678, use_tls=False, timeout=5, socket_factory=FakeGremlinSocket)
+        first = notary.send_async('g.V(vertex_id)', {'vertex_id': 'vertex_1'})
+        second = notary.send_async('g.V(vertex_id)', {'vertex_id': 'vertex_2'})
+        assert [x.vertex_id for x in first.result(timeout=5)] == ['vertex_1', 'vertex_1']
+        assert [x.vertex_id for x in second.result(timeout=5)] == ['vertex_2', 'vertex_2']
+
+    def test_reconnect_only_fails_requests_on_the_dead_socket(self):
+        AnsweringGremlinSocket.built = []
+        notary = TridentSocketNotary(
+            'localhost', port=45679, use_tls=False, timeout=5, socket_factory=AnsweringGremlinSocket)
+        stranded = notary.send_async('g.V(vertex_id)', {'vertex_id': 'vertex_1'})
+        resent = notary.send_async('g.V(vertex_id)', {'vertex_id': 'vertex_2'})
+        with pytest.raises(RuntimeError):
+            stranded.result(timeout=5)
+        assert [x.vertex_id for x in resent.result(timeout=5)] == ['vertex_2', 'vertex_2']
+        assert [x.vertex_id for x in notary.send('g.V(vertex_id)', {'vertex_id': 'vertex_3'})] == ['vertex_3'] * 2
+        assert len(AnsweringGremlinSocket.built) == 2
+
+    def test_stream_applies_the_decoder(self):
+        AnsweringGremlinSocket.built = [None]
+        notary = TridentSocketNotary(
+            'localhost', port=45680, use_tls=False, timeout=5, socket_factory=AnsweringGremlinSocket)
+        streamed = notary.stream('g.V(vertex_id)', {'vertex_id': 'vertex_1'}, decoder=TridentColumnarDecoder())
+        columns = TridentColumns().extend(streamed)
+        assert columns['internal_id'] == ['vertex_1', 'vertex_1']
+        assert columns['score'] == [0.5, 0.5]
+        streamed = list(notary.stream('g.V(vertex_id)', {'vertex_id': 'vertex_2'}))
+        assert [x.vertex_id for x in streamed] == ['vertex_2', 'vertex_2']
+
+
+class AnsweringGremlinSocket:
+    """answers each request at once, in a 206 frame and a 200 frame, one vertex each, unless it was built to die,
+    in which case it holds its first request unanswered, and fails on the next send"""
+    built = []
+
+    def __init__(self, *args, **kwargs):
+        self._frames = queue.Queue()
+        self._is_dying = not self.built
+        self._send_count = 0
+        self.built.append(self)
+
+    def send_binary(self, request_frame):
+        self._send_count += 1
+        if self._is_dying:
+            if self._send_count > 1:
+                raise OSError('connection reset by peer')
+            return
+        mime_length = request_frame[0]
+        request = json.loads(request_frame[mime_length + 1:].decode('utf-8'))
+        vertex_id = request['args']['bindings']['vertex_id']
+        for status_code in (206, 200):
+            response = json.loads(_generate_response(_generate_vertex(vertex_id), status_code=status_code))
+            response['requestId'] = request['requestId']
+            self._frames.put(json.dumps(response))
+
+    def recv(self):
+        return self._frames.get()
+
+    def close(self):
+        self._frames.put('')
+
+
+class TestTridentRouter:
+    def test_reads_after_writes_are_pinned_to_writer(self):
+        reader, writer = RecordingNotary(), RecordingNotary()
+        router = TridentRouter(TridentWriteLedger(window_seconds=60))
+        driver = TridentDriver(read_notary=reader, write_notary=writer, router=router)
+        upsert = TridentTemplates.upsert_vertex(0)
+        driver.execute_template(upsert, vertex_id='vertex_1', vertex_label='TestVertex')
+        driver.get('vertex_1')
+        driver.get('vertex_2')
+        assert [x[1].get('vertex_id', x[1].get('internal_id')) for x in writer.sent] == ['vertex_1', 'vertex_1']
+        assert [x[1]['internal_id'] for x in reader.sent] == ['vertex_2']
+
+    def test_commands_go_to_writer_unless_marked_read_only(self):
+        reader, writer = RecordingNotary(), RecordingNotary()
+        driver = TridentDriver(read_notary=reader, write_notary=writer, router=TridentRouter(TridentWriteLedger()))
+        driver.execute('g.V(internal_id).sideEffect{}', bindings={'internal_id': 'vertex_1'})
+        driver.execute('g.V(internal_id)', True, {'internal_id': 'vertex_2'})
+        driver.execute('g.V(internal_id)', 'auto', {'internal_id': 'vertex_3'})
+        assert [x[1]['internal_id'] for x in writer.sent] == ['vertex_1']
+        assert [x[1]['internal_id'] for x in reader.sent] == ['vertex_2', 'vertex_3']
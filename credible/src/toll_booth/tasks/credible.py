@@ -1,8 +1,7 @@
 import logging
 import os
 
-import boto3
-from src.algernon import lambda_logged, Bullhorn
+from src.algernon import lambda_logged, Bullhorn, ClientPool
 from src.algernon import queued
 from botocore.exceptions import ClientError
 
@@ -89,17 +88,18 @@ class CredibleTasks:
             logging.error(f'runtime error retrieving values for client_id: {client_id}: {e}')
             results = []
         encounter_ids = [x['Service ID'] for x in results]
-        bullhorn = Bullhorn()
-        for encounter_id in encounter_ids:
-            new_task = {
-                'task_name': 'get_encounter',
-                'task_kwargs': {
-                    'encounter_id': encounter_id,
-                    'client_id': client_id,
-                    'id_source': kwargs['id_source']
+        with Bullhorn().buffer('new_event', os.environ['CREDIBLE_MANAGER_ARN']) as bullhorn:
+            for encounter_id in encounter_ids:
+                new_task = {
+                    'task_name': 'get_encounter',
+                    'task_kwargs': {
+                        'encounter_id': encounter_id,
+                        'client_id': client_id,
+                        'id_source': kwargs['id_source']
+                    }
                 }
-            }
-            bullhorn.publish('new_event', os.environ['CREDIBLE_MANAGER_ARN'], ajson.dumps(new_task))
+                bullhorn.publish(ajson.dumps(new_task))
+        _check_published(bullhorn)
         return encounter_ids
 
     @staticmethod
@@ -119,27 +119,34 @@ class CredibleTasks:
         driver = kwargs['driver']
         results = driver.process_advanced_search('Clients', client_search_data)
         client_ids = [x[' Id'] for x in results]
-        bullhorn = Bullhorn()
-        for client_id in client_ids:
-            new_task = {
-                'task_name': 'get_client_encounter_ids',
-                'task_kwargs': {
-                    'client_id': client_id,
-                    'id_source': id_source
+        with Bullhorn().buffer('new_event', os.environ['CREDIBLE_MANAGER_ARN']) as bullhorn:
+            for client_id in client_ids:
+                new_task = {
+                    'task_name': 'get_client_encounter_ids',
+                    'task_kwargs': {
+                        'client_id': client_id,
+                        'id_source': id_source
+                    }
                 }
-            }
-            bullhorn.publish('new_event', os.environ['CREDIBLE_MANAGER_ARN'], ajson.dumps(new_task))
+                bullhorn.publish(ajson.dumps(new_task))
+        _check_published(bullhorn)
         return client_ids
 
 
+def _check_published(bullhorn):
+    """raises when a fanned out task could not be published, so the record is retried rather than dropping it"""
+    if bullhorn.failed_messages:
+        raise RuntimeError(f'could not publish {len(bullhorn.failed_messages)} tasks: {bullhorn.failed_messages}')
+
+
 def _upload_object(bucket_name, folder_name, object_name, obj):
-    resource = boto3.resource('s3')
+    resource = ClientPool.get_resource('s3')
     object_key = f'{folder_name}/{object_name}'
     resource.Object(bucket_name, object_key).put(Body=ajson.dumps(obj))
 
 
 def _download_object(bucket_name, folder_name, object_name):
-    resource = boto3.resource('s3')
+    resource = ClientPool.get_resource('s3')
     object_key = f'{folder_name}/{object_name}'
     stored_object = resource.Object(bucket_name, object_key).get()
     string_body = stored_object['Body'].read()
@@ -1,7 +1,106 @@
 import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from src.toll_booth.obj.data_objects.identifiers import InternalId
 
+_sinks = threading.local()
+_persisted_caches = {}
+_max_resolve_size = 100
+
+
+def _get_client():
+    """the DynamoDB client shared by every sensitive write in this warm worker"""
+    from src.algernon import ClientPool
+
+    return ClientPool.get_client('dynamodb')
+
+
+def _get_table_name(sensitive_table_name=None):
+    if sensitive_table_name:
+        return sensitive_table_name
+    return os.getenv('SENSITIVES_TABLE_NAME', os.getenv('SENSITIVE_TABLE', 'Sensitives'))
+
+
+def _write_sensitive(client, sensitive_table_name, insensitive, sensitive_entry):
+    """stores a sensitive value against its pointer, a value already stored for the pointer is left alone"""
+    from boto3.dynamodb.types import TypeSerializer
+    from botocore.exceptions import ClientError
+
+    serializer = TypeSerializer()
+    try:
+        client.update_item(
+            TableName=sensitive_table_name,
+            Key={'insensitive': serializer.serialize(insensitive)},
+            UpdateExpression='SET sensitive_entry = if_not_exists(sensitive_entry, :s)',
+            ExpressionAttributeValues={':s': serializer.serialize(sensitive_entry)},
+            ReturnValues='NONE'
+        )
+    except ClientError as e:
+        logging.error(f'failed to update a sensitive data entry: {e}')
+        raise e
+
+
+class PersistedSensitiveCache:
+    """Remembers which insensitive pointers are known to have a value stored against them, within this warm worker
+
+        values are only ever written if_not_exists, so once a pointer has landed, writing it again can not change
+        anything, SensitiveData skips the write for any pointer held here, the cache holds at most max_entries pointers,
+        dropping the least recently used first
+
+    """
+    def __init__(self, max_entries: int = None):
+        if max_entries is None:
+            max_entries = int(os.getenv('SENSITIVE_CACHE_SIZE', 50000))
+        self._max_entries = max_entries
+        self._persisted = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_worker(cls):
+        cache = _persisted_caches.get('worker')
+        if cache is None:
+            cache = cls()
+            _persisted_caches['worker'] = cache
+        return cache
+
+    def __len__(self):
+        return len(self._persisted)
+
+    def is_persisted(self, insensitive: str) -> bool:
+        with self._lock:
+            if insensitive not in self._persisted:
+                return False
+            self._persisted.move_to_end(insensitive)
+            return True
+
+    def record_persisted(self, insensitives):
+        if self._max_entries <= 0:
+            return
+        with self._lock:
+            for insensitive in insensitives:
+                self._persisted[insensitive] = True
+                self._persisted.move_to_end(insensitive)
+            while len(self._persisted) > self._max_entries:
+                self._persisted.popitem(last=False)
+
+    def probe(self, insensitives, sensitive_table_name: str, client) -> set:
+        """asks the table which of the pointers already hold a value, using as few BatchGetItem calls as possible
+
+        Returns:
+            the pointers found, which are also recorded as persisted
+
+        """
+        from src.algernon import DynamoBatcher
+
+        batcher = DynamoBatcher(client)
+        found = batcher.batch_get(sensitive_table_name, [{'insensitive': x} for x in insensitives], 'insensitive')
+        found = {x['insensitive'] for x in found}
+        self.record_persisted(found)
+        return found
+
 
 class SensitiveData:
     def __init__(self, sensitive_entry, data_name, source_internal_id, internal_id=None):
@@ -23,24 +122,58 @@ class SensitiveData:
         self._sensitive_entry = sensitive_entry
         self._source_internal_id = source_internal_id
         self._insensitive = internal_id
-        self.update_sensitive()
+        sink = SensitiveDataSink.get_current()
+        if sink is None:
+            if not PersistedSensitiveCache.for_worker().is_persisted(internal_id):
+                self.update_sensitive()
+            return
+        sink.add(self)
 
     @classmethod
     def from_insensitive(cls, insensitive_entry, sensitive_table_name=None):
-        import boto3
-        from boto3.dynamodb.conditions import Key
-
-        if not sensitive_table_name:
-            import os
-            sensitive_table_name = os.environ['SENSITIVE_TABLE']
-        resource = boto3.resource('dynamodb')
-        table = resource.Table(sensitive_table_name)
-        results = table.query(
-            IndexName='string',
-            Select='ALL_ATTRIBUTES',
-            KeyConditionExpression=Key('insensitive').eq(insensitive_entry)
-        )
-        print(results)
+        """retrieves the sensitive value stored against a single pointer, or None if nothing is stored for it"""
+        return cls.resolve_many([insensitive_entry], sensitive_table_name).get(insensitive_entry)
+
+    @classmethod
+    def resolve_many(cls, insensitive_entries, sensitive_table_name=None, client=None, max_workers=None) -> dict:
+        """retrieves the sensitive values stored against many pointers at once
+
+        the pointers are read through BatchGetItem, in chunks of 100 sent concurrently,
+        keys DynamoDB leaves unprocessed are retried with backoff
+
+        Args:
+            insensitive_entries: the pointers to resolve, duplicates are only read once
+            sensitive_table_name: the table the values are stored in, defaults to SENSITIVES_TABLE_NAME
+            client: the DynamoDB client used, defaults to the one shared by the worker
+            max_workers: how many chunks are read at once, defaults to SENSITIVE_RESOLVE_WORKERS, or 8
+
+        Returns:
+            the sensitive value for each pointer, pointers with nothing stored against them are absent
+
+        Raises:
+            RuntimeError: some pointers remained unprocessed after every retry was spent
+
+        """
+        from src.algernon import DynamoBatcher
+
+        if max_workers is None:
+            max_workers = int(os.getenv('SENSITIVE_RESOLVE_WORKERS', 8))
+        if client is None:
+            client = _get_client()
+        sensitive_table_name = _get_table_name(sensitive_table_name)
+        batcher = DynamoBatcher(client)
+        keys = [{'insensitive': x} for x in dict.fromkeys(insensitive_entries)]
+        chunks = [keys[x:x + _max_resolve_size] for x in range(0, len(keys), _max_resolve_size)]
+
+        def resolve_chunk(chunk):
+            return batcher.batch_get(sensitive_table_name, chunk, 'insensitive, sensitive_entry')
+
+        if len(chunks) <= 1 or max_workers <= 1:
+            found = [resolve_chunk(x) for x in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers=min(len(chunks), max_workers)) as executor:
+                found = list(executor.map(resolve_chunk, chunks))
+        return {x['insensitive']: x.get('sensitive_entry') for items in found for x in items}
 
     def __str__(self):
         return self._insensitive
@@ -64,20 +197,102 @@ class SensitiveData:
             ClientError: the update operation could not take place
 
         """
-        import boto3
-        from botocore.exceptions import ClientError
-        if not sensitive_table_name:
-            import os
-            sensitive_table_name = os.environ['SENSITIVE_TABLE']
-        resource = boto3.resource('dynamodb')
-        table = resource.Table(sensitive_table_name)
+        _write_sensitive(_get_client(), _get_table_name(sensitive_table_name), self._insensitive, self._sensitive_entry)
+        PersistedSensitiveCache.for_worker().record_persisted([self._insensitive])
+
+
+class SensitiveDataSink:
+    """Collects the SensitiveData created on this thread, storing it all at once when the sink is flushed
+
+        while a sink is open, every SensitiveData created on the same thread is added to it, rather than being stored
+        with a round trip of its own, the sink flushes when it closes, even if the work within it failed,
+        as pointers to the values may already have been sent onwards, the values are written concurrently,
+        each as a conditional update, so a value already stored for a pointer is never replaced,
+        when probing, the pointers are first looked up in batches, and only those not yet stored are written
+
+    """
+    _max_workers = 10
+
+    def __init__(self, sensitive_table_name: str = None, client=None, probe: bool = None,
+                 persisted_cache: PersistedSensitiveCache = None):
+        """
+
+        Args:
+            sensitive_table_name: the table the values are stored in, defaults to SENSITIVES_TABLE_NAME
+            client: the DynamoDB client used, defaults to the one shared by the worker
+            probe: look up which pointers are already stored before writing, defaults to SENSITIVE_PROBE, or false,
+                worthwhile when most values were stored by an earlier extraction, i.e. incremental syncs
+            persisted_cache: where pointers known to be stored are recorded, defaults to the one shared by the worker
+        """
+        if probe is None:
+            probe = os.getenv('SENSITIVE_PROBE', 'false').lower() == 'true'
+        if persisted_cache is None:
+            persisted_cache = PersistedSensitiveCache.for_worker()
+        self._sensitive_table_name = _get_table_name(sensitive_table_name)
+        self._client = client
+        self._probe = probe
+        self._persisted_cache = persisted_cache
+        self._pending = {}
+        self._previous = None
+
+    @classmethod
+    def get_current(cls):
+        """the sink open on this thread, or None if there isn't one"""
+        return getattr(_sinks, 'sink', None)
+
+    @property
+    def pending_count(self):
+        return len(self._pending)
+
+    def __enter__(self):
+        self._previous = self.get_current()
+        _sinks.sink = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _sinks.sink = self._previous
+        self._previous = None
         try:
-            table.update_item(
-                Key={'insensitive': self._insensitive},
-                UpdateExpression='SET sensitive_entry = if_not_exists(sensitive_entry, :s)',
-                ExpressionAttributeValues={':s': self._sensitive_entry},
-                ReturnValues='NONE'
-            )
-        except ClientError as e:
-            logging.error(f'failed to update a sensitive data entry: {e}')
-            raise e
+            self.flush()
+        except Exception as e:
+            if exc_val is None:
+                raise e
+            logging.error(f'could not flush sensitive data after a failure within the sink: {e}')
+        return False
+
+    def add(self, sensitive_data: SensitiveData):
+        insensitive = str(sensitive_data)
+        if self._persisted_cache.is_persisted(insensitive):
+            return
+        self._pending[insensitive] = sensitive_data.sensitive_entry
+
+    def flush(self):
+        """stores every pending value
+
+        Raises:
+            ClientError: a value could not be stored, the values which could not be stored remain pending
+
+        """
+        if not self._pending:
+            return
+        client = self._client
+        if client is None:
+            client = _get_client()
+        if self._probe:
+            for insensitive in self._persisted_cache.probe(list(self._pending), self._sensitive_table_name, client):
+                self._pending.pop(insensitive, None)
+        pending = list(self._pending.items())
+        if not pending:
+            return
+        if len(pending) == 1:
+            self._write(client, *pending[0])
+            return
+        with ThreadPoolExecutor(max_workers=min(len(pending), self._max_workers)) as executor:
+            futures = [executor.submit(self._write, client, *x) for x in pending]
+        for future in futures:
+            future.result()
+
+    def _write(self, client, insensitive, sensitive_entry):
+        _write_sensitive(client, self._sensitive_table_name, insensitive, sensitive_entry)
+        self._pending.pop(insensitive, None)
+        self._persisted_cache.record_persisted([insensitive])
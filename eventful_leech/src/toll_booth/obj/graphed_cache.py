@@ -0,0 +1,125 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import rapidjson
+
+from src.algernon import DynamoBatcher
+
+_worker_caches = {}
+
+
+class GraphedObjectCache:
+    """Remembers which objects were recently upserted into the graph, so they need not be sent again
+
+        each entry pairs an internal_id with a fingerprint of the values it was written with,
+        an object is only skipped when it was graphed with exactly the same values within ttl_seconds,
+        entries are held per warm worker, and when a table_name is set, shared with every other worker through DynamoDB,
+        the TTL bounds how long a vertex removed from the graph by other means can be wrongly skipped
+
+    """
+    def __init__(self, max_entries: int = None, ttl_seconds: float = None, table_name: str = None, batcher=None):
+        """
+
+        Args:
+            max_entries: the most entries held by this worker, least recently used are dropped first,
+                defaults to GRAPHED_CACHE_SIZE, or 10000
+            ttl_seconds: how long an entry is trusted, defaults to GRAPHED_CACHE_TTL, or 300
+            table_name: the DynamoDB table the entries are shared through, defaults to GRAPHED_CACHE_TABLE_NAME,
+                if neither is set the cache is local to this worker
+            batcher: the DynamoBatcher used to reach the shared table
+        """
+        if max_entries is None:
+            max_entries = int(os.getenv('GRAPHED_CACHE_SIZE', 10000))
+        if ttl_seconds is None:
+            ttl_seconds = float(os.getenv('GRAPHED_CACHE_TTL', 300))
+        if table_name is None:
+            table_name = os.getenv('GRAPHED_CACHE_TABLE_NAME', None)
+        if table_name and not batcher:
+            batcher = DynamoBatcher()
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._table_name = table_name or None
+        self._batcher = batcher
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_worker(cls):
+        """the cache shared by everything running in this warm worker, built on first use"""
+        cache = _worker_caches.get('worker')
+        if cache is None:
+            cache = cls()
+            _worker_caches['worker'] = cache
+        return cache
+
+    @property
+    def is_shared(self):
+        return self._table_name is not None
+
+    @staticmethod
+    def generate_fingerprint(template_name: str, binding_values: dict) -> str:
+        """a digest of everything an upsert would write, if any value changes, so does the fingerprint"""
+        fingerprint_source = rapidjson.dumps([template_name, binding_values], sort_keys=True, default=str)
+        return hashlib.md5(fingerprint_source.encode('utf-8')).hexdigest()
+
+    def find_uncached(self, fingerprints: dict) -> set:
+        """works out which objects still need to be written to the graph
+
+        Args:
+            fingerprints: the fingerprint of each object to be written, by internal_id
+
+        Returns:
+            the internal_ids of the objects not known to be graphed with their current fingerprint
+
+        """
+        if self._ttl_seconds <= 0:
+            return set(fingerprints)
+        now = time.time()
+        uncached = set()
+        with self._lock:
+            for internal_id, fingerprint in fingerprints.items():
+                entry = self._entries.get(internal_id)
+                if entry is None or entry[0] != fingerprint or entry[1] < now:
+                    uncached.add(internal_id)
+                    continue
+                self._entries.move_to_end(internal_id)
+        if uncached and self.is_shared:
+            uncached -= self._find_shared({x: fingerprints[x] for x in uncached}, now)
+        return uncached
+
+    def record(self, fingerprints: dict):
+        """notes that objects were written to the graph, with the given fingerprints, by internal_id"""
+        if not fingerprints or self._ttl_seconds <= 0:
+            return
+        expires_at = time.time() + self._ttl_seconds
+        self._store_local(fingerprints, expires_at)
+        if self.is_shared:
+            self._batcher.batch_write(self._table_name, [
+                {'internal_id': x, 'fingerprint': y, 'expires_at': int(expires_at)} for x, y in fingerprints.items()])
+
+    def _find_shared(self, fingerprints: dict, now: float) -> set:
+        items = self._batcher.batch_get(
+            self._table_name, [{'internal_id': x} for x in fingerprints], 'internal_id, fingerprint, expires_at')
+        found = {}
+        for item in items:
+            internal_id = item['internal_id']
+            if item.get('fingerprint') == fingerprints.get(internal_id) and int(item.get('expires_at', 0)) >= now:
+                found[internal_id] = (item['fingerprint'], int(item['expires_at']))
+        with self._lock:
+            for internal_id, entry in found.items():
+                self._put(internal_id, entry)
+        return set(found)
+
+    def _store_local(self, fingerprints: dict, expires_at: float):
+        with self._lock:
+            for internal_id, fingerprint in fingerprints.items():
+                self._put(internal_id, (fingerprint, expires_at))
+
+    def _put(self, internal_id, entry):
+        self._entries.pop(internal_id, None)
+        self._entries[internal_id] = entry
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
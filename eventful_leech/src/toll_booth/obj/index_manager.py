@@ -0,0 +1,286 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Union, List, Dict
+
+from botocore.exceptions import ClientError
+
+from src.algernon import ajson, DynamoBatcher
+
+from src.toll_booth import PotentialVertex, PotentialEdge, IdentifierStem
+from src.toll_booth import Schema
+from src.toll_booth import SchemaVertexEntry, SchemaEdgeEntry
+
+_index_plans = {}
+
+
+class UniqueIndexViolationException(Exception):
+    def __init__(self, index_name, indexed_object):
+        message = 'attempted to index %s, but the unique index %s already holds a different object for its key' % (
+            indexed_object, index_name)
+        super().__init__(message)
+        self.index_name = index_name
+        self.indexed_object = indexed_object
+
+
+class IndexPlan:
+    """The precomputed indexing instructions for a single object type
+
+    """
+    def __init__(self,
+                 object_type: str,
+                 index_names: [str],
+                 unique_index_names: [str],
+                 identifier_stem_fields: [str] = None,
+                 id_value_field: str = None):
+        """
+
+        Args:
+            object_type: the vertex_name or edge_label the plan applies to
+            index_names: the name of every index the schema declares for the type
+            unique_index_names: the subset of index_names which are unique
+            identifier_stem_fields: the fields used to build the identifier_stem for the type, vertexes only
+            id_value_field: the field holding the id_value for the type, vertexes only
+        """
+        if not identifier_stem_fields:
+            identifier_stem_fields = []
+        self._object_type = object_type
+        self._index_names = index_names
+        self._unique_index_names = unique_index_names
+        self._identifier_stem_fields = identifier_stem_fields
+        self._id_value_field = id_value_field
+
+    @classmethod
+    def for_schema_entry(cls, schema_entry: Union[SchemaVertexEntry, SchemaEdgeEntry]):
+        indexes = schema_entry.indexes.values()
+        index_names = [x.index_name for x in indexes]
+        unique_index_names = [x.index_name for x in indexes if x.is_unique]
+        if isinstance(schema_entry, SchemaEdgeEntry):
+            return cls(schema_entry.edge_label, index_names, unique_index_names)
+        try:
+            id_value_field = schema_entry.id_value_field
+        except NotImplementedError:
+            id_value_field = None
+        identifier_stem_fields = list(schema_entry.identifier_stem)
+        return cls(schema_entry.vertex_name, index_names, unique_index_names, identifier_stem_fields, id_value_field)
+
+    @property
+    def object_type(self):
+        return self._object_type
+
+    @property
+    def index_names(self):
+        return self._index_names
+
+    @property
+    def is_unique(self):
+        return len(self._unique_index_names) > 0
+
+    @property
+    def unique_index_name(self):
+        if not self._unique_index_names:
+            return None
+        return self._unique_index_names[0]
+
+    @property
+    def identifier_stem_fields(self):
+        return self._identifier_stem_fields
+
+    @property
+    def id_value_field(self):
+        return self._id_value_field
+
+    def generate_identifier_stem(self, object_properties: dict) -> Union[IdentifierStem, None]:
+        """builds the identifier_stem for a set of object properties, if they are complete enough to do so
+
+        """
+        if not self._identifier_stem_fields:
+            return None
+        paired_identifiers = {}
+        for field_name in self._identifier_stem_fields:
+            field_value = object_properties.get(field_name)
+            if field_value is None or hasattr(field_value, 'is_missing'):
+                return None
+            paired_identifiers[field_name] = field_value
+        return IdentifierStem('vertex', self._object_type, paired_identifiers)
+
+    def generate_id_value(self, object_properties: dict):
+        if self._id_value_field is None:
+            return None
+        id_value = object_properties.get(self._id_value_field)
+        if hasattr(id_value, 'is_missing'):
+            return None
+        return id_value
+
+
+class IndexManager:
+    _internal_id_index = 'internal_id_index'
+    _fungal_index = 'fungal_index'
+    _max_workers = 10
+
+    def __init__(self, index_plans: Dict[str, IndexPlan] = None, table_name: str = None, batcher=None):
+        if not index_plans:
+            index_plans = {}
+        if not table_name:
+            table_name = os.getenv('INDEX_TABLE_NAME', 'Indexes')
+        if not batcher:
+            batcher = DynamoBatcher()
+        self._index_plans = index_plans
+        self._table_name = table_name
+        self._batcher = batcher
+
+    @classmethod
+    def from_graph_schema(cls, schema: Schema, **kwargs):
+        """creates an IndexManager holding an index plan for every vertex and edge type in the schema
+
+        plans are cached against the schema_version, so warm workers only compute them once per schema
+
+        """
+        schema_version = schema.schema_version
+        index_plans = _index_plans.get(schema_version) if schema_version else None
+        if index_plans is None:
+            index_plans = {}
+            for schema_entry in list(schema.vertex_entries.values()) + list(schema.edge_entries.values()):
+                index_plan = IndexPlan.for_schema_entry(schema_entry)
+                index_plans[index_plan.object_type] = index_plan
+            if schema_version:
+                _index_plans[schema_version] = index_plans
+        return cls(index_plans, **kwargs)
+
+    def index_object(self, graph_object: Union[PotentialVertex, PotentialEdge]):
+        """writes a single object to the index
+
+        Raises:
+            UniqueIndexViolationException: the object collides with a different object on a unique index
+
+        """
+        violations = self.index_objects(graph_object)
+        if violations:
+            raise violations[0]
+
+    def index_objects(self, *graph_objects: Union[PotentialVertex, PotentialEdge]) -> List[
+            UniqueIndexViolationException]:
+        """writes many objects to the index in a single round trip
+
+        objects without a unique index are sent together through BatchWriteItem, objects with a unique index
+        are sent as conditional puts, alongside the batch rather than after it
+
+        Returns:
+            the UniqueIndexViolationException for every object which collided with a unique index
+        """
+        batched_items = {}
+        unique_items = []
+        for graph_object in graph_objects:
+            if graph_object is None:
+                continue
+            index_plan = self._get_plan(graph_object.object_type)
+            index_item = self._generate_index_item(graph_object)
+            if index_plan.is_unique:
+                unique_items.append((index_plan, graph_object, index_item))
+                continue
+            batched_items[(index_item['identifier_stem'], index_item['sid_value'])] = index_item
+        batched_items = list(batched_items.values())
+        if not unique_items:
+            if batched_items:
+                self._batcher.batch_write(self._table_name, batched_items)
+            return []
+        with ThreadPoolExecutor(max_workers=min(len(unique_items) + 1, self._max_workers)) as executor:
+            batch_future = None
+            if batched_items:
+                batch_future = executor.submit(self._batcher.batch_write, self._table_name, batched_items)
+            unique_futures = [executor.submit(self._put_unique, *x) for x in unique_items]
+            violations = [x.result() for x in unique_futures]
+            if batch_future:
+                batch_future.result()
+        return [x for x in violations if x is not None]
+
+    def find_potential_vertexes(self, object_type: str, object_properties: dict) -> List[PotentialVertex]:
+        """finds the indexed vertexes which match the provided properties
+
+        if the properties specify both the identifier_stem and the id_value, the match is a direct key lookup,
+        if they specify only the identifier_stem, every object sharing the stem is returned, read from the table itself,
+        as the identifier_stem_index only holds the objects with a numeric id_value
+
+        """
+        index_plan = self._get_plan(object_type)
+        identifier_stem = index_plan.generate_identifier_stem(object_properties)
+        if identifier_stem is None:
+            return []
+        try:
+            identifier_stem = str(identifier_stem)
+        except TypeError:
+            return []
+        id_value = index_plan.generate_id_value(object_properties)
+        if id_value is not None:
+            items = self._batcher.batch_get(
+                self._table_name, [{'identifier_stem': identifier_stem, 'sid_value': str(id_value)}])
+        else:
+            items = self._batcher.query(
+                self._table_name, 'identifier_stem = :identifier_stem', {':identifier_stem': identifier_stem})
+        return [ajson.loads(x['object_value']) for x in items]
+
+    def find_by_internal_id(self, internal_id: str) -> List[Union[PotentialVertex, PotentialEdge]]:
+        items = self._batcher.query(
+            self._table_name, 'internal_id = :internal_id',
+            {':internal_id': internal_id}, index_name=self._internal_id_index)
+        return [ajson.loads(x['object_value']) for x in items]
+
+    def find_by_numeric_range(self, fungal_stem: str, low_value, high_value) -> List[PotentialVertex]:
+        items = self._batcher.query(
+            self._table_name, 'fungal_stem = :fungal_stem AND numeric_id_value BETWEEN :low AND :high',
+            {':fungal_stem': fungal_stem, ':low': Decimal(low_value), ':high': Decimal(high_value)},
+            index_name=self._fungal_index)
+        return [ajson.loads(x['object_value']) for x in items]
+
+    def _get_plan(self, object_type: str) -> IndexPlan:
+        try:
+            return self._index_plans[object_type]
+        except KeyError:
+            return IndexPlan(object_type, [], [])
+
+    def _put_unique(self,
+                    index_plan: IndexPlan,
+                    graph_object: Union[PotentialVertex, PotentialEdge],
+                    index_item: dict) -> Union[UniqueIndexViolationException, None]:
+        try:
+            self._batcher.client.put_item(
+                TableName=self._table_name,
+                Item=self._batcher.serialize(index_item),
+                ConditionExpression='attribute_not_exists(identifier_stem) OR internal_id = :internal_id',
+                ExpressionAttributeValues=self._batcher.serialize({':internal_id': index_item['internal_id']})
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise e
+            logging.debug(f'unique index violation for {graph_object} on {index_plan.unique_index_name}')
+            return UniqueIndexViolationException(index_plan.unique_index_name, graph_object)
+        return None
+
+    @classmethod
+    def _generate_index_item(cls, graph_object: Union[PotentialVertex, PotentialEdge]) -> dict:
+        index_item = cls._clean_index_value(graph_object.for_index)
+        if 'numeric_id_value' in index_item:
+            graph_type = 'edge' if graph_object.is_edge else 'vertex'
+            index_item['fungal_stem'] = f'#{graph_type}#{graph_object.object_type}#'
+        return index_item
+
+    @classmethod
+    def _clean_index_value(cls, index_value):
+        """strips the values DynamoDB will not accept from an index entry
+
+        missing properties and empty values are dropped, floats are converted to Decimal
+
+        """
+        if isinstance(index_value, dict):
+            cleaned = {}
+            for entry_name, entry_value in index_value.items():
+                if entry_value is None or entry_value == '' or hasattr(entry_value, 'is_missing'):
+                    continue
+                cleaned[entry_name] = cls._clean_index_value(entry_value)
+            return cleaned
+        if isinstance(index_value, (list, tuple)):
+            return [cls._clean_index_value(x) for x in index_value]
+        if isinstance(index_value, float):
+            return Decimal(str(index_value))
+        return index_value
@@ -0,0 +1,168 @@
+import logging
+from datetime import datetime
+from decimal import Decimal
+from typing import Union, List, Tuple
+
+from src.algernon import TridentDriver
+from src.algernon import TridentTemplate, TridentTemplates, TridentBatchException
+
+from src.toll_booth import PotentialVertex, PotentialEdge, IdentifierStem
+from src.toll_booth import Schema
+from src.toll_booth import GraphedObjectCache
+
+
+class Ogm:
+    """Writes PotentialVertex and PotentialEdge objects into the graph
+
+        Every object is rendered through an idempotent fold().coalesce(unfold(), add...) upsert template,
+        with all of its values sent as bindings, all the upserts for a call are then sent as a single batched request,
+        objects the GraphedObjectCache saw written with the same values recently are not sent again
+
+    """
+    def __init__(self, schema: Schema, driver: TridentDriver = None, graphed_cache: GraphedObjectCache = None):
+        if not driver:
+            driver = TridentDriver()
+        if not graphed_cache:
+            graphed_cache = GraphedObjectCache.for_worker()
+        self._schema = schema
+        self._driver = driver
+        self._graphed_cache = graphed_cache
+
+    def graph_objects(self, *graph_objects: Union[PotentialVertex, PotentialEdge, None]) -> List[str]:
+        """upserts every provided object into the graph in one request
+
+        vertexes are written in a batch before edges, so an edge can always find the vertexes it joins,
+        objects appearing more than once (by internal_id) are only written once,
+        objects recently graphed with the same values are skipped
+
+        Args:
+            *graph_objects: any mix of PotentialVertex and PotentialEdge objects, None entries are ignored
+
+        Returns:
+            the name of the template used for each object written to the graph database
+
+        """
+        vertexes = {}
+        edges = {}
+        for graph_object in graph_objects:
+            if graph_object is None:
+                continue
+            if not graph_object.is_internal_id_set:
+                logging.warning(f'can not graph {graph_object}, it has no internal_id to upsert against')
+                continue
+            if graph_object.is_edge:
+                edges[graph_object.internal_id] = graph_object
+                continue
+            vertexes[graph_object.internal_id] = graph_object
+        vertex_upserts = self._remove_cached(vertexes, [self._compile_vertex(x) for x in vertexes.values()])
+        edge_upserts = [x for x in (self._compile_edge(x) for x in edges.values()) if x]
+        edge_upserts = self._remove_cached(edges, edge_upserts)
+        self._execute_upserts(vertex_upserts)
+        self._execute_upserts(edge_upserts)
+        return [x[0].template_name for x in vertex_upserts + edge_upserts]
+
+    def _remove_cached(self, graph_objects: dict, upserts: List[Tuple[TridentTemplate, dict]]):
+        if not upserts:
+            return upserts
+        fingerprints = {self._find_upsert_id(x): GraphedObjectCache.generate_fingerprint(x[0].template_name, x[1])
+                        for x in upserts}
+        uncached = self._graphed_cache.find_uncached(fingerprints)
+        if len(uncached) < len(upserts):
+            logging.debug(f'skipping {len(upserts) - len(uncached)} of {len(graph_objects)} objects, '
+                          f'they were recently graphed with the same values')
+        return [x for x in upserts if self._find_upsert_id(x) in uncached]
+
+    def _execute_upserts(self, upserts: List[Tuple[TridentTemplate, dict]]):
+        """sends the upserts as one batch, the chunks of which fail are given one more attempt
+
+        the objects in every chunk which succeeds are recorded in the graphed cache, even if other chunks fail
+
+        """
+        if not upserts:
+            return
+        fingerprints = {self._find_upsert_id(x): GraphedObjectCache.generate_fingerprint(x[0].template_name, x[1])
+                        for x in upserts}
+        try:
+            with self._driver:
+                for template, binding_values in upserts:
+                    self._driver.execute_template(template, **binding_values)
+        except TridentBatchException as e:
+            logging.warning(f'retrying {len(e.failed_chunks)} failed chunks of the upsert batch: {e}')
+            try:
+                self._driver.retry_failed_chunks()
+            finally:
+                self._record_graphed(fingerprints)
+            return
+        self._record_graphed(fingerprints)
+
+    def _record_graphed(self, fingerprints: dict):
+        graphed_ids = set()
+        for chunk in self._driver.batch_chunks:
+            if chunk.is_successful:
+                graphed_ids.update(y for x, y in chunk.bindings.items() if x.endswith(_upsert_id_bindings))
+        self._graphed_cache.record({x: y for x, y in fingerprints.items() if x in graphed_ids})
+
+    @staticmethod
+    def _find_upsert_id(upsert: Tuple[TridentTemplate, dict]) -> str:
+        binding_values = upsert[1]
+        return binding_values.get('vertex_id', binding_values.get('edge_id'))
+
+    @classmethod
+    def _compile_vertex(cls, vertex: PotentialVertex) -> Tuple[TridentTemplate, dict]:
+        vertex_properties = {
+            'id_value': vertex.id_value,
+            'identifier_stem': str(vertex.identifier_stem)
+        }
+        vertex_properties.update(vertex.object_properties)
+        vertex_properties = {x: _binding_value(y) for x, y in vertex_properties.items() if _is_graphable(y)}
+        binding_values = {
+            'vertex_id': vertex.internal_id,
+            'vertex_label': cls._derive_vertex_label(vertex)
+        }
+        binding_values.update(TridentTemplates.generate_property_values(vertex_properties))
+        return TridentTemplates.upsert_vertex(len(vertex_properties)), binding_values
+
+    @classmethod
+    def _compile_edge(cls, edge: PotentialEdge) -> Union[Tuple[TridentTemplate, dict], None]:
+        from_id, to_id = edge.from_object, edge.to_object
+        if not isinstance(from_id, str) or not isinstance(to_id, str):
+            logging.warning(f'can not graph edge {edge}, both of its vertexes must be identified by internal_id')
+            return None
+        edge_properties = {x: _binding_value(y) for x, y in edge.edge_properties.items() if _is_graphable(y)}
+        binding_values = {
+            'edge_id': edge.internal_id,
+            'edge_label': edge.edge_label,
+            'from_id': from_id,
+            'to_id': to_id
+        }
+        binding_values.update(TridentTemplates.generate_property_values(edge_properties))
+        return TridentTemplates.upsert_edge(len(edge_properties)), binding_values
+
+    @staticmethod
+    def _derive_vertex_label(vertex: PotentialVertex) -> str:
+        try:
+            return IdentifierStem.from_raw(vertex.identifier_stem).object_type
+        except (AttributeError, IndexError):
+            return vertex.object_type
+
+
+_upsert_id_bindings = ('vertex_id', 'edge_id')
+
+
+def _is_graphable(property_value) -> bool:
+    if property_value is None or property_value == '':
+        return False
+    return not hasattr(property_value, 'is_missing')
+
+
+def _binding_value(property_value):
+    """converts a python value into one which can be sent as a JSON binding"""
+    if isinstance(property_value, Decimal):
+        if property_value == property_value.to_integral_value():
+            return int(property_value)
+        return float(property_value)
+    if isinstance(property_value, datetime):
+        return property_value.isoformat()
+    if isinstance(property_value, (bool, int, float, str)):
+        return property_value
+    return str(property_value)
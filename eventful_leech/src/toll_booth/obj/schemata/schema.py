@@ -9,6 +9,8 @@ from src.toll_booth import SchemaSnek
 from src.toll_booth import SchemaVertexEntry, SchemaEdgeEntry
 from src.toll_booth import SchemaParer
 
+_schema_cache = {}
+
 
 class Schema(AlgObject):
     """
@@ -16,12 +18,14 @@ class Schema(AlgObject):
     """
     def __init__(self,
                  vertex_entries: {str: SchemaVertexEntry} = None,
-                 edge_entries: {str: SchemaEdgeEntry} = None):
+                 edge_entries: {str: SchemaEdgeEntry} = None,
+                 schema_version: str = None):
         """
 
         Args:
             vertex_entries:
             edge_entries:
+            schema_version: the content hash of the stored schema this object was parsed from
         """
         if not vertex_entries:
             vertex_entries = {}
@@ -29,6 +33,7 @@ class Schema(AlgObject):
             edge_entries = {}
         self._vertex_entries = vertex_entries
         self._edge_entries = edge_entries
+        self._schema_version = schema_version
 
     @property
     def vertex_entries(self):
@@ -38,6 +43,10 @@ class Schema(AlgObject):
     def edge_entries(self):
         return self._edge_entries
 
+    @property
+    def schema_version(self):
+        return self._schema_version
+
     def __getitem__(self, item) -> Union[SchemaVertexEntry, SchemaEdgeEntry]:
         try:
             return self._vertex_entries[item]
@@ -53,9 +62,27 @@ class Schema(AlgObject):
     @classmethod
     def retrieve(cls, **kwargs):
         schema_writer = SchemaSnek(**kwargs)
-        json_schema = schema_writer.get_schema(**kwargs)
+        json_schema, schema_version = schema_writer.get_versioned_schema(**kwargs)
         vertex_entries, edge_entries = SchemaParer.parse(json_schema)
-        return cls(vertex_entries, edge_entries)
+        schema = cls(vertex_entries, edge_entries, schema_version)
+        _schema_cache[schema_version] = schema
+        return schema
+
+    @classmethod
+    def resolve(cls, schema_version: str, **kwargs):
+        """returns the schema for a schema_version, retrieving it only if this process has not seen it before
+
+        Args:
+            schema_version: the content hash of the stored schema
+            **kwargs: passed through to the SchemaSnek on a cache miss
+
+        Returns:
+            the Schema object for the requested version
+        """
+        try:
+            return _schema_cache[schema_version]
+        except KeyError:
+            return cls.retrieve(schema_version=schema_version, **kwargs)
 
     @classmethod
     def post(cls, schema_file_path, validation_schema_file_path, **kwargs):
@@ -64,18 +91,60 @@ class Schema(AlgObject):
             working_schema = jsonref.load(schema_file)
             master_schema = jsonref.load(validation_file)
             validate(working_schema, master_schema)
-            schema_snek.put_schema(schema_file_path, **kwargs)
+            schema_version = schema_snek.put_schema(schema_file_path, **kwargs)
             schema_snek.put_validation_schema(schema_file_path, **kwargs)
             vertex_entries = {x['vertex_name'] for x in working_schema['vertex']}
             edge_entries = {x['edge_label'] for x in working_schema['edge']}
-            return cls(vertex_entries, edge_entries)
+            return cls(vertex_entries, edge_entries, schema_version)
 
     @classmethod
     def parse_json(cls, json_dict):
-        return cls(json_dict['vertex_entries'], json_dict['edge_entries'])
+        schema_version = json_dict.get('schema_version')
+        schema = cls(json_dict['vertex_entries'], json_dict['edge_entries'], schema_version)
+        if schema_version is not None:
+            _schema_cache.setdefault(schema_version, schema)
+        return schema
 
     def add_vertex_entry(self, vertex_entry):
         self._vertex_entries[vertex_entry.vertex_name] = vertex_entry
 
     def add_edge_entry(self, edge_entry):
         self._edge_entries[edge_entry.edge_label] = edge_entry
+
+
+class SchemaReference(AlgObject):
+    """A stand-in for a Schema, or one of its entries, within the messages passed between tasks
+
+        Only the schema_version (and the entry_name, when referencing an entry) travels over the wire,
+        on decode the reference resolves back into the full object through the process-local schema cache
+
+    """
+    def __init__(self, schema_version: str, entry_name: str = None):
+        """
+
+        Args:
+            schema_version: the content hash of the referenced schema
+            entry_name: if set, the reference resolves to this entry of the schema rather than the schema itself
+        """
+        self._schema_version = schema_version
+        self._entry_name = entry_name
+
+    @classmethod
+    def parse_json(cls, json_dict):
+        schema = Schema.resolve(json_dict['schema_version'])
+        entry_name = json_dict.get('entry_name')
+        if entry_name is None:
+            return schema
+        return schema[entry_name]
+
+    @property
+    def to_json(self):
+        return {'schema_version': self._schema_version, 'entry_name': self._entry_name}
+
+    @property
+    def schema_version(self):
+        return self._schema_version
+
+    @property
+    def entry_name(self):
+        return self._entry_name
@@ -1,9 +1,11 @@
+import hashlib
+import logging
 import os
 
-import boto3
 import jsonref
+from botocore.exceptions import ClientError
 
-from src.algernon import AlgDecoder
+from src.algernon import AlgDecoder, ClientPool
 
 
 class SchemaSnek:
@@ -27,17 +29,70 @@ class SchemaSnek:
         return self.put_schema(file_path, master_schema_name)
 
     def get_schema(self, **kwargs):
+        schema, _ = self.get_versioned_schema(**kwargs)
+        return schema
+
+    def get_versioned_schema(self, **kwargs):
+        """retrieves a stored schema along with the content hash that identifies it
+
+        schemas stored before versioned copies were kept have no copy under their schema_version,
+        when a pinned version is missing, the current schema is used in its place if its hash matches,
+        and a versioned copy is written from it, so later retrievals find it directly
+
+        Args:
+            **kwargs: schema_name, and optionally the schema_version to pin the retrieval to
+
+        Returns:
+            a tuple of the loaded json schema and its schema_version
+
+        Raises:
+            RuntimeError: the pinned schema_version is not stored, and is not the current schema either
+        """
         schema_name = kwargs.get('schema_name', 'schema.json')
-        s3 = boto3.resource('s3')
-        object_key = f'{self._folder_name}/{schema_name}'
-        stored_object = s3.Object(self._bucket_name, object_key).get()
-        stored_schema_string = stored_object['Body'].read()
+        schema_version = kwargs.get('schema_version', None)
+        try:
+            stored_schema_string = self._get_object(self._generate_object_key(schema_name, schema_version))
+        except ClientError as e:
+            if schema_version is None or e.response['Error']['Code'] not in ('NoSuchKey', '404'):
+                raise e
+            stored_schema_string = self._get_object(self._generate_object_key(schema_name))
+            if self.generate_schema_version(stored_schema_string) != schema_version:
+                raise RuntimeError(f'schema_version {schema_version} of {schema_name} is not stored, '
+                                   f'and is not the current version either')
+            self._put_versioned_copy(schema_name, schema_version, stored_schema_string)
         schema = jsonref.loads(stored_schema_string, cls=AlgDecoder)
-        return schema
+        return schema, self.generate_schema_version(stored_schema_string)
 
     def put_schema(self, file_path, schema_name=None):
         if not schema_name:
             schema_name = 'schema.json'
-        file_name = f'{self._folder_name}/{schema_name}'
-        s3 = boto3.resource('s3')
-        s3.Bucket(self._bucket_name).upload_file(file_path, file_name)
+        with open(file_path, 'rb') as schema_file:
+            schema_version = self.generate_schema_version(schema_file.read())
+        s3 = ClientPool.get_resource('s3')
+        bucket = s3.Bucket(self._bucket_name)
+        bucket.upload_file(file_path, self._generate_object_key(schema_name))
+        bucket.upload_file(file_path, self._generate_object_key(schema_name, schema_version))
+        return schema_version
+
+    @staticmethod
+    def generate_schema_version(schema_string):
+        if isinstance(schema_string, str):
+            schema_string = schema_string.encode('utf-8')
+        return hashlib.sha256(schema_string).hexdigest()
+
+    def _get_object(self, object_key):
+        s3 = ClientPool.get_resource('s3')
+        stored_object = s3.Object(self._bucket_name, object_key).get()
+        return stored_object['Body'].read()
+
+    def _put_versioned_copy(self, schema_name, schema_version, stored_schema_string):
+        object_key = self._generate_object_key(schema_name, schema_version)
+        try:
+            ClientPool.get_resource('s3').Object(self._bucket_name, object_key).put(Body=stored_schema_string)
+        except ClientError as e:
+            logging.warning(f'could not write the versioned copy of {schema_name} to {object_key}: {e}')
+
+    def _generate_object_key(self, schema_name, schema_version=None):
+        if schema_version is None:
+            return f'{self._folder_name}/{schema_name}'
+        return f'{self._folder_name}/versions/{schema_version}/{schema_name}'
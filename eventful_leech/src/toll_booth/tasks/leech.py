@@ -1,23 +1,27 @@
 import logging
 import os
-from copy import deepcopy
+import threading
+from contextlib import contextmanager
 from decimal import Decimal
 from typing import Union, List, Dict
 
 from src.algernon import queued, ajson
+from src.algernon import AlgEnvelope
 from src.algernon import lambda_logged, Bullhorn
 
 from src.toll_booth import PotentialVertex, InternalId, IdentifierStem, PotentialEdge
 from src.toll_booth import Ogm
+from src.toll_booth import SensitiveDataSink
 from src.toll_booth.obj.index_manager import IndexManager
-from src.toll_booth.obj.index_manager import UniqueIndexViolationException
 from src.toll_booth import EdgeRegulator
 from src.toll_booth import RuleArbiter
 from src.toll_booth import ObjectRegulator
 from src.toll_booth import VertexLinkRuleEntry
-from src.toll_booth import Schema
+from src.toll_booth import Schema, SchemaReference
 from src.toll_booth import SchemaEdgeEntry, SchemaVertexEntry
 
+_held_messages = threading.local()
+
 
 @lambda_logged
 @queued
@@ -28,7 +32,8 @@ def task(event, context):
     if task_kwargs is None:
         task_kwargs = {}
     task_function = getattr(LeechTasks, f'_{task_name}')
-    results = task_function(**task_kwargs)
+    with Announcer.holding_messages(), SensitiveDataSink():
+        results = task_function(**task_kwargs)
     logging.info(f'completed a call for borg task, event: {event}, results: {results}')
     return ajson.dumps(results)
 
@@ -41,7 +46,8 @@ class LeechTasks:
                                 extracted_data: Dict,
                                 internal_id: InternalId = None,
                                 identifier_stem: IdentifierStem = None,
-                                id_value: Union[str, int, float, Decimal] = None) -> PotentialVertex:
+                                id_value: Union[str, int, float, Decimal] = None,
+                                announcer: 'Announcer' = None) -> PotentialVertex:
         """Generates a source vertex from data extracted from a remote source per a schema entry
 
         Args:
@@ -50,16 +56,49 @@ class LeechTasks:
             internal_id: if the internal_id has been previously calculated, we can bypass it's creation
             identifier_stem: if the identifier_stem has been previously created, we can include it here
             id_value: if the id_value is already known, we can skip deriving it
+            announcer: where the follow on tasks are sent, defaults to the Announcer
 
         Returns:
             a PotentialVertex object which represents the data organized and parsed per the SchemaEntry
         """
+        if announcer is None:
+            announcer = Announcer
         regulator = ObjectRegulator(schema_entry)
         object_data = extracted_data['source']
         source_vertex_data = regulator.create_potential_vertex_data(object_data, internal_id, identifier_stem, id_value)
         source_vertex = PotentialVertex(**source_vertex_data)
-        Announcer.announce_derive_potential_connections(source_vertex, schema, schema_entry, extracted_data)
-        Announcer.announce_index_and_graph(schema, source_vertex)
+        announcer.announce_derive_potential_connections(source_vertex, schema, schema_entry, extracted_data)
+        announcer.announce_index_and_graph(schema, source_vertex)
+        return source_vertex
+
+    @classmethod
+    def _fused_leech(cls,
+                     schema: Schema,
+                     schema_entry: SchemaVertexEntry,
+                     extracted_data: Dict,
+                     internal_id: InternalId = None,
+                     identifier_stem: IdentifierStem = None,
+                     id_value: Union[str, int, float, Decimal] = None) -> PotentialVertex:
+        """Runs every leech task for a single extracted object within this process
+
+        The tasks which would normally be announced to the listener are instead executed directly,
+        the objects they generate are indexed together here, then sent to the VPC worker in a single graph task
+
+        Args:
+            schema: the schema governing the data space
+            schema_entry: the SchemaEntry which specifies the integration of the data into the graph
+            extracted_data: the data extracted from the remote source
+            internal_id: if the internal_id has been previously calculated, we can bypass it's creation
+            identifier_stem: if the identifier_stem has been previously created, we can include it here
+            id_value: if the id_value is already known, we can skip deriving it
+
+        Returns:
+            the PotentialVertex generated for the extracted object
+        """
+        announcer = FusedAnnouncer()
+        source_vertex = cls._generate_source_vertex(
+            schema, schema_entry, extracted_data, internal_id, identifier_stem, id_value, announcer=announcer)
+        announcer.flush()
         return source_vertex
 
     @classmethod
@@ -67,7 +106,8 @@ class LeechTasks:
                                       schema: Schema,
                                       schema_entry: Union[SchemaVertexEntry, SchemaEdgeEntry],
                                       source_vertex: PotentialVertex,
-                                      extracted_data: Dict) -> [PotentialVertex]:
+                                      extracted_data: Dict,
+                                      announcer: 'Announcer' = None) -> [PotentialVertex]:
         """Generate a list of PotentialVertex objects indicated by the schema_entry
 
         Args:
@@ -75,17 +115,20 @@ class LeechTasks:
             schema_entry: the isolated entry for the source_vertex extracted from the remote space
             source_vertex: the PotentialVertex generated for the extracted object
             extracted_data: all the data extracted from the remote system
+            announcer: where the follow on tasks are sent, defaults to the Announcer
 
         Returns:
 
         """
+        if announcer is None:
+            announcer = Announcer
         arbiter = RuleArbiter(source_vertex, schema, schema_entry)
         potential_vertexes = arbiter.process_rules(extracted_data)
         for vertex_entry in potential_vertexes:
             vertex = vertex_entry[0]
             rule_entry = vertex_entry[1]
-            Announcer.announce_check_for_existing_vertexes(
-                source_vertex, vertex, rule_entry, schema_entry, extracted_data)
+            announcer.announce_check_for_existing_vertexes(
+                schema, source_vertex, vertex, rule_entry, schema_entry, extracted_data)
         return potential_vertexes
 
     @classmethod
@@ -95,32 +138,36 @@ class LeechTasks:
                                      source_vertex: PotentialVertex,
                                      potential_vertex: PotentialVertex,
                                      rule_entry: VertexLinkRuleEntry,
-                                     extracted_data: Dict) -> List:
+                                     extracted_data: Dict,
+                                     announcer: 'Announcer' = None) -> List:
         """check to see if vertex specified by potential_vertex and rule_entry exists
 
         Args:
             schema: the graph schema that governs the data space
             rule_entry: the vertex_link_rule that specified the potential connection
             potential_vertex: the potential vertex that is being checked against the index
+            announcer: where the follow on tasks are sent, defaults to the Announcer
 
         Returns:
             a tuple containing a list of vertexes to connect the source_vertex to
 
         """
+        if announcer is None:
+            announcer = Announcer
         index_manager = IndexManager.from_graph_schema(schema)
         found_vertexes = index_manager.find_potential_vertexes(
             potential_vertex.object_type, potential_vertex.object_properties)
         if potential_vertex.is_properties_complete and potential_vertex.is_identifiable:
-            Announcer.announce_generate_potential_edge(
+            announcer.announce_generate_potential_edge(
                 schema, source_vertex, potential_vertex, rule_entry, schema_entry, extracted_data)
             return [potential_vertex]
         if found_vertexes:
             for identified_vertex in found_vertexes:
-                Announcer.announce_generate_potential_edge(
+                announcer.announce_generate_potential_edge(
                     schema, source_vertex, identified_vertex, rule_entry, schema_entry, extracted_data)
             return found_vertexes
         if rule_entry.is_stub:
-            Announcer.announce_generate_potential_edge(
+            announcer.announce_generate_potential_edge(
                 schema, source_vertex, potential_vertex, rule_entry, schema_entry, extracted_data)
             return [potential_vertex]
         return []
@@ -132,7 +179,8 @@ class LeechTasks:
                                  source_vertex: PotentialVertex,
                                  identified_vertex: PotentialVertex,
                                  rule_entry: VertexLinkRuleEntry,
-                                 extracted_data: Dict) -> PotentialEdge:
+                                 extracted_data: Dict,
+                                 announcer: 'Announcer' = None) -> PotentialEdge:
         """Generate a PotentialEdge object between a known source object and a potential vertex
 
         Args:
@@ -142,15 +190,18 @@ class LeechTasks:
             identified_vertex: the vertex present in the data space to attach the source_vertex to
             rule_entry: the rule used to generate the expected link
             extracted_data: the data extracted from the remote source
+            announcer: where the follow on tasks are sent, defaults to the Announcer
 
         Returns:
             a PotentialEdge object for the potential connection between the source vertex and the potential other
         """
+        if announcer is None:
+            announcer = Announcer
         edge_regulator = EdgeRegulator(schema_entry)
         inbound = rule_entry.inbound
         edge_data = edge_regulator.generate_potential_edge_data(source_vertex, source_vertex, extracted_data, inbound)
         potential_edge = PotentialEdge(**edge_data)
-        Announcer.announce_index_and_graph(schema, source_vertex, identified_vertex, potential_edge)
+        announcer.announce_index_and_graph(schema, source_vertex, identified_vertex, potential_edge)
         return potential_edge
 
     @classmethod
@@ -175,6 +226,23 @@ class LeechTasks:
         graph_results = ogm.graph_objects(source_vertex, vertex, edge)
         return graph_results
 
+    @classmethod
+    def _graph_objects(cls,
+                       schema: Schema,
+                       graph_objects: List[Union[PotentialVertex, PotentialEdge]]) -> List[str]:
+        """Graphs many objects to the graph space in a single request
+
+        Args:
+            schema: the schema governing the graph data space
+            graph_objects: the vertexes and edges to be graphed
+
+        Returns:
+            the name of the upsert template used for each object written to the graph database
+
+        """
+        ogm = Ogm(schema)
+        return ogm.graph_objects(*graph_objects)
+
     @classmethod
     def _index(cls,
                schema: Schema,
@@ -191,43 +259,111 @@ class LeechTasks:
 
         Returns: None
 
+        """
+        cls._index_objects(schema, [source_vertex, vertex, edge])
+
+    @classmethod
+    def _index_objects(cls,
+                       schema: Schema,
+                       graph_objects: List[Union[PotentialVertex, PotentialEdge, None]]):
+        """Writes many objects to the index in a single round trip
+
+        Args:
+            schema: the schema governing the graph system
+            graph_objects: the vertexes and edges to be indexed
+
+        Returns: None
+
         """
         index_manager = IndexManager.from_graph_schema(schema)
-        try:
-            index_manager.index_object(source_vertex)
-        except UniqueIndexViolationException as e:
-            logging.warning(f'tried to index source_vertex: {source_vertex}, seems it has already been graphed: {e} '
-                            f'this is not likely not a problem, but logging it just in case')
-        if vertex:
-            try:
-                index_manager.index_object(vertex)
-            except UniqueIndexViolationException as e:
-                logging.warning(
-                    f'tried to index potential_vertex: {vertex}, seems it has already been graphed: {e} '
-                    f'this is not likely not a problem, but logging it just in case')
-        if edge:
-            try:
-                index_manager.index_object(edge)
-            except UniqueIndexViolationException as e:
-                logging.warning(
-                    f'tried to graph edge: {edge}, seems it has already been graphed: {e} '
-                    f'this is not likely not a problem, but logging it just in case')
+        violations = index_manager.index_objects(*graph_objects)
+        for violation in violations:
+            logging.warning(f'tried to index {violation.indexed_object}, seems it has already been graphed: '
+                            f'{violation} this is not likely not a problem, but logging it just in case')
 
 
 class Announcer:
+    """Publishes the follow on tasks of a leech task to the listener topics
+
+        within holding_messages, the messages sent on a thread are held in a BullhornBuffer for each topic,
+        and sent in batches when the block exits cleanly, each task holds its own messages,
+        so records processed concurrently never publish, or drop, the messages of another,
+        tasks run within holding_messages, outside the SensitiveDataSink,
+        so the sensitive data a follow on task reads has been stored before the task is published,
+        messages sent outside holding_messages are published immediately
+
+    """
     _bullhorn = Bullhorn()
     _topic_arn = os.environ['LEECH_LISTENER_ARN']
     _vpc_topic_arn = os.environ['VPC_LEECH_LISTENER_ARN']
+    _schema_by_reference = os.getenv('SCHEMA_BY_REFERENCE', 'false').lower() == 'true'
+    _message_format = os.getenv('MESSAGE_FORMAT', 'json').lower()
 
     @classmethod
     def _send_message(cls, message: Dict, is_vpc: bool = False):
         topic_arn = cls._topic_arn
         if is_vpc:
             topic_arn = cls._vpc_topic_arn
-        cls._bullhorn.publish('new_event', topic_arn, ajson.dumps(message))
+        message_body = cls._encode_message(message)
+        held_buffers = getattr(_held_messages, 'buffers', None)
+        if held_buffers is None:
+            cls._bullhorn.publish('new_event', topic_arn, message_body)
+            return
+        buffer = held_buffers.get(topic_arn)
+        if buffer is None:
+            buffer = cls._bullhorn.buffer('new_event', topic_arn, flush_size=None)
+            held_buffers[topic_arn] = buffer
+        buffer.publish(message_body)
+
+    @classmethod
+    @contextmanager
+    def holding_messages(cls):
+        """holds the messages sent on this thread within the block, publishing them when it exits cleanly,
+        and dropping them if not
+
+        Raises:
+            RuntimeError: some messages could not be published, those which were are not sent again
+        """
+        previous_buffers = getattr(_held_messages, 'buffers', None)
+        held_buffers = {}
+        _held_messages.buffers = held_buffers
+        try:
+            yield
+        finally:
+            _held_messages.buffers = previous_buffers
+        failed_messages = []
+        for buffer in held_buffers.values():
+            buffer.flush()
+            failed_messages.extend(buffer.failed_messages)
+        if failed_messages:
+            raise RuntimeError(f'could not publish {len(failed_messages)} follow on tasks: {failed_messages}')
+
+    @classmethod
+    def _encode_message(cls, message: Dict) -> str:
+        """encodes a message as AlgJson, or as an AlgEnvelope when MESSAGE_FORMAT is 'envelope'"""
+        if cls._message_format == 'envelope':
+            return AlgEnvelope.dumps(message)
+        return ajson.dumps(message)
+
+    @classmethod
+    def _for_message(cls,
+                     schema: Schema,
+                     schema_entry: Union[SchemaVertexEntry, SchemaEdgeEntry] = None):
+        """swaps the schema, or the schema_entry, for a SchemaReference when running by reference
+
+        schemas which were not retrieved from storage carry no schema_version, these are always sent in full
+        """
+        if not cls._schema_by_reference or schema.schema_version is None:
+            if schema_entry is None:
+                return schema
+            return schema_entry
+        if schema_entry is None:
+            return SchemaReference(schema.schema_version)
+        return SchemaReference(schema.schema_version, schema_entry.entry_name)
 
     @classmethod
     def announce_check_for_existing_vertexes(cls,
+                                             schema: Schema,
                                              source_vertex: PotentialVertex,
                                              vertex: PotentialVertex,
                                              rule_entry: VertexLinkRuleEntry,
@@ -236,10 +372,11 @@ class Announcer:
         message = {
             'task_name': 'check_for_existing_vertexes',
             'task_kwargs': {
+                'schema': cls._for_message(schema),
                 'source_vertex': source_vertex,
                 'potential_vertex': vertex,
                 'rule_entry': rule_entry,
-                'schema_entry': schema_entry,
+                'schema_entry': cls._for_message(schema, schema_entry),
                 'extracted_data': extracted_data,
 
             }
@@ -256,8 +393,8 @@ class Announcer:
             'task_name': 'derive_potential_connections',
             'task_kwargs': {
                 'source_vertex': source_vertex,
-                'schema': schema,
-                'schema_entry': schema_entry,
+                'schema': cls._for_message(schema),
+                'schema_entry': cls._for_message(schema, schema_entry),
                 'extracted_data': extracted_data
             }
         }
@@ -274,11 +411,11 @@ class Announcer:
         message = {
             'task_name': 'generate_potential_edge',
             'task_kwargs': {
-                'schema': schema,
+                'schema': cls._for_message(schema),
                 'source_vertex': source_vertex,
                 'identified_vertex': identifier_vertex,
                 'rule_entry': rule_entry,
-                'schema_entry': schema_entry,
+                'schema_entry': cls._for_message(schema, schema_entry),
                 'extracted_data': extracted_data
             }
         }
@@ -293,13 +430,81 @@ class Announcer:
         message = {
             'task_name': 'index',
             'task_kwargs': {
-                'schema': schema,
+                'schema': cls._for_message(schema),
                 'vertex': identified_vertex,
                 'source_vertex': source_vertex,
                 'edge': potential_edge
             }
         }
-        graph_message = deepcopy(message)
-        graph_message['task_name'] = 'graph'
+        graph_message = dict(message, task_name='graph')
         cls._send_message(message)
         cls._send_message(graph_message, True)
+
+
+class FusedAnnouncer(Announcer):
+    """Stands in for the Announcer when running the leech tasks in-process
+
+        rather than publishing each follow on task, the FusedAnnouncer executes it immediately,
+        the objects bound for the index and the graph are held until flush is called
+
+    """
+    def __init__(self):
+        self._schema = None
+        self._graph_objects = {}
+
+    def announce_check_for_existing_vertexes(self,
+                                             schema: Schema,
+                                             source_vertex: PotentialVertex,
+                                             vertex: PotentialVertex,
+                                             rule_entry: VertexLinkRuleEntry,
+                                             schema_entry: Union[SchemaVertexEntry, SchemaEdgeEntry],
+                                             extracted_data: Dict):
+        LeechTasks._check_for_existing_vertexes(
+            schema, schema_entry, source_vertex, vertex, rule_entry, extracted_data, announcer=self)
+
+    def announce_derive_potential_connections(self,
+                                              source_vertex: PotentialVertex,
+                                              schema: Schema,
+                                              schema_entry: Union[SchemaVertexEntry, SchemaEdgeEntry],
+                                              extracted_data: Dict):
+        LeechTasks._derive_potential_connections(schema, schema_entry, source_vertex, extracted_data, announcer=self)
+
+    def announce_generate_potential_edge(self,
+                                         schema: Schema,
+                                         source_vertex: PotentialVertex,
+                                         identifier_vertex: PotentialVertex,
+                                         rule_entry: VertexLinkRuleEntry,
+                                         schema_entry: Union[SchemaVertexEntry, SchemaEdgeEntry],
+                                         extracted_data: Dict):
+        LeechTasks._generate_potential_edge(
+            schema, schema_entry, source_vertex, identifier_vertex, rule_entry, extracted_data, announcer=self)
+
+    def announce_index_and_graph(self,
+                                 schema: Schema,
+                                 source_vertex: PotentialVertex,
+                                 identified_vertex: PotentialVertex = None,
+                                 potential_edge: PotentialEdge = None):
+        self._schema = schema
+        for graph_object in (source_vertex, identified_vertex, potential_edge):
+            if graph_object is None:
+                continue
+            object_key = id(graph_object)
+            if graph_object.is_internal_id_set:
+                object_key = (graph_object.is_edge, graph_object.internal_id)
+            self._graph_objects[object_key] = graph_object
+
+    def flush(self):
+        """indexes every collected object, then hands them all to the VPC worker as one graph task"""
+        if not self._graph_objects:
+            return
+        graph_objects = list(self._graph_objects.values())
+        self._graph_objects = {}
+        LeechTasks._index_objects(self._schema, graph_objects)
+        message = {
+            'task_name': 'graph_objects',
+            'task_kwargs': {
+                'schema': self._for_message(self._schema),
+                'graph_objects': graph_objects
+            }
+        }
+        self._send_message(message, True)
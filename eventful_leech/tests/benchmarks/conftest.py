@@ -0,0 +1,165 @@
+import json
+import logging
+import os
+import time
+import tracemalloc
+from os import path
+
+import pytest
+
+_recorders = []
+
+
+class BenchmarkResult:
+    def __init__(self, benchmark_name, iterations, total_seconds, peak_bytes, operations=1):
+        self._benchmark_name = benchmark_name
+        self._iterations = iterations
+        self._operations = operations
+        self._total_seconds = total_seconds
+        self._peak_bytes = peak_bytes
+
+    @classmethod
+    def measure(cls, benchmark_name, benchmark_fn, iterations=100, operations=1):
+        """times benchmark_fn over a number of iterations, then runs it once more under tracemalloc
+
+        the first call is a warm up and is not counted, so module imports and caches do not skew the numbers,
+        operations is how many units of work (i.e. graphed objects) a single call of benchmark_fn performs
+
+        """
+        benchmark_fn()
+        start = time.perf_counter()
+        for _ in range(iterations):
+            benchmark_fn()
+        total_seconds = time.perf_counter() - start
+        tracemalloc.start()
+        try:
+            benchmark_fn()
+            _, peak_bytes = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return cls(benchmark_name, iterations, total_seconds, peak_bytes, operations)
+
+    @property
+    def benchmark_name(self):
+        return self._benchmark_name
+
+    @property
+    def ops_per_second(self):
+        if not self._total_seconds:
+            return float('inf')
+        return self._iterations * self._operations / self._total_seconds
+
+    @property
+    def peak_bytes(self):
+        return self._peak_bytes
+
+    @property
+    def for_results(self):
+        return {'ops_per_second': self.ops_per_second, 'peak_bytes': self._peak_bytes}
+
+    def __str__(self):
+        return f'{self._benchmark_name:<60} {self.ops_per_second:>14,.1f} ops/s {self._peak_bytes:>14,} peak bytes'
+
+
+class BenchmarkRecorder:
+    """Collects the results of a benchmark suite, and compares results measured within the same run
+
+        absolute throughput depends on the machine the suite runs on, so regressions are caught as ratios,
+        a result regresses when its throughput falls below min_ratio times that of a reference result
+        from the same run, i.e. a batched path against the one at a time path it replaced,
+        BENCHMARK_TOLERANCE loosens every ratio by that fraction, to ride out noisy runners,
+        when BENCHMARK_RESULTS_PATH is set, the results are written there as json, i.e. as a CI artifact
+
+    """
+    def __init__(self, suite_name, tolerance=None, results_path=None):
+        if tolerance is None:
+            tolerance = float(os.getenv('BENCHMARK_TOLERANCE', 0.25))
+        if results_path is None:
+            results_path = os.getenv('BENCHMARK_RESULTS_PATH', None)
+        self._suite_name = suite_name
+        self._tolerance = tolerance
+        self._results_path = results_path
+        self._results = {}
+
+    @property
+    def suite_name(self):
+        return self._suite_name
+
+    @property
+    def results(self):
+        return self._results
+
+    def record(self, result: BenchmarkResult):
+        self._results[result.benchmark_name] = result
+        return result
+
+    def find_regressions(self, result: BenchmarkResult, reference_name: str = None, min_ratio: float = None):
+        """compares a result to the reference result of the same run, if one is given
+
+        Args:
+            result: the result being checked
+            reference_name: the benchmark_name of the result it is compared to, which must already be recorded
+            min_ratio: the least throughput expected of result, as a multiple of the throughput of the reference
+
+        Returns:
+            a description of each regression found, empty if there were none
+
+        """
+        if reference_name is None or min_ratio is None:
+            return []
+        reference = self._results[reference_name]
+        expected_ratio = min_ratio * (1 - self._tolerance)
+        measured_ratio = result.ops_per_second / reference.ops_per_second
+        if measured_ratio >= expected_ratio:
+            return []
+        return [f'{result.benchmark_name} ran at {measured_ratio:,.2f}x the throughput of {reference_name}, '
+                f'expected at least {expected_ratio:,.2f}x']
+
+    def report(self):
+        return '\n'.join(str(x) for x in self._results.values())
+
+    def save(self):
+        if not self._results_path or not self._results:
+            return
+        os.makedirs(self._results_path, exist_ok=True)
+        results_file_path = path.join(self._results_path, f'{self._suite_name}.json')
+        with open(results_file_path, 'w') as results_file:
+            json.dump({x: y.for_results for x, y in self._results.items()}, results_file, indent=2, sort_keys=True)
+
+
+def _is_benchmark_run(config):
+    if os.getenv('BENCHMARK_RUN', 'false').lower() == 'true':
+        return True
+    mark_expression = config.getoption('markexpr', '') or ''
+    return 'benchmark' in mark_expression and 'not benchmark' not in mark_expression
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'benchmark: timed suites, only run with -m benchmark, or BENCHMARK_RUN=true')
+
+
+def pytest_collection_modifyitems(config, items):
+    if _is_benchmark_run(config):
+        return
+    skip_benchmark = pytest.mark.skip(reason='benchmarks only run with -m benchmark, or BENCHMARK_RUN=true')
+    for item in items:
+        if item.get_closest_marker('benchmark') is not None:
+            item.add_marker(skip_benchmark)
+
+
+def pytest_terminal_summary(terminalreporter):
+    for recorder in _recorders:
+        if not recorder.results:
+            continue
+        terminalreporter.write_sep('-', f'{recorder.suite_name} benchmarks')
+        terminalreporter.write_line(recorder.report())
+
+
+@pytest.fixture(scope='module')
+def benchmark_recorder(request):
+    suite_name = getattr(request.module, 'benchmark_suite', request.module.__name__.split('.')[-1])
+    recorder = BenchmarkRecorder(suite_name)
+    _recorders.append(recorder)
+    yield recorder
+    logging.info(f'{suite_name} benchmarks\n{recorder.report()}')
+    recorder.save()
@@ -0,0 +1,136 @@
+import pytest
+
+from src.algernon import DynamoBatcher
+from src.toll_booth import PotentialVertex, IdentifierStem
+from src.toll_booth import SensitiveData, SensitiveDataSink, PersistedSensitiveCache
+from src.toll_booth.obj.index_manager import IndexManager, IndexPlan
+
+from tests.benchmarks.conftest import BenchmarkResult
+from tests.stand_ins.dynamo import DynamoStandIn
+
+benchmark_suite = 'dynamo'
+_workload_sizes = [10, 200]
+_throttle_rates = [0.0, 0.05]
+_latency_seconds = 0.002
+_min_concurrent_ratio = 2.5
+_min_cached_ratio = 3.0
+
+
+class _SerialSensitiveDataSink(SensitiveDataSink):
+    """a sink which writes its values one after another, as SensitiveData did before sinks existed"""
+    _max_workers = 1
+
+
+def _generate_vertex(vertex_number, property_count=10):
+    object_properties = {f'property_{i}': f'value_{vertex_number}_{i}' for i in range(property_count)}
+    object_properties['id_value'] = vertex_number
+    identifier_stem = IdentifierStem('vertex', 'SyntheticVertex', {'id_source': 'benchmark'})
+    return PotentialVertex(
+        'SyntheticVertex', f'internal_{vertex_number}', object_properties, identifier_stem, vertex_number, 'id_value')
+
+
+def _generate_sensitive_data(value_count, call_number=0):
+    for i in range(value_count):
+        SensitiveData(f'sensitive_value_{call_number}_{i}', f'field_{i}', f'internal_{call_number}')
+
+
+def _build_index_manager(dynamo_stand_in, is_unique):
+    index_names = ['synthetic_index']
+    unique_index_names = index_names if is_unique else []
+    index_plans = {'SyntheticVertex': IndexPlan(
+        'SyntheticVertex', index_names, unique_index_names, ['id_source'], 'id_value')}
+    batcher = DynamoBatcher(dynamo_stand_in, backoff_base=0.005)
+    return IndexManager(index_plans, 'Indexes', batcher)
+
+
+@pytest.fixture
+def dynamo_stand_in():
+    return DynamoStandIn.for_leech(latency_seconds=_latency_seconds, seed=7)
+
+
+@pytest.mark.benchmark
+class TestDynamoBenchmarks:
+    @staticmethod
+    def _run(benchmark_recorder, benchmark_name, benchmark_fn, iterations, operations,
+             reference_name=None, min_ratio=None):
+        result = benchmark_recorder.record(
+            BenchmarkResult.measure(benchmark_name, benchmark_fn, iterations, operations))
+        regressions = benchmark_recorder.find_regressions(result, reference_name, min_ratio)
+        assert not regressions, '\n'.join(regressions)
+
+    @pytest.mark.parametrize('value_count', _workload_sizes)
+    def test_sensitive_writes(self, benchmark_recorder, dynamo_stand_in, value_count):
+        """values written one after another, then concurrently, which must be min_concurrent_ratio faster"""
+        call_numbers = iter(range(1000))
+        reference_name = None
+        for sink_class in (_SerialSensitiveDataSink, SensitiveDataSink):
+            def write_sensitive_data():
+                with sink_class('Sensitives', dynamo_stand_in, persisted_cache=PersistedSensitiveCache(max_entries=0)):
+                    _generate_sensitive_data(value_count, next(call_numbers))
+
+            benchmark_name = f'{sink_class.__name__}[{value_count} values]'
+            self._run(
+                benchmark_recorder, benchmark_name, write_sensitive_data, 5, value_count,
+                reference_name, _min_concurrent_ratio if reference_name else None)
+            reference_name = benchmark_name
+        assert len(dynamo_stand_in.items('Sensitives')) == value_count * 14
+        assert dynamo_stand_in.call_counts['UpdateItem'] == value_count * 14
+
+    @pytest.mark.parametrize('value_count', _workload_sizes)
+    def test_sensitive_rewrites(self, benchmark_recorder, dynamo_stand_in, value_count):
+        """the same values written again, as an incremental sync produces, first probed, then known to the worker"""
+        with SensitiveDataSink('Sensitives', dynamo_stand_in, persisted_cache=PersistedSensitiveCache(max_entries=0)):
+            _generate_sensitive_data(value_count)
+        dynamo_stand_in.call_counts.clear()
+
+        def probe_sensitive_data():
+            with SensitiveDataSink('Sensitives', dynamo_stand_in, probe=True,
+                                   persisted_cache=PersistedSensitiveCache(max_entries=0)):
+                _generate_sensitive_data(value_count)
+
+        self._run(
+            benchmark_recorder, f'SensitiveDataSink.probe[{value_count} stored values]',
+            probe_sensitive_data, 5, value_count)
+        assert dynamo_stand_in.call_counts['UpdateItem'] == 0
+
+        persisted_cache = PersistedSensitiveCache()
+
+        def skip_sensitive_data():
+            with SensitiveDataSink('Sensitives', dynamo_stand_in, persisted_cache=persisted_cache):
+                _generate_sensitive_data(value_count)
+
+        self._run(
+            benchmark_recorder, f'SensitiveDataSink.persisted_cache[{value_count} stored values]',
+            skip_sensitive_data, 5, value_count,
+            f'SensitiveDataSink.probe[{value_count} stored values]', _min_cached_ratio)
+        assert dynamo_stand_in.call_counts['UpdateItem'] == value_count
+        assert len(dynamo_stand_in.items('Sensitives')) == value_count
+
+    @pytest.mark.parametrize('throttle_rate', _throttle_rates)
+    def test_resolve_many(self, benchmark_recorder, dynamo_stand_in, throttle_rate):
+        pointer_count = 500
+        with SensitiveDataSink('Sensitives', dynamo_stand_in, persisted_cache=PersistedSensitiveCache(max_entries=0)):
+            _generate_sensitive_data(pointer_count)
+        pointers = [x['insensitive']['S'] for x in dynamo_stand_in.items('Sensitives')]
+        dynamo_stand_in.throttle_rate = throttle_rate
+        self._run(
+            benchmark_recorder, f'SensitiveData.resolve_many[{pointer_count} pointers, throttle_rate {throttle_rate}]',
+            lambda: SensitiveData.resolve_many(pointers, 'Sensitives', dynamo_stand_in), 5, pointer_count)
+        resolved = SensitiveData.resolve_many(pointers, 'Sensitives', dynamo_stand_in)
+        assert len(resolved) == pointer_count
+
+    @pytest.mark.parametrize('is_unique', [False, True])
+    @pytest.mark.parametrize('throttle_rate', _throttle_rates)
+    def test_index_objects(self, benchmark_recorder, dynamo_stand_in, throttle_rate, is_unique):
+        vertex_count = 200
+        workload = [_generate_vertex(x) for x in range(vertex_count)]
+        index_manager = _build_index_manager(dynamo_stand_in, is_unique)
+        dynamo_stand_in.throttle_rate = throttle_rate
+        index_name = 'unique' if is_unique else 'batched'
+        self._run(
+            benchmark_recorder,
+            f'IndexManager.index_objects[{vertex_count} vertexes, {index_name}, throttle_rate {throttle_rate}]',
+            lambda: index_manager.index_objects(*workload), 3, vertex_count)
+        assert len(dynamo_stand_in.items('Indexes')) == vertex_count
+        found = index_manager.find_by_numeric_range('#vertex#SyntheticVertex#', 0, vertex_count)
+        assert len(found) == vertex_count
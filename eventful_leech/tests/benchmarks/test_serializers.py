@@ -0,0 +1,151 @@
+import json
+from os import path
+
+import pytest
+import rapidjson
+
+from src.algernon import AlgJson, AlgEncoder, AlgDecoder, AlgObject, ajson
+from src.algernon import AlgEnvelope
+from src.toll_booth import PotentialVertex, IdentifierStem, Schema
+from src.toll_booth import SchemaVertexEntry, SchemaIndexEntry, VertexRules
+from src.toll_booth.obj.schemata.entry_property import SchemaPropertyEntry
+from src.toll_booth.obj.schemata.schema_entry import SchemaInternalIdKey, SchemaIdentifierStem
+
+from tests.benchmarks.conftest import BenchmarkResult
+
+benchmark_suite = 'serializers'
+_test_events_folder = path.join(path.dirname(path.dirname(__file__)), 'test_events')
+_fixture_events = [
+    'generate_source_vertex_event', 'generate_source_vertex_event_1', 'gql_vertex', 'gql_vertex_2']
+_synthetic_sizes = [1, 10, 100]
+
+
+def _read_event_string(event_name):
+    with open(path.join(_test_events_folder, f'{event_name}.json')) as event_file:
+        return event_file.read()
+
+
+def _generate_vertex(vertex_number, property_count):
+    object_properties = {f'property_{i}': f'value_{vertex_number}_{i}' for i in range(property_count)}
+    object_properties['id_value'] = vertex_number
+    identifier_stem = IdentifierStem('vertex', 'SyntheticVertex', {'id_source': 'benchmark'})
+    return PotentialVertex(
+        'SyntheticVertex', f'internal_{vertex_number}', object_properties, identifier_stem, vertex_number, 'id_value')
+
+
+def _generate_schema(entry_count):
+    vertex_entries = {}
+    for i in range(entry_count):
+        vertex_name = f'SyntheticVertex{i}'
+        vertex_properties = {
+            'id_value': SchemaPropertyEntry('id_value', 'Number', is_id_value=True),
+            'id_source': SchemaPropertyEntry('id_source', 'String'),
+            'secret': SchemaPropertyEntry('secret', 'String', sensitive=True)
+        }
+        indexes = {
+            'internal_id_index': SchemaIndexEntry('internal_id_index', 'unique', True, {'key': ['internal_id']})
+        }
+        vertex_entries[vertex_name] = SchemaVertexEntry(
+            vertex_name, vertex_properties, SchemaInternalIdKey(['object_type', 'id_value']),
+            SchemaIdentifierStem(['id_source']), indexes, VertexRules(), {})
+    return Schema(vertex_entries, {}, 'benchmark_schema_version')
+
+
+def _generate_synthetic_payloads():
+    payloads = {}
+    for size in _synthetic_sizes:
+        payloads[f'schema_{size}_entries'] = _generate_schema(size)
+        payloads[f'vertex_{size * 10}_properties'] = _generate_vertex(0, size * 10)
+        payloads[f'vertex_batch_{size}'] = [_generate_vertex(x, 10) for x in range(size)]
+    return payloads
+
+
+def _collect_alg_objects(payload, collected=None):
+    """walks an object tree, returning every AlgObject in it, in the order AlgEncoder.default would see them"""
+    if collected is None:
+        collected = []
+    if isinstance(payload, AlgObject):
+        collected.append(payload)
+        _collect_alg_objects(payload.to_json, collected)
+    elif isinstance(payload, dict):
+        for entry in payload.values():
+            _collect_alg_objects(entry, collected)
+    elif isinstance(payload, (list, tuple, set, frozenset)):
+        for entry in payload:
+            _collect_alg_objects(entry, collected)
+    return collected
+
+
+def _generate_queued_body(encoded_payload):
+    return rapidjson.dumps({'Message': encoded_payload})
+
+
+def _decode_queued_body(queued_body):
+    entry_body = rapidjson.loads(queued_body)
+    return rapidjson.loads(entry_body['Message'], object_hook=AlgDecoder.object_hook)
+
+
+_synthetic_payloads = _generate_synthetic_payloads()
+
+
+@pytest.mark.benchmark
+class TestSerializerBenchmarks:
+    @staticmethod
+    def _run(benchmark_recorder, benchmark_name, benchmark_fn, iterations=100, reference_name=None, min_ratio=None):
+        result = benchmark_recorder.record(BenchmarkResult.measure(benchmark_name, benchmark_fn, iterations))
+        regressions = benchmark_recorder.find_regressions(result, reference_name, min_ratio)
+        assert not regressions, '\n'.join(regressions)
+
+    @pytest.mark.parametrize('event_name', _fixture_events)
+    def test_fixture_loads(self, benchmark_recorder, event_name):
+        event_string = _read_event_string(event_name)
+        self._run(benchmark_recorder, f'rapidjson.loads[{event_name}]', lambda: rapidjson.loads(event_string))
+        self._run(benchmark_recorder, f'AlgJson.loads[{event_name}]', lambda: AlgJson.loads(event_string))
+
+    @pytest.mark.parametrize('event_name', _fixture_events)
+    def test_fixture_dumps(self, benchmark_recorder, event_name):
+        decoded = AlgJson.loads(_read_event_string(event_name))
+        self._run(benchmark_recorder, f'AlgJson.dumps[{event_name}]', lambda: AlgJson.dumps(decoded))
+
+    @pytest.mark.parametrize('event_name', _fixture_events)
+    def test_fixture_pipeline_hop(self, benchmark_recorder, event_name):
+        decoded = AlgJson.loads(_read_event_string(event_name))
+        self._run(
+            benchmark_recorder, f'pipeline_hop[{event_name}]',
+            lambda: _decode_queued_body(_generate_queued_body(ajson.dumps(decoded))))
+
+    @pytest.mark.parametrize('payload_name', sorted(_synthetic_payloads))
+    def test_synthetic_encoder_default(self, benchmark_recorder, payload_name):
+        alg_objects = _collect_alg_objects(_synthetic_payloads[payload_name])
+
+        def encode_all():
+            for alg_object in alg_objects:
+                AlgEncoder.default(alg_object)
+
+        self._run(benchmark_recorder, f'AlgEncoder.default[{payload_name}]', encode_all)
+
+    @pytest.mark.parametrize('payload_name', sorted(_synthetic_payloads))
+    def test_synthetic_object_hook(self, benchmark_recorder, payload_name):
+        encoded = AlgJson.dumps(_synthetic_payloads[payload_name])
+        self._run(benchmark_recorder, f'json.loads, no hook[{payload_name}]', lambda: json.loads(encoded))
+        self._run(
+            benchmark_recorder, f'AlgDecoder.object_hook[{payload_name}]',
+            lambda: json.loads(encoded, object_hook=AlgDecoder.object_hook),
+            reference_name=f'json.loads, no hook[{payload_name}]', min_ratio=0.2)
+
+    @pytest.mark.parametrize('payload_name', sorted(_synthetic_payloads))
+    def test_synthetic_round_trip(self, benchmark_recorder, payload_name):
+        payload = _synthetic_payloads[payload_name]
+        self._run(benchmark_recorder, f'AlgJson.dumps[{payload_name}]', lambda: AlgJson.dumps(payload))
+        encoded = AlgJson.dumps(payload)
+        self._run(benchmark_recorder, f'AlgJson.loads[{payload_name}]', lambda: AlgJson.loads(encoded))
+        self._run(benchmark_recorder, f'ajson_round_trip[{payload_name}]', lambda: ajson.loads(ajson.dumps(payload)))
+
+    @pytest.mark.parametrize('payload_name', sorted(_synthetic_payloads))
+    def test_synthetic_envelope_round_trip(self, benchmark_recorder, payload_name):
+        payload = _synthetic_payloads[payload_name]
+        self._run(benchmark_recorder, f'AlgEnvelope.dumps[{payload_name}]', lambda: AlgEnvelope.dumps(payload))
+        enveloped = AlgEnvelope.dumps(payload)
+        self._run(benchmark_recorder, f'AlgEnvelope.loads[{payload_name}]', lambda: AlgEnvelope.loads(enveloped))
+        if len(_collect_alg_objects(payload)) > 10:
+            assert len(enveloped) < len(AlgJson.dumps(payload))
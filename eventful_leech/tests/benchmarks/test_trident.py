@@ -0,0 +1,137 @@
+import pytest
+
+from src.algernon import TridentDriver, TridentNotary, TridentRouter, TridentWriteLedger
+from src.algernon import TridentDecoder, TridentColumns
+from src.toll_booth import PotentialVertex, PotentialEdge, IdentifierStem, Schema
+from src.toll_booth import Ogm, GraphedObjectCache
+
+from tests.benchmarks.conftest import BenchmarkResult
+from tests.stand_ins.gremlin import GremlinStandIn
+
+benchmark_suite = 'trident'
+_workload_sizes = [10, 100]
+_batch_sizes = [1, 50]
+_batched_ratios = [(10, 1.5), (100, 4.0)]
+_export_sizes = [100, 1000]
+_latency_seconds = 0.002
+
+
+def _generate_vertex(vertex_number, property_count=10):
+    object_properties = {f'property_{i}': f'value_{vertex_number}_{i}' for i in range(property_count)}
+    object_properties['id_value'] = vertex_number
+    identifier_stem = IdentifierStem('vertex', 'SyntheticVertex', {'id_source': 'benchmark'})
+    return PotentialVertex(
+        'SyntheticVertex', f'internal_{vertex_number}', object_properties, identifier_stem, vertex_number, 'id_value')
+
+
+def _generate_workload(vertex_count):
+    """a chain of vertexes, each joined to the next by an edge"""
+    vertexes = [_generate_vertex(x) for x in range(vertex_count)]
+    edges = [PotentialEdge('_follows', f'edge_{x}', {'rank': x}, f'internal_{x}', f'internal_{x + 1}')
+             for x in range(vertex_count - 1)]
+    return vertexes + edges
+
+
+@pytest.fixture(scope='module')
+def gremlin_stand_in():
+    with GremlinStandIn(latency_seconds=_latency_seconds) as stand_in:
+        yield stand_in
+
+
+def _build_uncached_ogm(driver):
+    return Ogm(Schema(), driver, GraphedObjectCache(ttl_seconds=0, table_name=''))
+
+
+def _build_driver(gremlin_stand_in, **kwargs):
+    notary = TridentNotary(gremlin_stand_in.host, port=gremlin_stand_in.port, use_tls=False)
+    router = TridentRouter(TridentWriteLedger(window_seconds=0))
+    return TridentDriver(read_notary=notary, write_notary=notary, router=router, **kwargs)
+
+
+@pytest.mark.benchmark
+class TestTridentBenchmarks:
+    @staticmethod
+    def _run(benchmark_recorder, benchmark_name, benchmark_fn, iterations, operations,
+             reference_name=None, min_ratio=None):
+        result = benchmark_recorder.record(
+            BenchmarkResult.measure(benchmark_name, benchmark_fn, iterations, operations))
+        regressions = benchmark_recorder.find_regressions(result, reference_name, min_ratio)
+        assert not regressions, '\n'.join(regressions)
+
+    @pytest.mark.parametrize('vertex_count, min_batched_ratio', _batched_ratios)
+    def test_graph_objects(self, benchmark_recorder, gremlin_stand_in, vertex_count, min_batched_ratio):
+        """one command per object, then the same objects sent as batches of 50, which must be min_batched_ratio faster"""
+        workload = _generate_workload(vertex_count)
+        reference_name = None
+        for batch_size in _batch_sizes:
+            gremlin_stand_in.reset()
+            ogm = _build_uncached_ogm(_build_driver(gremlin_stand_in, batch_size=batch_size, batch_workers=4))
+            benchmark_name = f'Ogm.graph_objects[{vertex_count} vertexes, batch_size {batch_size}]'
+            self._run(
+                benchmark_recorder, benchmark_name, lambda: ogm.graph_objects(*workload), 5, len(workload),
+                reference_name, min_batched_ratio if reference_name else None)
+            reference_name = benchmark_name
+            assert len(gremlin_stand_in.vertexes) == vertex_count
+            assert len(gremlin_stand_in.edges) == vertex_count - 1
+
+    @pytest.mark.parametrize('vertex_count', _workload_sizes)
+    def test_graph_objects_cached(self, benchmark_recorder, gremlin_stand_in, vertex_count):
+        """the same stub vertexes joined by new edges each call, as repeated generate_potential_edge tasks produce"""
+        gremlin_stand_in.reset()
+        stubs = [_generate_vertex(x) for x in range(vertex_count)]
+        ogm = Ogm(Schema(), _build_driver(gremlin_stand_in), GraphedObjectCache(table_name=''))
+        call_numbers = iter(range(1000))
+
+        def graph_new_edges():
+            call_number = next(call_numbers)
+            edges = [PotentialEdge('_follows', f'edge_{call_number}_{x}', {}, f'internal_{x}', f'internal_{x + 1}')
+                     for x in range(vertex_count - 1)]
+            return ogm.graph_objects(*stubs, *edges)
+
+        self._run(
+            benchmark_recorder, f'Ogm.graph_objects, cached stubs[{vertex_count} vertexes]',
+            graph_new_edges, 5, 2 * vertex_count - 1)
+        assert len(gremlin_stand_in.vertexes) == vertex_count
+        assert set(graph_new_edges()) == {'upsert_edge_0'}
+
+    @pytest.mark.parametrize('vertex_count', _workload_sizes)
+    def test_read_vertexes(self, benchmark_recorder, gremlin_stand_in, vertex_count):
+        gremlin_stand_in.reset()
+        driver = _build_driver(gremlin_stand_in)
+        _build_uncached_ogm(driver).graph_objects(*_generate_workload(vertex_count))
+        command = 'g.V().hasLabel(vertex_label)'
+        bindings = {'vertex_label': 'SyntheticVertex'}
+        self._run(
+            benchmark_recorder, f'TridentDriver.execute[{vertex_count} vertexes]',
+            lambda: driver.execute(command, True, bindings), 20, vertex_count)
+        self._run(
+            benchmark_recorder, f'TridentDriver.stream[{vertex_count} vertexes]',
+            lambda: list(driver.stream(command, True, bindings)), 20, vertex_count)
+        streamed = list(driver.stream(command, True, bindings))
+        assert len(streamed) == vertex_count
+        assert streamed[0].vertex_properties['id_value'][0].value in range(vertex_count)
+
+    @pytest.mark.parametrize('vertex_count', _export_sizes)
+    def test_export_vertexes(self, benchmark_recorder, gremlin_stand_in, vertex_count):
+        """decoding alone, from a response body rendered once, so the stand in does not dominate the timings"""
+        gremlin_stand_in.reset()
+        _build_uncached_ogm(_build_driver(gremlin_stand_in)).graph_objects(*_generate_workload(vertex_count))
+        response_body = gremlin_stand_in.respond('g.V().hasLabel(vertex_label)', {'vertex_label': 'SyntheticVertex'})
+
+        def decode_and_flatten():
+            return [dict({x: y[0].value for x, y in vertex.vertex_properties.items()},
+                         internal_id=vertex.vertex_id, label=vertex.vertex_label)
+                    for vertex in TridentDecoder.loads(response_body)['result']['data']]
+
+        self._run(
+            benchmark_recorder, f'TridentDecoder, flattened[{vertex_count} vertexes]',
+            decode_and_flatten, 20, vertex_count)
+        self._run(
+            benchmark_recorder, f'TridentColumns.from_response[{vertex_count} vertexes]',
+            lambda: TridentColumns.from_response(response_body), 20, vertex_count,
+            f'TridentDecoder, flattened[{vertex_count} vertexes]', 1.25)
+        columns = TridentColumns.from_response(response_body)
+        assert columns.row_count == vertex_count
+        assert sorted(columns['id_value']) == list(range(vertex_count))
+        exported = _build_driver(gremlin_stand_in).export('g.V().hasLabel(vertex_label)', {'vertex_label': 'SyntheticVertex'})
+        assert exported.columns == columns.columns
@@ -59,5 +59,5 @@ def _generate_leech_event(event_name):
     event = _read_test_event(event_name)
     event_string = json.dumps(event)
     message_object = {'Message': event_string}
-    body_object = {'body': json.dumps(message_object)}
+    body_object = {'messageId': event_name, 'body': json.dumps(message_object)}
     return {'Records': [body_object]}
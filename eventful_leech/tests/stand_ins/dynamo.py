@@ -0,0 +1,357 @@
+import random
+import re
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+from botocore.exceptions import ClientError
+
+_max_write_size = 25
+_max_get_size = 100
+
+_condition_pattern = re.compile(
+    r'^\s*(?:(?P<function>attribute_not_exists|attribute_exists)\(\s*(?P<function_name>[#\w.]+)\s*\)|'
+    r'(?P<name>[#\w.]+)\s*(?P<operator>=|<>)\s*(?P<value>:\w+))\s*$')
+_assignment_pattern = re.compile(
+    r'\s*(?P<name>[#\w.]+)\s*=\s*(?:if_not_exists\(\s*(?P<existing>[#\w.]+)\s*,\s*(?P<default>:\w+)\s*\)|'
+    r'(?P<value>:\w+))\s*(?:,|$)')
+_key_condition_pattern = re.compile(
+    r'\s*(?:begins_with\(\s*(?P<prefix_name>[#\w.]+)\s*,\s*(?P<prefix>:\w+)\s*\)|'
+    r'(?P<between_name>[#\w.]+)\s+BETWEEN\s+(?P<low>:\w+)\s+AND\s+(?P<high>:\w+)|'
+    r'(?P<name>[#\w.]+)\s*(?P<operator><=|>=|=|<|>)\s*(?P<value>:\w+))\s*(?:AND\s+|$)')
+
+
+def _generate_error(operation_name, error_code, message):
+    return ClientError({'Error': {'Code': error_code, 'Message': message}}, operation_name)
+
+
+def _read_value(attribute_value):
+    """the comparable python value of a key attribute in the DynamoDB wire format"""
+    if 'S' in attribute_value:
+        return attribute_value['S']
+    if 'N' in attribute_value:
+        return Decimal(attribute_value['N'])
+    if 'B' in attribute_value:
+        return bytes(attribute_value['B'])
+    raise ValueError(f'key attributes must be S, N or B, not: {attribute_value}')
+
+
+class _Table:
+    def __init__(self, table_name, key_names, indexes):
+        self.table_name = table_name
+        self.key_names = key_names
+        self.indexes = indexes
+        self.items = {}
+
+    def generate_key(self, item, operation_name):
+        try:
+            return tuple(_read_value(item[x]) for x in self.key_names)
+        except KeyError:
+            raise _generate_error(
+                operation_name, 'ValidationException',
+                f'the provided key element does not match the schema of {self.table_name}: {self.key_names}')
+
+    def extract_key(self, item):
+        return {x: item[x] for x in self.key_names}
+
+
+class DynamoStandIn:
+    """An in memory stand in for the DynamoDB client, for tests and benchmarks
+
+        accepts and returns items in the DynamoDB wire format, as boto3.client('dynamodb') does, and understands
+        the subset of the API the leech uses, get_item, put_item, update_item, batch_get_item, batch_write_item, query,
+        conditions may be attribute_exists, attribute_not_exists, = or <>, joined by AND or OR,
+        updates may SET values directly or through if_not_exists, queries run against the table or any of its GSIs,
+        batch calls leave roughly throttle_rate of their entries unprocessed, as DynamoDB does when throttled,
+        every call is held for latency_seconds to simulate the network hop, calls may run concurrently
+
+    """
+    def __init__(self, latency_seconds: float = 0.0, throttle_rate: float = 0.0, page_size: int = 100,
+                 seed: int = 0):
+        """
+
+        Args:
+            latency_seconds: how long each call takes
+            throttle_rate: the chance of each entry in a batch call being returned as unprocessed
+            page_size: the most items a single query returns before handing back a LastEvaluatedKey
+            seed: seeds the throttling, so runs are repeatable
+        """
+        self._tables = {}
+        self._lock = threading.Lock()
+        self._latency_seconds = latency_seconds
+        self._throttle_rate = throttle_rate
+        self._page_size = page_size
+        self._random = random.Random(seed)
+        self._call_counts = Counter()
+
+    @classmethod
+    def for_leech(cls, index_table_name: str = 'Indexes', sensitive_table_name: str = 'Sensitives', **kwargs):
+        """a stand in holding the tables laid out in templates/dynamo_template.yaml"""
+        stand_in = cls(**kwargs)
+        stand_in.create_table(index_table_name, ['identifier_stem', 'sid_value'], {
+            'internal_id_index': ['internal_id', 'identifier_stem'],
+            'fungal_index': ['fungal_stem', 'numeric_id_value'],
+            'identifier_stem_index': ['identifier_stem', 'numeric_id_value']
+        })
+        stand_in.create_table(sensitive_table_name, ['insensitive'])
+        return stand_in
+
+    @property
+    def call_counts(self) -> Counter:
+        return self._call_counts
+
+    @property
+    def throttle_rate(self):
+        return self._throttle_rate
+
+    @throttle_rate.setter
+    def throttle_rate(self, throttle_rate):
+        self._throttle_rate = throttle_rate
+
+    def create_table(self, table_name: str, key_names: [str], indexes: dict = None):
+        """adds a table keyed by key_names, the hash key first, and the GSIs in indexes, as key_names by index_name"""
+        self._tables[table_name] = _Table(table_name, key_names, indexes or {})
+
+    def items(self, table_name: str) -> [dict]:
+        with self._lock:
+            return list(self._get_table(table_name, 'Scan').items.values())
+
+    def reset(self):
+        """empties every table and clears the call counts, the tables themselves remain"""
+        with self._lock:
+            for table in self._tables.values():
+                table.items.clear()
+            self._call_counts.clear()
+
+    def get_item(self, TableName, Key, ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        self._begin_call('GetItem')
+        with self._lock:
+            table = self._get_table(TableName, 'GetItem')
+            item = table.items.get(table.generate_key(Key, 'GetItem'))
+        if item is None:
+            return {}
+        return {'Item': self._project(item, ProjectionExpression, ExpressionAttributeNames)}
+
+    def put_item(self, TableName, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, **kwargs):
+        self._begin_call('PutItem')
+        with self._lock:
+            table = self._get_table(TableName, 'PutItem')
+            item_key = table.generate_key(Item, 'PutItem')
+            if ConditionExpression:
+                self._check_condition(
+                    table.items.get(item_key), ConditionExpression, ExpressionAttributeNames,
+                    ExpressionAttributeValues, 'PutItem')
+            table.items[item_key] = dict(Item)
+        return {}
+
+    def update_item(self, TableName, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE', **kwargs):
+        self._begin_call('UpdateItem')
+        if not UpdateExpression.lstrip().upper().startswith('SET '):
+            raise _generate_error('UpdateItem', 'ValidationException', f'only SET is supported: {UpdateExpression}')
+        assignments = UpdateExpression.lstrip()[4:]
+        values = ExpressionAttributeValues or {}
+        with self._lock:
+            table = self._get_table(TableName, 'UpdateItem')
+            item_key = table.generate_key(Key, 'UpdateItem')
+            existing = table.items.get(item_key)
+            if ConditionExpression:
+                self._check_condition(
+                    existing, ConditionExpression, ExpressionAttributeNames, values, 'UpdateItem')
+            item = dict(existing) if existing else dict(Key)
+            position = 0
+            while position < len(assignments):
+                match = _assignment_pattern.match(assignments, position)
+                if match is None or match.end() == position:
+                    raise _generate_error(
+                        'UpdateItem', 'ValidationException', f'could not parse update: {assignments[position:]}')
+                position = match.end()
+                attribute_name = self._resolve_name(match.group('name'), ExpressionAttributeNames)
+                if match.group('existing'):
+                    existing_name = self._resolve_name(match.group('existing'), ExpressionAttributeNames)
+                    item[attribute_name] = item.get(existing_name, values.get(match.group('default')))
+                    continue
+                item[attribute_name] = values[match.group('value')]
+            table.items[item_key] = item
+        if ReturnValues == 'ALL_NEW':
+            return {'Attributes': dict(item)}
+        return {}
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        self._begin_call('BatchWriteItem')
+        request_count = sum(len(x) for x in RequestItems.values())
+        if request_count > _max_write_size:
+            raise _generate_error(
+                'BatchWriteItem', 'ValidationException', f'too many items requested for BatchWriteItem: {request_count}')
+        unprocessed = {}
+        with self._lock:
+            for table_name, write_requests in RequestItems.items():
+                table = self._get_table(table_name, 'BatchWriteItem')
+                for write_request in write_requests:
+                    if self._is_throttled():
+                        unprocessed.setdefault(table_name, []).append(write_request)
+                        continue
+                    if 'PutRequest' in write_request:
+                        item = write_request['PutRequest']['Item']
+                        table.items[table.generate_key(item, 'BatchWriteItem')] = dict(item)
+                        continue
+                    table.items.pop(table.generate_key(write_request['DeleteRequest']['Key'], 'BatchWriteItem'), None)
+        return {'UnprocessedItems': unprocessed}
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        self._begin_call('BatchGetItem')
+        request_count = sum(len(x['Keys']) for x in RequestItems.values())
+        if request_count > _max_get_size:
+            raise _generate_error(
+                'BatchGetItem', 'ValidationException', f'too many items requested for BatchGetItem: {request_count}')
+        responses = {}
+        unprocessed = {}
+        with self._lock:
+            for table_name, table_request in RequestItems.items():
+                table = self._get_table(table_name, 'BatchGetItem')
+                found = responses.setdefault(table_name, [])
+                for key in table_request['Keys']:
+                    if self._is_throttled():
+                        unprocessed_request = unprocessed.setdefault(
+                            table_name, dict(table_request, Keys=[]))
+                        unprocessed_request['Keys'].append(key)
+                        continue
+                    item = table.items.get(table.generate_key(key, 'BatchGetItem'))
+                    if item is not None:
+                        found.append(self._project(
+                            item, table_request.get('ProjectionExpression'),
+                            table_request.get('ExpressionAttributeNames')))
+        return {'Responses': responses, 'UnprocessedKeys': unprocessed}
+
+    def query(self, TableName, KeyConditionExpression, ExpressionAttributeValues, IndexName=None,
+              ExpressionAttributeNames=None, ExclusiveStartKey=None, Limit=None, ScanIndexForward=True, **kwargs):
+        self._begin_call('Query')
+        with self._lock:
+            table = self._get_table(TableName, 'Query')
+            key_names = table.key_names
+            if IndexName:
+                try:
+                    key_names = table.indexes[IndexName]
+                except KeyError:
+                    raise _generate_error(
+                        'Query', 'ValidationException', f'{TableName} has no index named {IndexName}')
+            conditions = self._parse_key_conditions(KeyConditionExpression, ExpressionAttributeNames)
+            hash_conditions = [x for x in conditions if x[0] == key_names[0]]
+            if len(hash_conditions) != 1 or hash_conditions[0][1] != '=':
+                raise _generate_error(
+                    'Query', 'ValidationException', f'query must test the hash key {key_names[0]} for equality')
+            matched = [x for x in table.items.values()
+                       if all(y in x for y in key_names)
+                       and all(self._test_key(x[y[0]], y[1], y[2:], ExpressionAttributeValues) for y in conditions)]
+        if len(key_names) > 1:
+            matched.sort(key=lambda x: _read_value(x[key_names[1]]), reverse=not ScanIndexForward)
+        if ExclusiveStartKey:
+            start_key = table.generate_key(ExclusiveStartKey, 'Query')
+            for position, item in enumerate(matched):
+                if table.generate_key(item, 'Query') == start_key:
+                    matched = matched[position + 1:]
+                    break
+        page_size = min(Limit, self._page_size) if Limit else self._page_size
+        response = {'Items': [dict(x) for x in matched[:page_size]], 'Count': min(len(matched), page_size)}
+        if len(matched) > page_size:
+            last_item = matched[page_size - 1]
+            last_key = table.extract_key(last_item)
+            last_key.update({x: last_item[x] for x in key_names})
+            response['LastEvaluatedKey'] = last_key
+        return response
+
+    def _begin_call(self, operation_name):
+        with self._lock:
+            self._call_counts[operation_name] += 1
+        if self._latency_seconds:
+            time.sleep(self._latency_seconds)
+
+    def _get_table(self, table_name, operation_name) -> _Table:
+        try:
+            return self._tables[table_name]
+        except KeyError:
+            raise _generate_error(
+                operation_name, 'ResourceNotFoundException', f'requested resource not found: {table_name}')
+
+    def _is_throttled(self):
+        return self._throttle_rate > 0 and self._random.random() < self._throttle_rate
+
+    @staticmethod
+    def _resolve_name(attribute_name, attribute_names):
+        if attribute_name.startswith('#'):
+            return attribute_names[attribute_name]
+        return attribute_name
+
+    @classmethod
+    def _project(cls, item, projection_expression, attribute_names):
+        if not projection_expression:
+            return dict(item)
+        projected_names = [cls._resolve_name(x.strip(), attribute_names) for x in projection_expression.split(',')]
+        return {x: item[x] for x in projected_names if x in item}
+
+    @classmethod
+    def _check_condition(cls, item, condition_expression, attribute_names, attribute_values, operation_name):
+        """raises a ConditionalCheckFailedException unless the condition holds for the item, None if it is absent"""
+        item = item or {}
+        attribute_values = attribute_values or {}
+        for alternative in re.split(r'\s+OR\s+', condition_expression.strip()):
+            if all(cls._test_condition(item, x, attribute_names, attribute_values, operation_name)
+                   for x in re.split(r'\s+AND\s+', alternative)):
+                return
+        raise _generate_error(operation_name, 'ConditionalCheckFailedException', 'The conditional request failed')
+
+    @classmethod
+    def _test_condition(cls, item, condition, attribute_names, attribute_values, operation_name):
+        match = _condition_pattern.match(condition)
+        if match is None:
+            raise _generate_error(operation_name, 'ValidationException', f'unsupported condition: {condition}')
+        if match.group('function'):
+            is_present = cls._resolve_name(match.group('function_name'), attribute_names) in item
+            return is_present if match.group('function') == 'attribute_exists' else not is_present
+        present_value = item.get(cls._resolve_name(match.group('name'), attribute_names))
+        is_equal = present_value == attribute_values[match.group('value')]
+        return is_equal if match.group('operator') == '=' else not is_equal
+
+    @classmethod
+    def _parse_key_conditions(cls, key_condition_expression, attribute_names):
+        """splits a KeyConditionExpression into (attribute_name, operator, value_name, ...) tuples"""
+        conditions = []
+        position = 0
+        while position < len(key_condition_expression):
+            match = _key_condition_pattern.match(key_condition_expression, position)
+            if match is None or match.end() == position:
+                raise _generate_error(
+                    'Query', 'ValidationException',
+                    f'could not parse key condition: {key_condition_expression[position:]}')
+            position = match.end()
+            if match.group('prefix_name'):
+                conditions.append(
+                    (cls._resolve_name(match.group('prefix_name'), attribute_names), 'begins_with', match.group('prefix')))
+                continue
+            if match.group('between_name'):
+                conditions.append((cls._resolve_name(match.group('between_name'), attribute_names), 'BETWEEN',
+                                   match.group('low'), match.group('high')))
+                continue
+            conditions.append(
+                (cls._resolve_name(match.group('name'), attribute_names), match.group('operator'), match.group('value')))
+        return conditions
+
+    @staticmethod
+    def _test_key(attribute_value, operator, value_names, attribute_values):
+        value = _read_value(attribute_value)
+        compared = [_read_value(attribute_values[x]) for x in value_names]
+        if operator == '=':
+            return value == compared[0]
+        if operator == 'begins_with':
+            return value.startswith(compared[0])
+        if operator == 'BETWEEN':
+            return compared[0] <= value <= compared[1]
+        if operator == '<':
+            return value < compared[0]
+        if operator == '<=':
+            return value <= compared[0]
+        if operator == '>':
+            return value > compared[0]
+        return value >= compared[0]
@@ -0,0 +1,563 @@
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+_token_pattern = re.compile(r"""
+    \s*(?:
+        (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")|
+        (?P<number>-?\d+(?:\.\d+)?)|
+        (?P<name>[A-Za-z_][A-Za-z0-9_]*)|
+        (?P<symbol>[().,;])
+    )""", re.VERBOSE)
+
+_reserved_names = {'id', 'label', 'single', 'list', 'set', 'true', 'false', 'null'}
+
+
+class GremlinStandInError(Exception):
+    pass
+
+
+class _Token:
+    def __init__(self, kind, value):
+        self.kind = kind
+        self.value = value
+
+
+class _Step:
+    def __init__(self, step_name, args):
+        self.step_name = step_name
+        self.args = args
+
+
+class _Traversal:
+    def __init__(self, source, steps):
+        self.source = source
+        self.steps = steps
+
+
+class _Literal:
+    def __init__(self, value):
+        self.value = value
+
+
+class _Binding:
+    def __init__(self, binding_name):
+        self.binding_name = binding_name
+
+
+class _Keyword:
+    def __init__(self, keyword):
+        self.keyword = keyword
+
+
+def _tokenize(script):
+    tokens = []
+    position = 0
+    script = script.rstrip()
+    while position < len(script):
+        match = _token_pattern.match(script, position)
+        if match is None or match.end() == position:
+            raise GremlinStandInError(f'could not parse script at: {script[position:position + 32]}')
+        position = match.end()
+        kind = match.lastgroup
+        tokens.append(_Token(kind, match.group(kind)))
+    return tokens
+
+
+class _Parser:
+    """Parses the subset of gremlin-groovy the templates produce into statements of steps"""
+    def __init__(self, script):
+        self._tokens = _tokenize(script)
+        self._position = 0
+
+    def parse(self):
+        statements = []
+        while self._peek() is not None:
+            if self._peek_symbol(';'):
+                self._position += 1
+                continue
+            statements.append(self._parse_traversal())
+        return statements
+
+    def _peek(self):
+        if self._position < len(self._tokens):
+            return self._tokens[self._position]
+        return None
+
+    def _peek_symbol(self, symbol):
+        token = self._peek()
+        return token is not None and token.kind == 'symbol' and token.value == symbol
+
+    def _expect_symbol(self, symbol):
+        if not self._peek_symbol(symbol):
+            token = self._peek()
+            raise GremlinStandInError(f'expected {symbol}, found {token.value if token else "the end of the script"}')
+        self._position += 1
+
+    def _next_name(self):
+        token = self._peek()
+        if token is None or token.kind != 'name':
+            raise GremlinStandInError(f'expected a step name, found {token.value if token else "the end of the script"}')
+        self._position += 1
+        return token.value
+
+    def _parse_traversal(self):
+        source = None
+        steps = []
+        first_name = self._next_name()
+        if first_name in ('g', '__'):
+            source = first_name
+        else:
+            steps.append(self._parse_step_args(first_name))
+        while self._peek_symbol('.'):
+            self._position += 1
+            steps.append(self._parse_step_args(self._next_name()))
+        return _Traversal(source, steps)
+
+    def _parse_step_args(self, step_name):
+        self._expect_symbol('(')
+        args = []
+        while not self._peek_symbol(')'):
+            args.append(self._parse_arg())
+            if self._peek_symbol(','):
+                self._position += 1
+        self._expect_symbol(')')
+        return _Step(step_name, args)
+
+    def _parse_arg(self):
+        token = self._peek()
+        if token is None:
+            raise GremlinStandInError('script ended inside the arguments of a step')
+        if token.kind == 'string':
+            self._position += 1
+            return _Literal(re.sub(r'\\(.)', r'\1', token.value[1:-1]))
+        if token.kind == 'number':
+            self._position += 1
+            return _Literal(float(token.value) if '.' in token.value else int(token.value))
+        if token.kind != 'name':
+            raise GremlinStandInError(f'unexpected {token.value} in the arguments of a step')
+        following = self._tokens[self._position + 1] if self._position + 1 < len(self._tokens) else None
+        if token.value == '__' or (following is not None and following.value == '('):
+            return self._parse_traversal()
+        self._position += 1
+        if token.value in ('true', 'false'):
+            return _Literal(token.value == 'true')
+        if token.value == 'null':
+            return _Literal(None)
+        if token.value in _reserved_names:
+            return _Keyword(token.value)
+        return _Binding(token.value)
+
+
+class _Element:
+    def __init__(self, element_id, label):
+        self.element_id = element_id
+        self.label = label
+        self.properties = {}
+
+
+class _Vertex(_Element):
+    pass
+
+
+class _Edge(_Element):
+    def __init__(self, element_id, label):
+        super().__init__(element_id, label)
+        self.from_vertex = None
+        self.to_vertex = None
+
+
+class _Graph:
+    def __init__(self):
+        self.vertexes = {}
+        self.edges = {}
+
+    def rekey(self, element, element_id):
+        store = self.edges if isinstance(element, _Edge) else self.vertexes
+        if element_id in store and store[element_id] is not element:
+            raise GremlinStandInError(f'an element with id {element_id} already exists')
+        store.pop(element.element_id, None)
+        element.element_id = element_id
+        store[element_id] = element
+
+    def drop(self, element):
+        if isinstance(element, _Edge):
+            self.edges.pop(element.element_id, None)
+            return
+        self.vertexes.pop(element.element_id, None)
+        for edge in [x for x in self.edges.values() if element in (x.from_vertex, x.to_vertex)]:
+            self.edges.pop(edge.element_id, None)
+
+
+class _Interpreter:
+    """Runs parsed traversals against a graph, each traverser is a vertex, an edge, or a plain value"""
+    def __init__(self, graph: _Graph, bindings: dict):
+        self._graph = graph
+        self._bindings = bindings
+
+    def run(self, statements):
+        results = []
+        for statement in statements:
+            results = self._run_traversal(statement, [])
+        return results
+
+    def _run_traversal(self, traversal: _Traversal, traversers):
+        if traversal.source == 'g':
+            traversers = []
+        for step in traversal.steps:
+            step_fn = getattr(self, f'_step_{step.step_name}', None)
+            if step_fn is None:
+                raise GremlinStandInError(f'the stand in does not support the {step.step_name} step')
+            traversers = step_fn(traversers, *step.args)
+        return traversers
+
+    def _resolve(self, arg):
+        if isinstance(arg, _Literal):
+            return arg.value
+        if isinstance(arg, _Keyword):
+            return arg.keyword
+        if isinstance(arg, _Binding):
+            try:
+                return self._bindings[arg.binding_name]
+            except KeyError:
+                raise GremlinStandInError(f'no such property: {arg.binding_name}')
+        raise GremlinStandInError('a traversal can not be used as a value here')
+
+    def _resolve_all(self, args):
+        values = []
+        for arg in args:
+            value = self._resolve(arg)
+            values.extend(value if isinstance(value, list) else [value])
+        return values
+
+    def _step_V(self, traversers, *args):
+        vertex_ids = self._resolve_all(args)
+        if not vertex_ids:
+            return list(self._graph.vertexes.values())
+        return [self._graph.vertexes[x] for x in vertex_ids if x in self._graph.vertexes]
+
+    def _step_E(self, traversers, *args):
+        edge_ids = self._resolve_all(args)
+        if not edge_ids:
+            return list(self._graph.edges.values())
+        return [self._graph.edges[x] for x in edge_ids if x in self._graph.edges]
+
+    def _step_addV(self, traversers, label=None):
+        vertex = _Vertex(str(uuid.uuid4()), 'vertex' if label is None else self._resolve(label))
+        self._graph.vertexes[vertex.element_id] = vertex
+        return [vertex]
+
+    def _step_addE(self, traversers, label):
+        edge = _Edge(str(uuid.uuid4()), self._resolve(label))
+        if traversers and isinstance(traversers[0], _Vertex):
+            edge.from_vertex = traversers[0]
+        self._graph.edges[edge.element_id] = edge
+        return [edge]
+
+    def _step_from(self, traversers, vertex_traversal):
+        return self._set_edge_end(traversers, vertex_traversal, 'from_vertex')
+
+    def _step_to(self, traversers, vertex_traversal):
+        return self._set_edge_end(traversers, vertex_traversal, 'to_vertex')
+
+    def _set_edge_end(self, traversers, vertex_traversal, end_name):
+        for edge in traversers:
+            found = self._run_traversal(vertex_traversal, [edge])
+            if not found:
+                self._graph.drop(edge)
+                raise GremlinStandInError(f'could not find the vertex for the {end_name} of edge {edge.element_id}')
+            setattr(edge, end_name, found[0])
+        return traversers
+
+    def _step_property(self, traversers, *args):
+        values = [self._resolve(x) for x in args]
+        cardinality = None
+        if len(values) == 3:
+            cardinality, property_name, property_value = values
+        else:
+            property_name, property_value = values
+        for element in traversers:
+            if property_name == 'id':
+                self._graph.rekey(element, property_value)
+                continue
+            if isinstance(element, _Edge) or cardinality == 'single':
+                element.properties[property_name] = [property_value]
+                continue
+            existing = element.properties.setdefault(property_name, [])
+            if property_value not in existing:
+                existing.append(property_value)
+        return traversers
+
+    def _step_fold(self, traversers):
+        return [list(traversers)]
+
+    def _step_unfold(self, traversers):
+        unfolded = []
+        for traverser in traversers:
+            if isinstance(traverser, list):
+                unfolded.extend(traverser)
+                continue
+            unfolded.append(traverser)
+        return unfolded
+
+    def _step_coalesce(self, traversers, *options):
+        coalesced = []
+        for traverser in traversers:
+            for option in options:
+                found = self._run_traversal(option, [traverser])
+                if found:
+                    coalesced.extend(found)
+                    break
+        return coalesced
+
+    def _step_id(self, traversers):
+        return [x.element_id for x in traversers]
+
+    def _step_label(self, traversers):
+        return [x.label for x in traversers]
+
+    def _step_values(self, traversers, *args):
+        property_names = self._resolve_all(args)
+        values = []
+        for element in traversers:
+            for property_name, property_values in element.properties.items():
+                if not property_names or property_name in property_names:
+                    values.extend(property_values)
+        return values
+
+    def _step_valueMap(self, traversers, *args):
+        property_names = self._resolve_all(args)
+        return [{x: list(y) for x, y in element.properties.items() if not property_names or x in property_names}
+                for element in traversers]
+
+    def _step_hasLabel(self, traversers, *args):
+        labels = self._resolve_all(args)
+        return [x for x in traversers if x.label in labels]
+
+    def _step_hasId(self, traversers, *args):
+        element_ids = self._resolve_all(args)
+        return [x for x in traversers if x.element_id in element_ids]
+
+    def _step_has(self, traversers, *args):
+        values = [self._resolve(x) for x in args]
+        if len(values) == 1:
+            return [x for x in traversers if values[0] in x.properties]
+        if len(values) == 3:
+            traversers = [x for x in traversers if x.label == values[0]]
+        property_name, property_value = values[-2:]
+        if property_name == 'id':
+            return [x for x in traversers if x.element_id == property_value]
+        return [x for x in traversers if property_value in x.properties.get(property_name, [])]
+
+    def _step_out(self, traversers, *args):
+        return [x.to_vertex for x in self._step_outE(traversers, *args)]
+
+    def _step_in(self, traversers, *args):
+        return [x.from_vertex for x in self._step_inE(traversers, *args)]
+
+    def _step_both(self, traversers, *args):
+        return self._step_out(traversers, *args) + self._step_in(traversers, *args)
+
+    def _step_outE(self, traversers, *args):
+        return self._find_edges(traversers, args, 'from_vertex')
+
+    def _step_inE(self, traversers, *args):
+        return self._find_edges(traversers, args, 'to_vertex')
+
+    def _step_bothE(self, traversers, *args):
+        return self._step_outE(traversers, *args) + self._step_inE(traversers, *args)
+
+    def _find_edges(self, traversers, args, end_name):
+        labels = self._resolve_all(args)
+        found = []
+        for vertex in traversers:
+            found.extend(x for x in self._graph.edges.values()
+                         if getattr(x, end_name) is vertex and (not labels or x.label in labels))
+        return found
+
+    def _step_outV(self, traversers):
+        return [x.from_vertex for x in traversers]
+
+    def _step_inV(self, traversers):
+        return [x.to_vertex for x in traversers]
+
+    def _step_count(self, traversers):
+        return [len(traversers)]
+
+    def _step_limit(self, traversers, limit):
+        return traversers[:self._resolve(limit)]
+
+    def _step_dedup(self, traversers):
+        deduped = []
+        for traverser in traversers:
+            if not any(x is traverser or x == traverser for x in deduped):
+                deduped.append(traverser)
+        return deduped
+
+    def _step_drop(self, traversers):
+        for element in traversers:
+            self._graph.drop(element)
+        return []
+
+    def _step_toList(self, traversers):
+        return traversers
+
+    def _step_iterate(self, traversers):
+        return []
+
+    def _step_next(self, traversers):
+        return traversers[:1]
+
+
+def _to_graphson(value):
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, int):
+        return {'@type': 'g:Int64', '@value': value}
+    if isinstance(value, float):
+        return {'@type': 'g:Double', '@value': value}
+    if isinstance(value, list):
+        return {'@type': 'g:List', '@value': [_to_graphson(x) for x in value]}
+    if isinstance(value, dict):
+        flattened = []
+        for key, entry in value.items():
+            flattened.extend([_to_graphson(key), _to_graphson(entry)])
+        return {'@type': 'g:Map', '@value': flattened}
+    if isinstance(value, _Edge):
+        return {'@type': 'g:Edge', '@value': {
+            'id': value.element_id, 'label': value.label,
+            'inV': value.to_vertex.element_id, 'inVLabel': value.to_vertex.label,
+            'outV': value.from_vertex.element_id, 'outVLabel': value.from_vertex.label
+        }}
+    if isinstance(value, _Vertex):
+        vertex_properties = {}
+        for property_name, property_values in value.properties.items():
+            vertex_properties[property_name] = [{'@type': 'g:VertexProperty', '@value': {
+                'id': f'{value.element_id}_{property_name}_{i}', 'label': property_name, 'value': _to_graphson(x)
+            }} for i, x in enumerate(property_values)]
+        return {'@type': 'g:Vertex', '@value': {
+            'id': value.element_id, 'label': value.label, 'properties': vertex_properties
+        }}
+    return str(value)
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class GremlinStandIn:
+    """An in process stand in for the /gremlin/ HTTP endpoint of Neptune, for tests and benchmarks
+
+        understands the subset of gremlin the Trident templates and simple traversals use,
+        i.e. V, E, addV, addE, property, fold, unfold, coalesce, has, out, in, values, count,
+        scripts may hold several statements joined by ;, with the results of the last one returned,
+        responses are GraphSON v3, every request is held for latency_seconds to simulate the network hop,
+        scripts are run one at a time, much as a single writer instance would
+
+    """
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency_seconds: float = 0.0):
+        self._graph = _Graph()
+        self._graph_lock = threading.Lock()
+        self._latency_seconds = latency_seconds
+        self._parsed = {}
+        self._request_count = 0
+        self._server = _ThreadingHTTPServer((host, port), self._build_handler())
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    @property
+    def host(self):
+        return self._server.server_address[0]
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    @property
+    def vertexes(self):
+        return self._graph.vertexes
+
+    @property
+    def edges(self):
+        return self._graph.edges
+
+    @property
+    def request_count(self):
+        return self._request_count
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self):
+        with self._graph_lock:
+            self._graph = _Graph()
+            self._request_count = 0
+
+    def submit(self, script: str, bindings: dict = None):
+        """runs a script directly against the stand in graph, returning the undecoded results of its last statement"""
+        statements = self._parsed.get(script)
+        if statements is None:
+            statements = _Parser(script).parse()
+            self._parsed[script] = statements
+        with self._graph_lock:
+            self._request_count += 1
+            return _Interpreter(self._graph, bindings or {}).run(statements)
+
+    def respond(self, script: str, bindings: dict = None) -> bytes:
+        """runs a script directly against the stand in graph, returning the GraphSON v3 response body"""
+        results = self.submit(script, bindings)
+        return json.dumps({
+            'requestId': str(uuid.uuid4()),
+            'status': {'message': '', 'code': 200, 'attributes': {'@type': 'g:Map', '@value': []}},
+            'result': {'data': _to_graphson(results), 'meta': {'@type': 'g:Map', '@value': []}}
+        }).encode('utf-8')
+
+    def _build_handler(self):
+        stand_in = self
+
+        class GremlinHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                request_body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if stand_in._latency_seconds:
+                    time.sleep(stand_in._latency_seconds)
+                if self.path.rstrip('/') != '/gremlin':
+                    error = {'code': 'MalformedQueryException', 'detailedMessage': f'no route {self.path}'}
+                    self._respond(404, json.dumps(error).encode('utf-8'))
+                    return
+                try:
+                    request = json.loads(request_body)
+                    response_bytes = stand_in.respond(request['gremlin'], request.get('bindings'))
+                except (GremlinStandInError, KeyError, ValueError) as e:
+                    error = {'code': 'MalformedQueryException', 'detailedMessage': str(e)}
+                    self._respond(500, json.dumps(error).encode('utf-8'))
+                    return
+                self._respond(200, response_bytes)
+
+            def _respond(self, status_code, response_bytes):
+                self.send_response(status_code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(response_bytes)))
+                self.end_headers()
+                self.wfile.write(response_bytes)
+
+            def log_message(self, format, *args):
+                pass
+
+        return GremlinHandler
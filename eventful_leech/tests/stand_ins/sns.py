@@ -0,0 +1,42 @@
+import threading
+import uuid
+from collections import Counter, defaultdict
+
+
+class SnsStandIn:
+    """An in memory stand in for the SNS client, recording the messages published to each topic
+
+        a message whose body contains one of the rejected_fragments is failed as the sender's fault
+
+    """
+    def __init__(self, rejected_fragments: [str] = ()):
+        self._rejected_fragments = list(rejected_fragments)
+        self._published = defaultdict(list)
+        self._call_counts = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def call_counts(self) -> Counter:
+        return self._call_counts
+
+    def published(self, topic_arn: str) -> [str]:
+        with self._lock:
+            return list(self._published[topic_arn])
+
+    def publish(self, TopicArn, Message, Subject=None, **kwargs):
+        with self._lock:
+            self._call_counts['Publish'] += 1
+            self._published[TopicArn].append(Message)
+        return {'MessageId': str(uuid.uuid4())}
+
+    def publish_batch(self, TopicArn, PublishBatchRequestEntries, **kwargs):
+        response = {'Successful': [], 'Failed': []}
+        with self._lock:
+            self._call_counts['PublishBatch'] += 1
+            for entry in PublishBatchRequestEntries:
+                if any(x in entry['Message'] for x in self._rejected_fragments):
+                    response['Failed'].append({'Id': entry['Id'], 'Code': 'InvalidParameter', 'SenderFault': True})
+                    continue
+                self._published[TopicArn].append(entry['Message'])
+                response['Successful'].append({'Id': entry['Id'], 'MessageId': str(uuid.uuid4())})
+        return response
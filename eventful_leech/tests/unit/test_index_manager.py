@@ -0,0 +1,22 @@
+from src.algernon import DynamoBatcher
+from src.toll_booth import PotentialVertex, IdentifierStem
+from src.toll_booth.obj.index_manager import IndexManager, IndexPlan
+
+from tests.stand_ins.dynamo import DynamoStandIn
+
+
+def _generate_vertex(id_value):
+    identifier_stem = IdentifierStem('vertex', 'ExternalId', {'id_source': 'Algernon'})
+    object_properties = {'id_source': 'Algernon', 'id_value': id_value}
+    return PotentialVertex('ExternalId', f'internal_{id_value}', object_properties, identifier_stem, id_value, 'id_value')
+
+
+class TestIndexManager:
+    def test_stem_lookups_find_non_numeric_id_values(self):
+        dynamo_stand_in = DynamoStandIn.for_leech()
+        index_plans = {'ExternalId': IndexPlan('ExternalId', [], [], ['id_source'], 'id_value')}
+        index_manager = IndexManager(index_plans, 'Indexes', DynamoBatcher(dynamo_stand_in))
+        index_manager.index_objects(_generate_vertex(1001), _generate_vertex('MBI-1002'))
+        found = index_manager.find_potential_vertexes('ExternalId', {'id_source': 'Algernon'})
+        assert sorted(str(x.internal_id) for x in found) == ['internal_1001', 'internal_MBI-1002']
+        assert dynamo_stand_in.call_counts['Query'] == 1
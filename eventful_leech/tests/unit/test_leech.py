@@ -0,0 +1,123 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from src.algernon import Bullhorn, queued
+from src.toll_booth import PotentialVertex, IdentifierStem, Schema
+from src.toll_booth import Ogm, ObjectRegulator, RuleArbiter, EdgeRegulator
+from src.toll_booth.obj.index_manager import IndexManager
+
+from tests.stand_ins.sns import SnsStandIn
+
+
+@pytest.fixture
+def sns_stand_in():
+    return SnsStandIn()
+
+
+@pytest.fixture
+def announcer(monkeypatch, sns_stand_in):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('LEECH_LISTENER_ARN', 'leech_listener_arn')
+    monkeypatch.setenv('VPC_LEECH_LISTENER_ARN', 'vpc_leech_listener_arn')
+    from src.toll_booth import Announcer
+    monkeypatch.setattr(Announcer, '_bullhorn', Bullhorn(sns_stand_in))
+    return Announcer
+
+
+class _IndexStandIn:
+    def __init__(self):
+        self.indexed = []
+
+    def find_potential_vertexes(self, object_type, object_properties):
+        return []
+
+    def index_objects(self, *graph_objects):
+        self.indexed.append([x for x in graph_objects if x is not None])
+        return []
+
+
+def _generate_vertex_data(object_type, id_value):
+    identifier_stem = IdentifierStem('vertex', object_type, {'id_source': 'Algernon'})
+    return {'object_type': object_type, 'internal_id': f'{object_type}_{id_value}',
+            'object_properties': {'id_source': 'Algernon', 'id_value': id_value},
+            'identifier_stem': identifier_stem, 'id_value': id_value, 'id_value_field': 'id_value'}
+
+
+@pytest.fixture
+def stubbed_source(monkeypatch, announcer):
+    """a source whose regulators, rules, index and graph are stubbed, recording what each task sends and writes"""
+    stubbed = SimpleNamespace(sent=[], graphed=[], index=_IndexStandIn())
+    monkeypatch.setattr(
+        announcer, '_send_message', classmethod(lambda cls, message, is_vpc=False: stubbed.sent.append(message)))
+    monkeypatch.setattr(IndexManager, 'from_graph_schema', classmethod(lambda cls, schema: stubbed.index))
+    monkeypatch.setattr(Ogm, '__init__', lambda self, schema: None)
+    monkeypatch.setattr(
+        Ogm, 'graph_objects', lambda self, *graph_objects: stubbed.graphed.extend(x for x in graph_objects if x))
+    monkeypatch.setattr(ObjectRegulator, '__init__', lambda self, schema_entry: None)
+    monkeypatch.setattr(ObjectRegulator, 'create_potential_vertex_data',
+                        lambda self, object_data, *args: _generate_vertex_data('Patient', object_data['id_value']))
+    monkeypatch.setattr(RuleArbiter, '__init__', lambda self, source_vertex, schema, schema_entry: None)
+    monkeypatch.setattr(RuleArbiter, 'process_rules', lambda self, extracted_data: [
+        (PotentialVertex(**_generate_vertex_data('Provider', x)), SimpleNamespace(is_stub=True, inbound=False))
+        for x in extracted_data['providers']])
+    monkeypatch.setattr(EdgeRegulator, '__init__', lambda self, schema_entry: None)
+    monkeypatch.setattr(EdgeRegulator, 'generate_potential_edge_data', lambda self, source, other, data, inbound: {
+        'object_type': '_received_care_from', 'internal_id': f'edge_{source.internal_id}_{other.internal_id}',
+        'object_properties': {}, 'from_object': source.internal_id, 'to_object': other.internal_id})
+    return stubbed
+
+
+def _generate_record(record_name):
+    return {'messageId': record_name, 'body': json.dumps({'Message': json.dumps({'record_name': record_name})})}
+
+
+class TestAnnouncer:
+    def test_concurrent_records_hold_their_own_messages(self, announcer, sns_stand_in, monkeypatch):
+        monkeypatch.setenv('QUEUED_CONCURRENCY', '2')
+        both_sent = threading.Barrier(2, timeout=5)
+
+        @queued
+        def announce(event, context):
+            with announcer.holding_messages():
+                announcer._send_message({'record_name': event['record_name']})
+                both_sent.wait()
+                if event['record_name'] == 'failing':
+                    raise RuntimeError('the failing record failed')
+            return event['record_name']
+
+        results = announce({'Records': [_generate_record('failing'), _generate_record('succeeding')]}, None)
+        assert results['batchItemFailures'] == [{'itemIdentifier': 'failing'}]
+        assert results['results'] == [None, 'succeeding']
+        published = [json.loads(x) for x in sns_stand_in.published('leech_listener_arn')]
+        assert published == [{'record_name': 'succeeding'}]
+        assert sns_stand_in.call_counts['Publish'] == 0
+
+
+def _graphed_keys(graph_objects):
+    return {(x.is_edge, x.internal_id) for x in graph_objects}
+
+
+class TestFusedLeech:
+    def test_fused_matches_the_unfused_chain(self, stubbed_source):
+        from src.toll_booth import LeechTasks
+
+        schema = Schema()
+        extracted_data = {'source': {'id_value': 1001}, 'providers': [2001, 2002]}
+        source_vertex = LeechTasks._generate_source_vertex(schema, None, extracted_data)
+        while stubbed_source.sent:
+            message = stubbed_source.sent.pop(0)
+            getattr(LeechTasks, f'_{message["task_name"]}')(**message['task_kwargs'])
+        unfused_graphed = _graphed_keys(stubbed_source.graphed)
+        unfused_indexed = _graphed_keys(x for indexed in stubbed_source.index.indexed for x in indexed)
+
+        stubbed_source.index.indexed.clear()
+        fused_vertex = LeechTasks._fused_leech(schema, None, extracted_data)
+        assert fused_vertex.internal_id == source_vertex.internal_id
+        assert len(stubbed_source.index.indexed) == 1
+        assert _graphed_keys(stubbed_source.index.indexed[0]) == unfused_indexed
+        assert [x['task_name'] for x in stubbed_source.sent] == ['graph_objects']
+        assert _graphed_keys(stubbed_source.sent[0]['task_kwargs']['graph_objects']) == unfused_graphed
+        assert {'Patient_1001', 'Provider_2001', 'Provider_2002'} < {x[1] for x in unfused_graphed}
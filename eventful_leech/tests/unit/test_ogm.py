@@ -0,0 +1,105 @@
+from decimal import Decimal
+
+import pytest
+
+from src.algernon import TridentDriver, TridentDecoder, TridentRouter, TridentWriteLedger, TridentBatchException
+from src.toll_booth import PotentialVertex, PotentialEdge, IdentifierStem, Schema
+from src.toll_booth import Ogm, GraphedObjectCache
+
+from tests.stand_ins.gremlin import GremlinStandIn
+
+
+class _StandInNotary:
+    """sends each chunk straight to the stand in graph, failing the chunks which upsert any of the failing ids
+
+        a failing id fails as many attempts as failure_count, then succeeds
+    """
+    def __init__(self, stand_in: GremlinStandIn, failing_ids=(), failure_count=1):
+        self.sent = []
+        self._stand_in = stand_in
+        self._failures = {x: failure_count for x in failing_ids}
+
+    def send(self, command, bindings=None):
+        self.sent.append((command, bindings))
+        failing = [x for x in (bindings or {}).values() if self._failures.get(x)]
+        for failing_id in failing:
+            self._failures[failing_id] -= 1
+        if failing:
+            raise RuntimeError(f'could not upsert {failing}')
+        return TridentDecoder.loads(self._stand_in.respond(command, bindings))['result']['data']
+
+
+@pytest.fixture
+def gremlin_stand_in():
+    with GremlinStandIn() as stand_in:
+        yield stand_in
+
+
+def _build_ogm(notary, batch_size=50):
+    router = TridentRouter(TridentWriteLedger(window_seconds=0))
+    driver = TridentDriver(read_notary=notary, write_notary=notary, router=router, batch_size=batch_size,
+                           batch_workers=1)
+    return Ogm(Schema(), driver, GraphedObjectCache(ttl_seconds=0, table_name=''))
+
+
+def _generate_vertex(vertex_number, **object_properties):
+    object_properties['id_value'] = vertex_number
+    identifier_stem = IdentifierStem('vertex', 'Patient', {'id_source': 'Algernon'})
+    return PotentialVertex(
+        'Patient', f'internal_{vertex_number}', object_properties, identifier_stem, vertex_number, 'id_value')
+
+
+def _generate_edge(from_number, to_number):
+    return PotentialEdge(
+        '_follows', f'edge_{from_number}_{to_number}', {'rank': Decimal('1.5')},
+        f'internal_{from_number}', f'internal_{to_number}')
+
+
+def _find_sent_vertex_ids(notary):
+    return [y for _, bindings in notary.sent for x, y in bindings.items() if x.endswith('vertex_id')]
+
+
+class TestOgm:
+    def test_compiled_upserts(self):
+        vertex = _generate_vertex(1001, first_name='Ada', visit_count=Decimal('3'), middle_name='', suffix=None)
+        template, binding_values = Ogm._compile_vertex(vertex)
+        assert template.template_name == 'upsert_vertex_4'
+        assert 'g.V(vertex_id).fold().coalesce(unfold(), addV(vertex_label).property(id, vertex_id))' in \
+            template.render(**binding_values)[0]
+        assert binding_values['vertex_id'] == 'internal_1001'
+        assert binding_values['vertex_label'] == 'Patient'
+        compiled_properties = {binding_values[f'property_name_{i}']: binding_values[f'property_value_{i}']
+                               for i in range(4)}
+        assert compiled_properties == {'id_value': 1001, 'identifier_stem': str(vertex.identifier_stem),
+                                       'first_name': 'Ada', 'visit_count': 3}
+        assert isinstance(compiled_properties['visit_count'], int)
+        template, binding_values = Ogm._compile_edge(_generate_edge(1001, 1002))
+        assert template.template_name == 'upsert_edge_1'
+        assert binding_values == {'edge_id': 'edge_1001_1002', 'edge_label': '_follows', 'from_id': 'internal_1001',
+                                  'to_id': 'internal_1002', 'property_name_0': 'rank', 'property_value_0': 1.5}
+
+    def test_vertexes_are_sent_before_edges(self, gremlin_stand_in):
+        notary = _StandInNotary(gremlin_stand_in)
+        graph_objects = [_generate_edge(1, 2), _generate_vertex(1), _generate_edge(2, 3), _generate_vertex(2),
+                         _generate_vertex(3), _generate_vertex(1)]
+        template_names = _build_ogm(notary, batch_size=2).graph_objects(*graph_objects)
+        assert template_names == ['upsert_vertex_2'] * 3 + ['upsert_edge_1'] * 2
+        sent_kinds = [command.split('(')[0] for command, _ in notary.sent]
+        assert sent_kinds == ['g.V', 'g.V', 'g.E']
+        assert set(gremlin_stand_in.vertexes) == {'internal_1', 'internal_2', 'internal_3'}
+        edge = gremlin_stand_in.edges['edge_1_2']
+        assert (edge.from_vertex.element_id, edge.to_vertex.element_id) == ('internal_1', 'internal_2')
+        assert edge.properties['rank'] == [1.5]
+
+    def test_failed_chunks_are_retried_once(self, gremlin_stand_in):
+        notary = _StandInNotary(gremlin_stand_in, failing_ids=['internal_2'])
+        _build_ogm(notary, batch_size=1).graph_objects(*[_generate_vertex(x) for x in range(1, 4)])
+        assert _find_sent_vertex_ids(notary) == ['internal_1', 'internal_2', 'internal_3', 'internal_2']
+        assert set(gremlin_stand_in.vertexes) == {'internal_1', 'internal_2', 'internal_3'}
+
+        gremlin_stand_in.reset()
+        notary = _StandInNotary(gremlin_stand_in, failing_ids=['internal_2'], failure_count=2)
+        with pytest.raises(TridentBatchException):
+            _build_ogm(notary, batch_size=1).graph_objects(*[_generate_vertex(x) for x in range(1, 4)])
+        assert _find_sent_vertex_ids(notary).count('internal_2') == 2
+        assert set(gremlin_stand_in.vertexes) == {'internal_1', 'internal_3'}
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+
+from src.algernon import ClientPool
+from src.toll_booth import SchemaSnek
+
+
+class _S3StandIn:
+    """the objects of a single bucket, held in memory, answering the s3 resource calls SchemaSnek makes"""
+    def __init__(self, stored_objects):
+        self.stored_objects = stored_objects
+
+    def Object(self, bucket_name, object_key):
+        return _S3ObjectStandIn(self.stored_objects, object_key)
+
+
+class _S3ObjectStandIn:
+    def __init__(self, stored_objects, object_key):
+        self._stored_objects = stored_objects
+        self._object_key = object_key
+
+    def get(self):
+        if self._object_key not in self._stored_objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': self._object_key}}, 'GetObject')
+        return {'Body': _BodyStandIn(self._stored_objects[self._object_key])}
+
+    def put(self, Body):
+        self._stored_objects[self._object_key] = Body
+
+
+class _BodyStandIn:
+    def __init__(self, body):
+        self._body = body
+
+    def read(self):
+        return self._body
+
+
+@pytest.fixture
+def stored_objects(monkeypatch):
+    stored_objects = {'schemas/schema.json': json.dumps({'vertex': []}).encode('utf-8')}
+    monkeypatch.setattr(ClientPool, 'get_resource', lambda *args, **kwargs: _S3StandIn(stored_objects))
+    return stored_objects
+
+
+class TestSchemaSnek:
+    def test_versions_stored_before_versioned_copies(self, stored_objects):
+        schema_version = SchemaSnek.generate_schema_version(stored_objects['schemas/schema.json'])
+        schema, retrieved_version = SchemaSnek('the-leech').get_versioned_schema(schema_version=schema_version)
+        assert schema == {'vertex': []}
+        assert retrieved_version == schema_version
+        assert f'schemas/versions/{schema_version}/schema.json' in stored_objects
+        with pytest.raises(RuntimeError):
+            SchemaSnek('the-leech').get_versioned_schema(schema_version='not_a_stored_version')
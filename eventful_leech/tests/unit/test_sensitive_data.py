@@ -0,0 +1,85 @@
+import threading
+
+from src.toll_booth import SensitiveData, SensitiveDataSink, PersistedSensitiveCache
+
+
+class RecordingClient:
+    def __init__(self, stored=()):
+        self.updates = []
+        self.probed = []
+        self._stored = set(stored)
+        self._lock = threading.Lock()
+
+    def batch_get_item(self, RequestItems):
+        table_name, table_request = list(RequestItems.items())[0]
+        keys = [x['insensitive']['S'] for x in table_request['Keys']]
+        self.probed.extend(keys)
+        found = [{'insensitive': {'S': x}} for x in keys if x in self._stored]
+        return {'Responses': {table_name: found}, 'UnprocessedKeys': {}}
+
+    def update_item(self, **kwargs):
+        with self._lock:
+            self.updates.append(kwargs)
+
+
+class TestSensitiveDataSink:
+    def test_writes_are_deferred_until_flush(self):
+        client = RecordingClient()
+        with SensitiveDataSink('Sensitives', client, persisted_cache=PersistedSensitiveCache()) as sink:
+            pointers = [str(SensitiveData(f'value_{i}', f'field_{i}', 'some_internal_id')) for i in range(5)]
+            SensitiveData('value_0', 'field_0', 'some_internal_id')
+            assert not client.updates
+            assert sink.pending_count == 5
+        assert SensitiveDataSink.get_current() is None
+        assert sink.pending_count == 0
+        assert sorted(x['Key']['insensitive']['S'] for x in client.updates) == sorted(pointers)
+        assert all('if_not_exists' in x['UpdateExpression'] for x in client.updates)
+        assert {x['ExpressionAttributeValues'][':s']['S'] for x in client.updates} == {f'value_{i}' for i in range(5)}
+
+    def test_persisted_pointers_are_skipped(self):
+        persisted_cache = PersistedSensitiveCache()
+        client = RecordingClient(stored=['pointer_0'])
+        with SensitiveDataSink('Sensitives', client, probe=True, persisted_cache=persisted_cache):
+            SensitiveData('value_0', 'field_0', 'some_internal_id', 'pointer_0')
+            SensitiveData('value_1', 'field_1', 'some_internal_id', 'pointer_1')
+        assert sorted(client.probed) == ['pointer_0', 'pointer_1']
+        assert [x['Key']['insensitive']['S'] for x in client.updates] == ['pointer_1']
+        assert persisted_cache.is_persisted('pointer_0') and persisted_cache.is_persisted('pointer_1')
+        client = RecordingClient()
+        with SensitiveDataSink('Sensitives', client, probe=True, persisted_cache=persisted_cache) as sink:
+            SensitiveData('value_1', 'field_1', 'some_internal_id', 'pointer_1')
+            assert sink.pending_count == 0
+        assert not client.probed and not client.updates
+
+
+class ResolvingClient:
+    """holds back the last key of every request the first time it is asked for it, as a throttled table would"""
+    def __init__(self, stored):
+        self.request_sizes = []
+        self._stored = stored
+        self._held_back = set()
+        self._lock = threading.Lock()
+
+    def batch_get_item(self, RequestItems):
+        table_name, table_request = list(RequestItems.items())[0]
+        keys = [x['insensitive']['S'] for x in table_request['Keys']]
+        with self._lock:
+            self.request_sizes.append(len(keys))
+            unprocessed = [x for x in keys[-1:] if x not in self._held_back]
+            self._held_back.update(unprocessed)
+        found = [{'insensitive': {'S': x}, 'sensitive_entry': {'S': self._stored[x]}}
+                 for x in keys if x in self._stored and x not in unprocessed]
+        unprocessed_keys = {}
+        if unprocessed:
+            unprocessed_keys = {table_name: dict(table_request, Keys=[{'insensitive': {'S': x}} for x in unprocessed])}
+        return {'Responses': {table_name: found}, 'UnprocessedKeys': unprocessed_keys}
+
+
+class TestSensitiveDataResolution:
+    def test_resolve_many(self):
+        stored = {f'pointer_{i}': f'value_{i}' for i in range(250)}
+        client = ResolvingClient(stored)
+        pointers = list(stored) + ['pointer_0', 'missing_pointer']
+        resolved = SensitiveData.resolve_many(pointers, 'Sensitives', client, max_workers=3)
+        assert resolved == stored
+        assert max(client.request_sizes) <= 100
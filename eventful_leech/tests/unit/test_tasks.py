@@ -2,7 +2,8 @@ class TestTasks:
     def test_generate_source_vertex(self, mock_generate_source_vertex_event, mock_context, mock_bullhorn_boto):
         from src.toll_booth import task
         results = task(mock_generate_source_vertex_event, mock_context)
-        for result in results:
+        assert results['batchItemFailures'] == []
+        for result in results['results']:
             from src.toll_booth import PotentialVertex
             assert isinstance(result, PotentialVertex)
             assert result.for_index